@@ -14,16 +14,24 @@ from app.schemas.admin import (
     ResetPasswordRequest,
     BatchDeleteRequest,
 )
+from app.schemas.common import ApiResponse
 from app.core.security import hash_password
-from tortoise.expressions import Q
+from tortoise.expressions import Q, Subquery
+from tortoise.transactions import in_transaction
+from tortoise.functions import Count
 import math
+import uuid
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
 
 # ============ 获取用户列表 ============
 
-@router.get("/users", response_model=dict)
+# 列表接口只投影响应需要的列（不取 password_hash），由 response_model 统一校验/序列化
+_USER_LIST_FIELDS = ("id", "username", "email", "role", "is_active", "created_at", "last_login")
+
+
+@router.get("/users", response_model=ApiResponse[UserListResponse])
 async def get_users(
     page: int = Query(default=1, ge=1, description="页码"),
     limit: int = Query(default=20, ge=1, le=100, description="每页数量"),
@@ -63,21 +71,9 @@ async def get_users(
 
     # 分页
     offset = (page - 1) * limit
-    users = await query.offset(offset).limit(limit)
-
-    # 序列化（移除密码字段）
-    user_list = [
-        UserResponse(
-            id=str(user.id),
-            username=user.username,
-            email=user.email,
-            role=user.role,
-            is_active=user.is_active,
-            created_at=user.created_at,
-            last_login=user.last_login,
-        )
-        for user in users
-    ]
+    rows = await query.offset(offset).limit(limit).values(*_USER_LIST_FIELDS)
+    for r in rows:
+        r["id"] = str(r["id"])
 
     # 分页信息
     total_pages = math.ceil(total / limit)
@@ -85,7 +81,7 @@ async def get_users(
     return {
         "success": True,
         "data": {
-            "users": [user.dict() for user in user_list],
+            "users": rows,
             "pagination": {
                 "total": total,
                 "page": page,
@@ -108,20 +104,21 @@ async def get_user_detail(
     - 包含用户基本信息
     - 包含统计数据（会话数、对话数）
     """
-    # 查询用户
-    user = await User.get_or_none(id=user_id)
+    # 用户与统计数据一条查询取回（LEFT JOIN 会话与转写后分组计数）
+    user = await (
+        User.filter(id=user_id)
+        .annotate(
+            conversation_count=Count("conversations", distinct=True),
+            transcript_count=Count("conversations__transcripts"),
+        )
+        .first()
+    )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="用户不存在"
         )
 
-    # 查询统计数据
-    conversation_count = await Conversation.filter(user_id=user_id).count()
-    transcript_count = await Transcript.filter(
-        conversation__user_id=user_id
-    ).count()
-
     # 构建响应
     user_detail = UserDetailResponse(
         id=str(user.id),
@@ -133,8 +130,8 @@ async def get_user_detail(
         updated_at=user.updated_at,
         last_login=user.last_login,
         statistics={
-            "total_conversations": conversation_count,
-            "total_transcripts": transcript_count,
+            "total_conversations": user.conversation_count,
+            "total_transcripts": user.transcript_count,
             "last_activity": user.last_login,
         }
     )
@@ -320,6 +317,25 @@ async def reset_user_password(
 
 # ============ 删除用户 ============
 
+async def _delete_users(user_ids: list, cascade: bool) -> tuple[int, int]:
+    """
+    删除用户（可选级联删除其会话与对话），返回 (删除的会话数, 删除的对话数)。
+    无论多少用户、多少会话都是固定的 1~3 条语句，不再逐个会话循环；
+    放在同一个事务里，任何一条失败都整体回滚，不会出现对话已删、用户还在的半截状态
+    """
+    deleted_conversations = 0
+    deleted_transcripts = 0
+    async with in_transaction() as conn:
+        if cascade:
+            conversations = Conversation.filter(user_id__in=user_ids)
+            deleted_transcripts = await Transcript.filter(
+                conversation_id__in=Subquery(conversations.values("id"))
+            ).using_db(conn).delete()
+            deleted_conversations = await conversations.using_db(conn).delete()
+        await User.filter(id__in=user_ids).using_db(conn).delete()
+    return deleted_conversations, deleted_transcripts
+
+
 @router.delete("/users/{user_id}", response_model=dict)
 async def delete_user(
     user_id: str,
@@ -362,22 +378,8 @@ async def delete_user(
                 }
             )
 
-    # 级联删除关联数据
-    deleted_conversations = 0
-    deleted_transcripts = 0
-
-    if cascade:
-        # 删除用户的所有对话
-        conversations = await Conversation.filter(user_id=user_id)
-        for conv in conversations:
-            # 删除对话的所有 transcript
-            transcript_count = await Transcript.filter(conversation_id=conv.id).delete()
-            deleted_transcripts += transcript_count
-            await conv.delete()
-            deleted_conversations += 1
-
-    # 删除用户
-    await user.delete()
+    # 级联删除关联数据 + 删除用户
+    deleted_conversations, deleted_transcripts = await _delete_users([user.id], cascade)
 
     return {
         "success": True,
@@ -403,66 +405,62 @@ async def batch_delete_users(
     - 遵循单个删除的所有防护规则
     - 返回每个用户的删除结果
     """
-    results = []
-    succeeded = 0
-    failed = 0
-
+    # 目标用户与管理员人数各查一次，防护检查在内存里完成，最后一次性删除
+    parsed = {}
     for user_id in data.user_ids:
         try:
-            # 查询用户
-            user = await User.get_or_none(id=user_id)
-            if not user:
-                results.append({
-                    "user_id": user_id,
-                    "status": "failed",
-                    "message": "用户不存在"
-                })
-                failed += 1
-                continue
+            parsed[user_id] = uuid.UUID(str(user_id))
+        except ValueError:
+            pass
+    users = {u.id: u for u in await User.filter(id__in=list(parsed.values()))}
+    admin_count = await User.filter(role="admin").count()
+
+    outcomes = []   # 按请求顺序：(user_id, 失败原因)；None 表示通过检查、待删除
+    to_delete = []
+    for user_id in data.user_ids:
+        user = users.pop(parsed.get(user_id), None)   # pop：重复的 id 第二次按“不存在”处理
+        if not user:
+            outcomes.append((user_id, "用户不存在"))
+            continue
 
-            # 防护检查
-            if str(user.id) == str(admin_user.id):
-                results.append({
-                    "user_id": user_id,
-                    "status": "failed",
-                    "message": "不能删除自己"
-                })
-                failed += 1
+        # 防护检查
+        if str(user.id) == str(admin_user.id):
+            outcomes.append((user_id, "不能删除自己"))
+            continue
+
+        if user.role == "admin":
+            if admin_count <= 1:
+                outcomes.append((user_id, "不能删除最后一个管理员"))
                 continue
+            admin_count -= 1
+
+        outcomes.append((user_id, None))
+        to_delete.append(user.id)
 
-            if user.role == "admin":
-                admin_count = await User.filter(role="admin").count()
-                if admin_count <= 1:
-                    results.append({
-                        "user_id": user_id,
-                        "status": "failed",
-                        "message": "不能删除最后一个管理员"
-                    })
-                    failed += 1
-                    continue
-
-            # 级联删除
-            if data.cascade:
-                conversations = await Conversation.filter(user_id=user_id)
-                for conv in conversations:
-                    await Transcript.filter(conversation_id=conv.id).delete()
-                    await conv.delete()
-
-            # 删除用户
-            await user.delete()
+    # 级联删除 + 删除用户
+    error = None
+    if to_delete:
+        try:
+            await _delete_users(to_delete, data.cascade)
+        except Exception as e:
+            error = str(e)
 
+    results = []
+    succeeded = 0
+    failed = 0
+    for user_id, reason in outcomes:
+        if reason is None and error is None:
             results.append({
                 "user_id": user_id,
                 "status": "success",
                 "message": "删除成功"
             })
             succeeded += 1
-
-        except Exception as e:
+        else:
             results.append({
                 "user_id": user_id,
                 "status": "failed",
-                "message": str(e)
+                "message": reason or error
             })
             failed += 1
 
@@ -0,0 +1,50 @@
+# app/api/v1/routers/audio.py
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import FileResponse, Response
+
+from app.api.v1.deps import get_current_user
+from app.models.user import User
+from app.services.audio_store import AUDIO_MIME, audio_store, user_owns_audio
+
+router = APIRouter(prefix="/audio", tags=["audio"])
+
+# 内容按哈希寻址、写入后不再变化，浏览器可以长期缓存；但属于个人录音 / 对话，共享缓存（CDN / 代理）不得保存
+_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+@router.api_route("/{key}", methods=["GET", "HEAD"])
+async def get_audio(key: str, request: Request, user: User = Depends(get_current_user)):
+    """
+    回放归档音频。key 即 sha256 + 扩展名；TTS 的内容可由文本推出，key 不能当凭证：
+    需要登录（<audio src> 会带上 accessToken Cookie），且只能播放自己会话里的音频，否则一律 404。
+    FileResponse 负责 Range / 206 / 416 与 If-Range；服务器支持 http.response.pathsend 时走 sendfile，
+    否则按 64KiB 分块读文件，整个文件不进内存。
+    """
+    parsed = audio_store.parse_key(key)
+    path = audio_store.path_for(key)
+    if parsed is None or not await user_owns_audio(user.id, key):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="NOT_FOUND")
+    try:
+        st = os.stat(path) if path is not None else None
+    except FileNotFoundError:
+        st = None
+    if st is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="NOT_FOUND")
+
+    digest, ext = parsed
+    headers = {"etag": f'"{digest}"', "cache-control": _CACHE_CONTROL}
+    inm = request.headers.get("if-none-match")
+    if inm and _etag_matches(inm, headers["etag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(
+        path,
+        media_type=AUDIO_MIME[ext],
+        headers=headers,
+        stat_result=st,
+        content_disposition_type="inline",
+    )
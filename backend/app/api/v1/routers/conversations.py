@@ -1,10 +1,14 @@
 import datetime as dt
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 from pydantic import BaseModel
+from tortoise import connections
 from app.api.v1.deps import get_current_user
 from app.models.user import User
 from app.models.conversation import Conversation
 from app.models.transcript import Transcript
+from app.schemas.common import ApiResponse
+from app.schemas.conversation import ConversationListOut, ConversationDetailOut, TranscriptSearchOut
+from app.services.audio_store import claim_tts
 
 router = APIRouter(prefix="/conversations", tags=["conversations"])
 
@@ -20,29 +24,125 @@ class AppendSegmentIn(BaseModel):
     endMs: int | None = None
     text: str
     audioUrl: str | None = None
+    # 实时流水线里这段的 utteranceId（final 消息里带的）：服务端据此回填 TTS 归档地址
+    utteranceId: str | None = None
+
+# ===== Projection helpers =====
+# 列表/详情只取需要的列（values 投影），不实例化 ORM 对象；字段名在 SQL 层直接别名成响应字段
+_CONVERSATION_FIELDS = ("id", "title", "accent", "model", "started_at", "ended_at", "duration_sec")
+_TRANSCRIPT_FIELDS = {
+    "seq": "seq",
+    "isFinal": "is_final",
+    "startMs": "start_ms",
+    "endMs": "end_ms",
+    "text": "text",
+    "audioUrl": "audio_url",
+}
+
+def _conversation_out(r: dict) -> dict:
+    ended = r["ended_at"]
+    return {
+        "id": str(r["id"]),
+        "title": r["title"],
+        "accent": r["accent"],
+        "model": r["model"],
+        "startedAt": r["started_at"].isoformat() + "Z",
+        "endedAt": ended.isoformat() + "Z" if ended else None,
+        "durationSec": r["duration_sec"],
+    }
+
+# ===== Search helpers =====
+SEARCH_SNIPPET_CHARS = 80  # SQLite 退化路径下，命中词前后各保留的字符数
+
+# Postgres 路径：依赖迁移 4 建立的 GIN 表达式索引 to_tsvector('simple', text)，
+# 表达式必须与索引完全一致才能命中。先在内层按 rank 截断分页，再只对这一页做 ts_headline。
+_PG_SEARCH_SQL = """
+WITH q AS (SELECT plainto_tsquery('simple', $2) AS query),
+hit AS (
+    SELECT t.conversation_id, t.seq, t.text,
+           ts_rank(to_tsvector('simple', t.text), q.query) AS rank
+    FROM "transcript" AS t
+    JOIN "conversations" AS c ON c.id = t.conversation_id
+    CROSS JOIN q
+    WHERE c.user_id = $1
+      AND to_tsvector('simple', t.text) @@ q.query
+    ORDER BY rank DESC, t.conversation_id, t.seq
+    LIMIT $3 OFFSET $4
+)
+SELECT hit.conversation_id, hit.seq, hit.rank,
+       ts_headline('simple', hit.text, q.query,
+                   'StartSel="", StopSel="", MaxWords=24, MinWords=8, MaxFragments=1') AS snippet
+FROM hit CROSS JOIN q
+ORDER BY hit.rank DESC, hit.conversation_id, hit.seq
+"""
+
+def _make_snippet(text: str, terms: list[str]) -> str:
+    """在 text 中定位第一个命中词，截取前后 SEARCH_SNIPPET_CHARS 个字符"""
+    lower = text.lower()
+    pos = min((p for p in (lower.find(t) for t in terms) if p >= 0), default=0)
+    start = max(0, pos - SEARCH_SNIPPET_CHARS)
+    end = min(len(text), pos + SEARCH_SNIPPET_CHARS)
+    return ("…" if start > 0 else "") + text[start:end].strip() + ("…" if end < len(text) else "")
+
+async def _search_postgres(user: User, q: str, offset: int, limit: int) -> list[dict]:
+    conn = connections.get("default")
+    rows = await conn.execute_query_dict(_PG_SEARCH_SQL, [user.id, q, limit, offset])
+    return [{
+        "conversationId": str(r["conversation_id"]),
+        "seq": r["seq"],
+        "rank": float(r["rank"]),
+        "snippet": r["snippet"],
+    } for r in rows]
+
+async def _search_like(user: User, q: str, offset: int, limit: int) -> list[dict]:
+    # SQLite 等没有全文索引的库：每个词做一次 LIKE（AND），按最近写入排序，rank 为命中次数
+    terms = [t for t in q.lower().split() if t]
+    query = Transcript.filter(conversation__user_id=user.id)
+    for t in terms:
+        query = query.filter(text__icontains=t)
+    rows = await query.order_by("-id").offset(offset).limit(limit).values("conversation_id", "seq", "text")
+    return [{
+        "conversationId": str(r["conversation_id"]),
+        "seq": r["seq"],
+        "rank": float(sum(r["text"].lower().count(t) for t in terms)),
+        "snippet": _make_snippet(r["text"], terms),
+    } for r in rows]
 
 # ===== Routes =====
-@router.get("", response_model=dict)
+@router.get("", response_model=ApiResponse[ConversationListOut])
 async def list_conversations(
     user: User = Depends(get_current_user),
     offset: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=200),
 ):
     total = await Conversation.filter(user=user).count()
-    rows = await Conversation.filter(user=user).order_by("-started_at").offset(offset).limit(limit)
-    items = []
-    for c in rows:
-        items.append({
-            "id": str(c.id),
-            "title": c.title,
-            "accent": c.accent,
-            "model": c.model,
-            "startedAt": c.started_at.isoformat() + "Z",
-            "endedAt": c.ended_at.isoformat() + "Z" if c.ended_at else None,
-            "durationSec": c.duration_sec,
-        })
+    rows = await (
+        Conversation.filter(user=user)
+        .order_by("-started_at")
+        .offset(offset)
+        .limit(limit)
+        .values(*_CONVERSATION_FIELDS)
+    )
+    items = [_conversation_out(r) for r in rows]
     return {"success": True, "data": {"items": items, "offset": offset, "limit": limit, "total": total}}
 
+@router.get("/search", response_model=ApiResponse[TranscriptSearchOut])
+async def search_transcripts(
+    q: str = Query(..., min_length=1, max_length=200),
+    user: User = Depends(get_current_user),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """在当前用户的全部会话中检索 Transcript.text，返回按相关度排序的命中"""
+    q = q.strip()
+    if not q:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="EMPTY_QUERY")
+    if connections.get("default").capabilities.dialect == "postgres":
+        items = await _search_postgres(user, q, offset, limit)
+    else:
+        items = await _search_like(user, q, offset, limit)
+    return {"success": True, "data": {"items": items, "q": q, "offset": offset, "limit": limit}}
+
 @router.post("", response_model=dict)
 async def create_conversation(body: CreateConversationIn, user: User = Depends(get_current_user)):
     now = dt.datetime.utcnow()
@@ -55,34 +155,23 @@ async def create_conversation(body: CreateConversationIn, user: User = Depends(g
     )
     return {"success": True, "data": {"id": str(c.id), "title": c.title or "", "createdAtMs": int(now.timestamp()*1000)}}
 
-@router.get("/{cid}", response_model=dict)
+@router.get("/{cid}", response_model=ApiResponse[ConversationDetailOut])
 async def get_conversation_detail(cid: str, user: User = Depends(get_current_user)):
-    c = await Conversation.get_or_none(id=cid, user=user)
+    c = await Conversation.filter(id=cid, user=user).first().values(*_CONVERSATION_FIELDS)
     if not c:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="NOT_FOUND")
-    trs = await Transcript.filter(conversation_id=c.id).order_by("seq")
-    transcripts = [{
-        "seq": t.seq,
-        "isFinal": t.is_final,
-        "startMs": t.start_ms,
-        "endMs": t.end_ms,
-        "text": t.text,
-        "audioUrl": t.audio_url,
-    } for t in trs]
+    transcripts = await (
+        Transcript.filter(conversation_id=c["id"])
+        .order_by("seq")
+        .values(**_TRANSCRIPT_FIELDS)
+    )
+    latest_audio = next((t["audioUrl"] for t in reversed(transcripts) if t["audioUrl"]), None)
     return {
         "success": True,
         "data": {
-            "conversation": {
-                "id": str(c.id),
-                "title": c.title,
-                "accent": c.accent,
-                "model": c.model,
-                "startedAt": c.started_at.isoformat() + "Z",
-                "endedAt": c.ended_at.isoformat() + "Z" if c.ended_at else None,
-                "durationSec": c.duration_sec,
-            },
+            "conversation": _conversation_out(c),
             "transcripts": transcripts,
-            "audioUrl": None,
+            "audioUrl": latest_audio,
         }
     }
 
@@ -111,6 +200,10 @@ async def append_segment(cid: str, body: AppendSegmentIn, user: User = Depends(g
     if not c:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="NOT_FOUND")
     seq = await Transcript.filter(conversation_id=c.id).count() + 1
+    # blob: 地址只在前端那个页面里有效，不落库；改用服务端归档的合成音频
+    audio_url = body.audioUrl if body.audioUrl and not body.audioUrl.startswith("blob:") else None
+    if audio_url is None:
+        audio_url = claim_tts(c.id, body.utteranceId)
     t = await Transcript.create(
         conversation_id=c.id,
         seq=seq,
@@ -118,6 +211,12 @@ async def append_segment(cid: str, body: AppendSegmentIn, user: User = Depends(g
         start_ms=body.startMs,
         end_ms=body.endMs,
         text=body.text,
-        audio_url=body.audioUrl,
+        audio_url=audio_url,
     )
+    if audio_url is None:
+        # 合成还没结束：登记这一行，归档完成后回填；写入期间刚好完成的这里直接补上
+        late = claim_tts(c.id, body.utteranceId, t.id)
+        if late:
+            await Transcript.filter(id=t.id).update(audio_url=late)
+            t.audio_url = late
     return {"success": True, "data": {"id": f"s_{seq}", "seq": seq, "startMs": t.start_ms, "endMs": t.end_ms, "text": t.text, "audioUrl": t.audio_url}}
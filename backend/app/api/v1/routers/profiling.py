@@ -0,0 +1,105 @@
+# app/api/v1/routers/profiling.py
+import asyncio
+import threading
+import tracemalloc
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+
+from app.api.v1.deps import require_admin
+from app.api.v1.routers import ws_upload
+from app.config import settings
+from app.core import profiler
+from app.core.log import get_logger
+from app.core.pubsub import channel
+from app.core.sequencer import sequencer
+from app.services import audio_store
+from app.services.asr_cache import asr_cache
+
+router = APIRouter(prefix="/admin/profile", tags=["admin"], dependencies=[Depends(require_admin)])
+log = get_logger(__name__)
+
+
+# ============ CPU 采样 ============
+
+@router.get("/cpu")
+async def profile_cpu(
+    seconds: float = Query(default=10, gt=0, description="采样时长（秒）"),
+    hz: int = Query(default=100, ge=1, le=1000, description="采样频率"),
+    scope: str = Query(default="loop", pattern="^(loop|all)$", description="loop=只采事件循环线程，all=全部线程"),
+    format: str = Query(default="collapsed", pattern="^(collapsed|json)$"),
+):
+    """
+    剖析本 worker 一段时间，默认返回 collapsed 栈文本：
+        curl -H "Authorization: Bearer …" ".../admin/profile/cpu?seconds=15" > out.folded
+        flamegraph.pl out.folded > cpu.svg    # 或直接拖进 speedscope
+    采样在单独线程里跑，本请求等待期间事件循环照常服务（被采的正是它）
+    """
+    seconds = min(seconds, settings.profile_max_seconds)
+    loop_thread = threading.get_ident() if scope == "loop" else None
+    log.info("profile.cpu", seconds=seconds, hz=hz, scope=scope)
+    try:
+        result = await asyncio.to_thread(profiler.sample_cpu, seconds, hz, loop_thread)
+    except profiler.ProfilerBusy:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="PROFILE_IN_PROGRESS")
+    if format == "json":
+        return {"success": True, "data": result}
+    return PlainTextResponse(
+        profiler.render_collapsed(result["stacks"]),
+        headers={"X-Profile-Samples": str(result["samples"])},
+    )
+
+
+# ============ 内存（tracemalloc） ============
+
+@router.post("/memory/start")
+async def memory_start(frames: int = Query(default=10, ge=1, le=64, description="每个分配记录的栈深度")):
+    """开启 tracemalloc（开启期间每次分配都有额外开销，查完记得 stop）"""
+    profiler.memory_start(frames)
+    log.warning("profile.tracemalloc_started", frames=frames)
+    return {"success": True, "data": {"tracing": True}}
+
+
+@router.post("/memory/snapshot")
+async def memory_snapshot(
+    limit: int = Query(default=25, ge=1, le=200),
+    groupBy: str = Query(default="lineno", pattern="^(lineno|filename|traceback)$"),
+):
+    """拍快照：top 为当前占用最多的位置，diff 为相对上一张快照增长最多的位置（隔一段时间拍两次找泄漏）"""
+    if not tracemalloc.is_tracing():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="TRACEMALLOC_NOT_RUNNING")
+    data = await asyncio.to_thread(profiler.memory_snapshot, limit, groupBy)
+    data["structures"] = _structures()
+    return {"success": True, "data": data}
+
+
+@router.post("/memory/stop")
+async def memory_stop():
+    profiler.memory_stop()
+    log.info("profile.tracemalloc_stopped")
+    return {"success": True, "data": {"tracing": False}}
+
+
+@router.get("/structures")
+async def structures():
+    """进程内各登记表的条目数：不开 tracemalloc 也能看出哪张表只增不减"""
+    return {"success": True, "data": _structures()}
+
+
+def _structures() -> dict:
+    return {
+        "channelTopics": {topic: len(convs) for topic, convs in channel._topics.items()},
+        "channelSubscribers": {
+            topic: sum(len(subs) for subs in convs.values()) for topic, convs in channel._topics.items()
+        },
+        "ttsFormats": len(channel._tts_fmt),
+        "replayRings": len(channel.replay._rings),
+        "uploadSessions": len(ws_upload._sessions),
+        "sequencerConversations": len(sequencer._issued),
+        "sequencerWaiters": len(sequencer._waiters),
+        "audioLinks": len(audio_store._links),
+        "audioGrants": len(audio_store._grants),
+        "asrCacheEntries": len(asr_cache._items),
+        "tasks": len(asyncio.all_tasks()),
+        "threads": threading.active_count(),
+    }
@@ -0,0 +1,221 @@
+# backend/app/api/v1/routers/ws_conversation.py
+"""
+单连接多路复用：一条 /ws/conversation 同时承载 upload / text / tts 三个通道，
+分帧格式见 app.core.framing。旧的 /ws/upload-audio、/ws/asr-text、/ws/tts-audio 保持不变。
+"""
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, WebSocket
+from starlette.websockets import WebSocketDisconnect
+
+from app.core import framing
+from app.core.audio_formats import negotiate_tts_format
+from app.core.heartbeat import Heartbeat, ping_msg
+from app.core.log import get_logger
+from app.core.pubsub import channel
+from app.core.upload_buffer import UploadLimitError
+from app.api.v1.routers.ws_upload import (
+    pipeline_cancelled_total,
+    open_upload_session,
+    resume_upload_session,
+    write_upload_chunk,
+    finish_upload_session,
+    detach_upload_session,
+    discard_upload_session,
+)
+
+router = APIRouter()
+log = get_logger(__name__)
+
+
+class _MuxSink:
+    """
+    挂到 Channel 里充当“WebSocket”：Channel 调 send_text / send_bytes 时，
+    按所属通道加帧头后写回同一条底层连接。Channel 的路由逻辑无需任何改动。
+    """
+    def __init__(self, mux: "_MuxSocket", ch: int):
+        self._mux = mux
+        self._ch = ch
+
+    async def send_text(self, msg: str):
+        await self._mux.send(self._ch, framing.T_JSON, msg.encode("utf-8"))
+
+    async def send_bytes(self, chunk: bytes):
+        await self._mux.send(self._ch, framing.T_AUDIO, chunk)
+
+    # Channel.sweep 据此判断底层连接是否已关闭
+    @property
+    def client_state(self):
+        return self._mux.ws.client_state
+
+    @property
+    def application_state(self):
+        return self._mux.ws.application_state
+
+
+class _MuxSocket:
+    def __init__(self, ws: WebSocket):
+        self.ws = ws
+        self._seq = {ch: 0 for ch in framing.CHANNELS}
+        self._lock = asyncio.Lock()  # 多个发布者并发写同一连接时保证帧顺序与 seq 一致
+        self.text_sink = _MuxSink(self, framing.CH_TEXT)
+        self.tts_sink = _MuxSink(self, framing.CH_TTS)
+
+    async def send(self, ch: int, ftype: int, payload: bytes):
+        async with self._lock:
+            self._seq[ch] += 1
+            await self.ws.send_bytes(framing.pack_frame(ch, ftype, self._seq[ch], payload))
+
+    async def send_json(self, ch: int, obj: dict):
+        await self.send(ch, framing.T_JSON, json.dumps(obj).encode("utf-8"))
+
+
+@router.websocket("/ws/conversation")
+async def ws_conversation(ws: WebSocket):
+    await ws.accept()
+    log.debug("ws.connected", endpoint="ws_conversation")
+    mux = _MuxSocket(ws)
+    text_conv: Optional[str] = None
+    tts_conv: Optional[str] = None
+    upload_conv: Optional[str] = None
+    upload_utt: Optional[str] = None
+    upload_buf = None
+    # stop 之后在后台跑的流水线：不阻塞本连接的收帧循环，连接断开时全部取消
+    pipelines: set[asyncio.Task] = set()
+    notifiers: set[asyncio.Task] = set()   # 各段流水线跑完后回 done
+
+    async def _finish(conv_id: str, utt_id: str, pipeline: asyncio.Task):
+        await pipeline
+        await mux.send_json(framing.CH_UPLOAD, {"type": "done", "conversationId": conv_id, "utteranceId": utt_id})
+
+    try:
+        # 心跳走 upload 通道（连接级控制消息），客户端在任一通道回 pong 即可
+        ping = lambda: mux.send(framing.CH_UPLOAD, framing.T_JSON, ping_msg().encode("utf-8"))
+        async with Heartbeat(ws, "ws_conversation", send_ping=ping) as hb:
+            while True:
+                # 进行中的那段上传受时长上限约束：客户端中途卡住也会到期注销，释放缓冲、内存预算与排号
+                timeout = max(0.0, upload_buf.remaining_seconds()) if upload_buf is not None else None
+                try:
+                    pkt = await asyncio.wait_for(ws.receive(), timeout)
+                except asyncio.TimeoutError:
+                    e = UploadLimitError("UPLOAD_TOO_LONG", "upload exceeds duration limit", int(upload_buf.max_seconds))
+                    log.info("upload.limit", conv_id=upload_conv, utterance_id=upload_utt, code=e.code)
+                    await mux.send_json(framing.CH_UPLOAD, e.to_msg())
+                    discard_upload_session(upload_utt, mux)
+                    upload_conv, upload_utt, upload_buf = None, None, None
+                    continue
+                hb.touch()
+                if pkt.get("type") == "websocket.disconnect":
+                    break
+                data = pkt.get("bytes")
+                if not data:
+                    continue  # 该端点只收二进制帧
+                try:
+                    ch, ftype, fseq, payload = framing.unpack_frame(data)
+                except framing.FrameError as e:
+                    log.warning("ws.bad_frame", endpoint="ws_conversation", error=str(e), sample=100)
+                    continue
+
+                if ftype == framing.T_AUDIO:
+                    if ch == framing.CH_UPLOAD and upload_buf is not None:
+                        try:
+                            # 可续传上传：帧头 seq 即分片序号（每段从 1 开始）
+                            ack = write_upload_chunk(upload_utt, payload, fseq, mux)
+                            if ack is not None:
+                                await mux.send_json(framing.CH_UPLOAD, {"type": "ack", "utteranceId": upload_utt, "seq": ack})
+                        except UploadLimitError as e:
+                            # 只终止这一段上传（含已被别的连接接管的 UPLOAD_SESSION_GONE），连接与其它通道保持
+                            await mux.send_json(framing.CH_UPLOAD, e.to_msg())
+                            discard_upload_session(upload_utt, mux)
+                            upload_conv, upload_utt, upload_buf = None, None, None
+                    continue
+
+                try:
+                    msg = json.loads(bytes(payload))
+                except Exception:
+                    continue
+                mtype = msg.get("type")
+
+                if mtype == "ping":
+                    await mux.send_json(ch, {"type": "pong", "ts": msg.get("ts")})
+                    continue
+                if mtype == "pong":
+                    hb.pong()
+                    continue
+
+                if ch == framing.CH_TEXT and mtype == "subscribe":
+                    if text_conv:
+                        channel.unsub_text(text_conv, mux.text_sink)
+                    text_conv = msg.get("conversationId")
+                    await mux.send_json(framing.CH_TEXT, {"type": "ready", "conversationId": text_conv})
+                    await channel.sub_text(text_conv, mux.text_sink, msg.get("resumeFrom"))
+
+                elif ch == framing.CH_TTS and mtype == "start":
+                    if tts_conv:
+                        channel.unsub_tts(tts_conv, mux.tts_sink)
+                    tts_conv = msg.get("conversationId")
+                    fmt = negotiate_tts_format(msg.get("format"))
+                    await mux.send_json(framing.CH_TTS, {
+                        "type": "ready", "conversationId": tts_conv, "format": fmt.name, "mime": fmt.mime,
+                    })
+                    await channel.sub_tts(tts_conv, mux.tts_sink, fmt.name, msg.get("resumeFrom"))
+
+                elif ch == framing.CH_UPLOAD and mtype == "start":
+                    discard_upload_session(upload_utt, mux)
+                    upload_conv = msg.get("conversationId")
+                    accent = msg.get("accent") or "American English"
+                    model = (msg.get("model") or "free").lower()
+                    resumable = bool(msg.get("resumable") or msg.get("resume"))
+                    resumed = resume_upload_session(upload_conv, msg.get("utteranceId"), mux) if msg.get("resume") else None
+                    last_chunk = 0
+                    try:
+                        if resumed is not None:
+                            upload_utt = msg["utteranceId"]
+                            upload_buf, last_chunk = resumed
+                        else:
+                            upload_utt, upload_buf = open_upload_session(
+                                upload_conv, accent, model, msg.get("format"), msg.get("sampleRate"),
+                                msg.get("utteranceId"), resumable=resumable, owner=mux)
+                    except UploadLimitError as e:
+                        await mux.send_json(framing.CH_UPLOAD, e.to_msg())
+                        upload_conv, upload_utt, upload_buf = None, None, None
+                        continue
+                    log.info("upload.start", conv_id=upload_conv, utterance_id=upload_utt, accent=accent, model=model,
+                             resumed=resumed is not None)
+                    ready = {"type": "ready", "conversationId": upload_conv, "utteranceId": upload_utt}
+                    if resumable:
+                        ready.update(resumed=resumed is not None, ack=last_chunk)
+                    await mux.send_json(framing.CH_UPLOAD, ready)
+
+                elif ch == framing.CH_UPLOAD and mtype == "stop" and upload_buf is not None:
+                    # 与旧端点不同：stop 后连接保持，可继续下一段 start（上一段仍在后台识别 / 合成）
+                    try:
+                        pipeline = finish_upload_session(upload_utt, mux)
+                    except UploadLimitError as e:
+                        await mux.send_json(framing.CH_UPLOAD, e.to_msg())
+                    else:
+                        pipelines.add(pipeline)
+                        pipeline.add_done_callback(pipelines.discard)
+                        t = asyncio.create_task(_finish(upload_conv, upload_utt, pipeline))
+                        notifiers.add(t)
+                        t.add_done_callback(notifiers.discard)
+                    upload_conv, upload_utt, upload_buf = None, None, None
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        log.warning("ws.error", endpoint="ws_conversation", error=repr(e))
+    finally:
+        for t in list(pipelines):
+            t.cancel()
+            pipeline_cancelled_total.inc(reason="client_disconnect")
+        for t in list(notifiers):
+            t.cancel()
+        if text_conv:
+            channel.unsub_text(text_conv, mux.text_sink)
+        if tts_conv:
+            channel.unsub_tts(tts_conv, mux.tts_sink)
+        # 未 stop 的可续传上传挂起等重连（可换一条连接续传），其余直接注销
+        detach_upload_session(upload_utt, mux)
+        log.debug("ws.disconnected", endpoint="ws_conversation")
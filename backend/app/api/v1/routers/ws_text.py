@@ -1,32 +1,42 @@
 from fastapi import APIRouter, WebSocket
 from starlette.websockets import WebSocketDisconnect
 import json
+from app.core.heartbeat import Heartbeat
+from app.core.log import get_logger
 from app.core.pubsub import channel
 
 router = APIRouter()
+log = get_logger(__name__)
 
 @router.websocket("/ws/asr-text")
 async def ws_asr_text(ws: WebSocket):
     await ws.accept()
-    print("[ws_text] connected")
+    log.debug("ws.connected", endpoint="ws_text")
     conv_id = None
     try:
-        while True:
-            raw = await ws.receive_text()
-            msg = json.loads(raw)
-            if msg.get("type") == "subscribe":
-                conv_id = msg.get("conversationId")
-                await channel.sub_text(conv_id, ws)
-                print("[ws_text] subscribed", conv_id)
-                # 回 ready（可选）
-                await ws.send_text(json.dumps({"type": "ready", "conversationId": conv_id}))
-                # 立刻发一条 ping，验证前端 onmessage 正常
-                await ws.send_text(json.dumps({"type":"interim","text":"__ping__","ts":0}))
+        # 服务端定期 ping，客户端回 pong；长时间收不到任何消息就关闭，死连接不再留在 Channel 里
+        async with Heartbeat(ws, "ws_text") as hb:
+            while True:
+                raw = await ws.receive_text()
+                hb.touch()
+                msg = json.loads(raw)
+                if msg.get("type") == "subscribe":
+                    if conv_id:
+                        channel.unsub_text(conv_id, ws)
+                    conv_id = msg.get("conversationId")
+                    # 回 ready（可选）
+                    await ws.send_text(json.dumps({"type": "ready", "conversationId": conv_id}))
+                    # 带 resumeFrom 时先补发断线期间错过的消息
+                    await channel.sub_text(conv_id, ws, msg.get("resumeFrom"))
+                    log.debug("ws.subscribed", endpoint="ws_text", conv_id=conv_id)
+                elif msg.get("type") == "pong":
+                    hb.pong()
+                elif msg.get("type") == "ping":
+                    await ws.send_text(json.dumps({"type": "pong", "ts": msg.get("ts")}))
     except WebSocketDisconnect:
-        if conv_id:
-            channel.unsub_text(conv_id, ws)
-        print("[ws_text] disconnected")
+        log.debug("ws.disconnected", endpoint="ws_text", conv_id=conv_id)
     except Exception as e:
+        log.warning("ws.error", endpoint="ws_text", conv_id=conv_id, error=repr(e))
+    finally:
         if conv_id:
             channel.unsub_text(conv_id, ws)
-        print("[ws_text] error:", repr(e))
@@ -2,29 +2,47 @@
 from fastapi import APIRouter, WebSocket
 from starlette.websockets import WebSocketDisconnect
 import json
+from app.core.audio_formats import negotiate_tts_format
+from app.core.heartbeat import Heartbeat
+from app.core.log import get_logger
 from app.core.pubsub import channel
 
 router = APIRouter()
+log = get_logger(__name__)
 
 @router.websocket("/ws/tts-audio")
 async def ws_tts(ws: WebSocket):
     await ws.accept()                     # ← 由路由统一 accept
-    print("[ws_tts] connected")
+    log.debug("ws.connected", endpoint="ws_tts")
     conv_id = None
     try:
-        while True:
-            raw = await ws.receive_text() # 已 accept，才能 receive
-            msg = json.loads(raw)
-            if msg.get("type") == "start":
-                conv_id = msg.get("conversationId")
-                await channel.sub_tts(conv_id, ws)    # 这里只做登记
-                print("[ws_tts] subscribed", conv_id)
-                await ws.send_text(json.dumps({"type": "ready", "conversationId": conv_id}))
+        # 服务端定期 ping，客户端回 pong；长时间收不到任何消息就关闭（合成随之按无人收听取消）
+        async with Heartbeat(ws, "ws_tts") as hb:
+            while True:
+                raw = await ws.receive_text() # 已 accept，才能 receive
+                hb.touch()
+                msg = json.loads(raw)
+                if msg.get("type") == "start":
+                    if conv_id:
+                        channel.unsub_tts(conv_id, ws)
+                    conv_id = msg.get("conversationId")
+                    # 可选 format：mp3_44100_128 / mp3_22050_32 / opus_48000_32 / pcm_16000 ...，缺省 mp3
+                    # 服务器没有 ffmpeg 时非默认格式降级为 mp3，客户端以 ready 里的 format / mime 为准
+                    fmt = negotiate_tts_format(msg.get("format"))
+                    await ws.send_text(json.dumps({
+                        "type": "ready", "conversationId": conv_id, "format": fmt.name, "mime": fmt.mime,
+                    }))
+                    # 登记（不 accept）；带 resumeFrom（断线前收到的最后 seq + 1）时先补发错过的帧
+                    await channel.sub_tts(conv_id, ws, fmt.name, msg.get("resumeFrom"))
+                    log.debug("ws.subscribed", endpoint="ws_tts", conv_id=conv_id, format=fmt.name)
+                elif msg.get("type") == "pong":
+                    hb.pong()
+                elif msg.get("type") == "ping":
+                    await ws.send_text(json.dumps({"type": "pong", "ts": msg.get("ts")}))
     except WebSocketDisconnect:
-        if conv_id:
-            channel.unsub_tts(conv_id, ws)
-        print("[ws_tts] disconnected")
+        log.debug("ws.disconnected", endpoint="ws_tts", conv_id=conv_id)
     except Exception as e:
+        log.warning("ws.error", endpoint="ws_tts", conv_id=conv_id, error=repr(e))
+    finally:
         if conv_id:
             channel.unsub_tts(conv_id, ws)
-        print("[ws_tts] error:", repr(e))
@@ -1,25 +1,63 @@
+import asyncio
 import json
-import tempfile
-import os
-from typing import Dict, Optional
+import struct
+import time
+import uuid
+from typing import AsyncGenerator, Dict, Optional, Tuple
 
 from fastapi import APIRouter, WebSocket
 from starlette.websockets import WebSocketDisconnect
 
+from app.core.heartbeat import Heartbeat
+from app.core.log import bind_context, get_logger, log_context
+from app.core.loop_monitor import load_shed_total, loop_monitor
+from app.core.metrics import Counter
 from app.core.pubsub import channel
-from app.services.asr_openai import webm_to_wav_16k_mono, transcribe_wav_via_url
-from app.services.tts_elevenlabs import synth_and_stream_free, synth_and_stream_paid
+from app.core.resilience import EOF, Deadline, DeadlineExceeded
+from app.core.sequencer import sequencer
+from app.core.upload_buffer import UploadBuffer, UploadLimitError
+from app.config import settings
+from app.services.asr_cache import asr_cache, audio_key
+from app.services.asr_openai import (
+    ASR_SAMPLE_RATE,
+    decode_to_pcm16_16k,
+    encode_for_asr,
+    prewarm_transcoder,
+    run_transcode,
+)
+from app.services.audio_store import archive, grant_audio, pcm_to_wav
+from app.services.audio_vad import trim_silence, record_vad_metrics
+from app.services.providers import ProviderUnavailable, asr_chain, tts_chain
+from app.services.tts_stream import synth_and_stream_free, synth_and_stream_live, synth_and_stream_paid
 
 router = APIRouter()
+log = get_logger(__name__)
 
-_sessions: Dict[str, dict] = {}  # conv_id -> {"tmp": file, "accent": str, "model": str}
+pipeline_cancelled_total = Counter(
+    "pipeline_cancelled_total", "Utterance pipelines cancelled before completion, by reason")
+prewarm_total = Counter("prewarm_total", "Speculative pre-warm tasks at upload start, by target and result")
+upload_resumes_total = Counter(
+    "upload_resumes_total", "Resumable upload sessions, by outcome (parked / resumed / expired / not_found)")
+
+# utterance_id -> {"conv_id", "seq", "buf": UploadBuffer, "accent", "model", "format", "prewarm": Task,
+#                  "resumable", "owner", "last_chunk", "unacked", "expiry": TimerHandle}
+# 按段（utterance）而不是按会话登记：同一会话上一段还在合成时，下一段即可上传 / 转码 / 识别
+_sessions: Dict[str, dict] = {}
+
+# 可续传上传（start 带 resumable）在 /ws/upload-audio 上的二进制帧：u32 大端分片序号 + 音频
+CHUNK_SEQ = struct.Struct(">I")
+BUSY_CLOSE_CODE = 1013
+_LIMIT_CLOSE_CODES = {"SERVER_BUSY": BUSY_CLOSE_CODE, "UPLOAD_SESSION_GONE": 1000}
+
+def _ack_msg(utt_id: str, chunk_seq: int) -> str:
+    return json.dumps({"type": "ack", "utteranceId": utt_id, "seq": chunk_seq})
 
 @router.websocket("/ws/upload-audio")
 async def ws_upload(ws: WebSocket):
     await ws.accept()
-    print("[ws_upload] connected")
+    log.debug("ws.connected", endpoint="ws_upload")
     conv_id: Optional[str] = None
-    tmp = None
+    utt_id: Optional[str] = None
     try:
         start_msg = await ws.receive_text()
         meta = json.loads(start_msg)
@@ -27,90 +65,568 @@ async def ws_upload(ws: WebSocket):
         conv_id = meta.get("conversationId")
         accent = meta.get("accent") or "American English"
         model  = (meta.get("model") or "free").lower()
-        print("[ws_upload] start", conv_id, "accent=", accent, "model=", model)
 
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".webm")
-        _sessions[conv_id] = {"tmp": tmp, "accent": accent, "model": model}
+        # resumable：分片带序号、服务端定期 ack，断线后会话保留一段时间；resume：带原 utteranceId 重连续传
+        resumable = bool(meta.get("resumable") or meta.get("resume"))
+        resumed = resume_upload_session(conv_id, meta.get("utteranceId"), ws) if meta.get("resume") else None
+        if resumed is not None:
+            utt_id = meta["utteranceId"]
+            buf, last_chunk = resumed
+        else:
+            utt_id, buf = open_upload_session(
+                conv_id, accent, model, meta.get("format"), meta.get("sampleRate"), meta.get("utteranceId"),
+                resumable=resumable, owner=ws)
+            last_chunk = 0
+        # 本连接只处理这一段：之后的日志（含流水线）都带上 conv_id / utterance_id
+        bind_context(conv_id=conv_id, utterance_id=utt_id)
+        log.info("upload.start", accent=accent, model=model, resumed=resumed is not None, ack=last_chunk)
+        ready = {"type": "ready", "conversationId": conv_id, "utteranceId": utt_id}
+        if resumable:
+            ready.update(resumed=resumed is not None, ack=last_chunk)
+        await ws.send_text(json.dumps(ready))
 
-        while True:
-            pkt = await ws.receive()
-            if "bytes" in pkt and pkt["bytes"]:
-                tmp.write(pkt["bytes"])
-                continue
-            if "text" in pkt and pkt["text"]:
+        # 心跳：录音停顿 / 等识别结果期间客户端只回 pong，半开连接超时后关闭（可续传的会话随之挂起）
+        async with Heartbeat(ws, "ws_upload") as hb:
+            while True:
+                # 客户端卡住不发数据也要受时长上限约束
                 try:
-                    j = json.loads(pkt["text"])
-                except Exception:
+                    pkt = await asyncio.wait_for(ws.receive(), max(0.0, buf.remaining_seconds()))
+                except asyncio.TimeoutError:
+                    raise UploadLimitError("UPLOAD_TOO_LONG", "upload exceeds duration limit", int(buf.max_seconds))
+                hb.touch()
+                if pkt.get("type") == "websocket.disconnect":
+                    raise WebSocketDisconnect(pkt.get("code", 1000))
+                if "bytes" in pkt and pkt["bytes"]:
+                    data, chunk_seq = pkt["bytes"], None
+                    if resumable:
+                        if len(data) < CHUNK_SEQ.size:
+                            continue
+                        chunk_seq = CHUNK_SEQ.unpack_from(data)[0]
+                        data = memoryview(data)[CHUNK_SEQ.size:]
+                    ack = write_upload_chunk(utt_id, data, chunk_seq, ws)
+                    if ack is not None:
+                        await ws.send_text(_ack_msg(utt_id, ack))
                     continue
-                if j.get("type") == "stop":
-                    print("[ws_upload] stop", conv_id)
+                if "text" in pkt and pkt["text"]:
                     try:
-                        tmp.flush()
-                        tmp.close()
+                        j = json.loads(pkt["text"])
                     except Exception:
-                        pass
-                    await on_stop_and_publish(conv_id, tmp.name)
-                    try:
-                        await ws.close()
-                    except Exception:
-                        pass
-                    break
+                        continue
+                    if j.get("type") == "pong":
+                        hb.pong()
+                        continue
+                    if j.get("type") == "stop":
+                        log.debug("upload.stop")
+                        ses = _owned_session(utt_id, ws)
+                        if resumable:
+                            # 全部分片已收齐，客户端可以丢掉本地缓存
+                            await ws.send_text(_ack_msg(utt_id, ses["last_chunk"]))
+                        await run_until_disconnect(ws, finish_upload_session(utt_id, ws), hb)
+                        try:
+                            await ws.close()
+                        except Exception:
+                            pass
+                        break
+    except UploadLimitError as e:
+        log.info("upload.limit", conv_id=conv_id, code=e.code)
+        discard_upload_session(utt_id, ws)
+        try:
+            await ws.send_text(json.dumps(e.to_msg()))
+            # 1013 try again later：过载拒绝，客户端退避后重连；会话已被接管 / 结束时正常关闭；其余超限 1009
+            await ws.close(code=_LIMIT_CLOSE_CODES.get(e.code, 1009))
+        except Exception:
+            pass
     except WebSocketDisconnect:
-        print("[ws_upload] disconnect", conv_id or "")
+        log.debug("ws.disconnected", endpoint="ws_upload")
     except Exception as e:
-        print("[ws_upload] error:", repr(e))
+        log.warning("ws.error", endpoint="ws_upload", error=repr(e))
     finally:
-        ses = _sessions.pop(conv_id or "", None)
-        if ses:
-            try:
-                if ses.get("tmp") and os.path.exists(ses["tmp"].name):
-                    os.remove(ses["tmp"].name)
-            except Exception:
-                pass
-        print("[ws_upload] closed", conv_id or "")
-
-async def on_stop_and_publish(conv_id: str, webm_path: str):
-    ses = _sessions.get(conv_id, {})
-    accent = ses.get("accent", "American English")
-    model  = (ses.get("model") or "free").lower()
+        detach_upload_session(utt_id, ws)
 
-    print("[on_stop] begin", conv_id)
-    wav_path = None
-    text = ""
+# -------- 会话生命周期（/ws/upload-audio 与 /ws/conversation 共用） --------
+def open_upload_session(
+    conv_id: str,
+    accent: str,
+    model: str,
+    fmt: Optional[str] = None,
+    sample_rate: Optional[int] = None,
+    utterance_id: Optional[str] = None,
+    resumable: bool = False,
+    owner: object = None,
+) -> Tuple[str, UploadBuffer]:
+    """
+    登记一段上传，返回 (utterance_id, 可写入音频分片的缓冲)（超限时 write 抛 UploadLimitError）
+    utterance_id 可由客户端指定（重复则重新生成）；同一会话内按登记顺序排号，输出按此顺序下发。
+    fmt="pcm16"：客户端（如 AudioWorklet）直接发 16k 单声道 s16le，服务端全程不起 ffmpeg；
+    其余取值按浏览器 MediaRecorder 的 webm/opus 处理。
+    resumable=True：分片按序号写入（write_upload_chunk），连接断开后会话挂起等待续传；owner 为当前持有的连接
+    事件循环过载时拒绝新的一段（SERVER_BUSY）；续传不经过这里，已开始的上传不受影响
+    """
+    if loop_monitor.overloaded():
+        load_shed_total.inc(endpoint="upload")
+        raise UploadLimitError("SERVER_BUSY", "server is overloaded, retry later", settings.load_shed_lag_ms)
+    if (fmt or "").lower() == "pcm16":
+        if sample_rate not in (None, ASR_SAMPLE_RATE):
+            raise UploadLimitError("UNSUPPORTED_SAMPLE_RATE", "pcm16 uploads must be 16000 Hz mono", ASR_SAMPLE_RATE)
+        buf = UploadBuffer(suffix=".pcm", bytes_per_second=ASR_SAMPLE_RATE * 2)
+        fmt = "pcm16"
+    else:
+        buf = UploadBuffer(suffix=".webm")
+        fmt = "webm"
+    if not utterance_id or utterance_id in _sessions:
+        utterance_id = uuid.uuid4().hex
+    _sessions[utterance_id] = {
+        "conv_id": conv_id, "seq": sequencer.issue(conv_id),
+        "buf": buf, "accent": accent, "model": model, "format": fmt,
+        "prewarm": asyncio.create_task(_prewarm(accent, fmt == "pcm16")) if settings.prewarm_enabled else None,
+        "resumable": resumable, "owner": owner, "last_chunk": 0, "unacked": 0, "expiry": None,
+    }
+    return utterance_id, buf
+
+def _owned_session(utterance_id: Optional[str], owner: object = None) -> dict:
+    """
+    取出仍由 owner 持有的会话；已被别的连接续传接管、或已经 stop / 注销时抛 UPLOAD_SESSION_GONE，
+    调用方只结束自己这段上传（多路复用连接上的其它通道不受影响）
+    """
+    ses = _sessions.get(utterance_id or "")
+    if ses is None or (owner is not None and ses["owner"] is not owner):
+        raise UploadLimitError("UPLOAD_SESSION_GONE", "upload session was taken over or has ended", 0)
+    return ses
+
+def write_upload_chunk(
+    utterance_id: str, data, chunk_seq: Optional[int] = None, owner: object = None
+) -> Optional[int]:
+    """
+    写入一片音频，返回需要回给客户端的 ack 序号（None 表示暂不回）。
+    可续传会话按 chunk_seq 写入：重发的旧片丢弃；跳号的片不写、立即回当前 ack，客户端从 ack + 1 重发；
+    连续写入每 UPLOAD_ACK_EVERY 片回一次 ack
+    """
+    ses = _owned_session(utterance_id, owner)
+    if not ses["resumable"] or chunk_seq is None:
+        ses["buf"].write(data)
+        return None
+    if chunk_seq <= ses["last_chunk"]:
+        return None
+    if chunk_seq != ses["last_chunk"] + 1:
+        return ses["last_chunk"]
+    ses["buf"].write(data)
+    ses["last_chunk"] = chunk_seq
+    ses["unacked"] += 1
+    if ses["unacked"] >= settings.upload_ack_every:
+        ses["unacked"] = 0
+        return chunk_seq
+    return None
+
+def resume_upload_session(
+    conv_id: str, utterance_id: Optional[str], owner: object
+) -> Optional[Tuple[UploadBuffer, int]]:
+    """
+    重连续传：接管同一会话下这段上传，返回 (缓冲, 已收到的最后分片序号)；
+    已过期 / 从未存在 / 已经 stop 的返回 None，调用方按新的一段处理
+    """
+    ses = _sessions.get(utterance_id or "")
+    if ses is None or not ses["resumable"] or ses["conv_id"] != conv_id:
+        upload_resumes_total.inc(result="not_found")
+        return None
+    if ses["expiry"] is not None:
+        ses["expiry"].cancel()
+        ses["expiry"] = None
+    # 旧连接可能还没察觉自己已断（半开 TCP）：直接转交，旧连接之后的 detach 不再影响这段上传
+    ses["owner"] = owner
+    ses["unacked"] = 0
+    upload_resumes_total.inc(result="resumed")
+    return ses["buf"], ses["last_chunk"]
+
+def detach_upload_session(utterance_id: Optional[str], owner: object = None):
+    """
+    上传连接断开（未 stop）：可续传的会话挂起 UPLOAD_RESUME_GRACE_SECONDS 等待重连，过期才注销；
+    其余直接注销。会话已被别的连接续传接管时什么都不做
+    """
+    ses = _sessions.get(utterance_id or "")
+    if ses is None or (owner is not None and ses["owner"] is not owner):
+        return
+    if not ses["resumable"] or settings.upload_resume_grace_seconds <= 0:
+        discard_upload_session(utterance_id)
+        return
+    if ses["expiry"] is None:
+        ses["owner"] = None
+        ses["expiry"] = asyncio.get_running_loop().call_later(
+            settings.upload_resume_grace_seconds, _expire_upload_session, utterance_id)
+        upload_resumes_total.inc(result="parked")
+        log.info("upload.parked", conv_id=ses["conv_id"], utterance_id=utterance_id, ack=ses["last_chunk"])
+
+def _expire_upload_session(utterance_id: str):
+    if utterance_id in _sessions:
+        upload_resumes_total.inc(result="expired")
+        log.info("upload.resume_expired", utterance_id=utterance_id)
+        discard_upload_session(utterance_id)
+
+async def _prewarm_one(target: str, coro):
     try:
-        wav_path = webm_to_wav_16k_mono(webm_path)
-        text = await transcribe_wav_via_url(wav_path)
+        await asyncio.wait_for(coro, settings.prewarm_timeout_seconds)
+        prewarm_total.inc(target=target, result="ok")
+    except asyncio.CancelledError:
+        prewarm_total.inc(target=target, result="cancelled")
+        raise
     except Exception as e:
-        text = f"[ASR error] {e}"
-    finally:
-        try:
-            if wav_path and os.path.exists(wav_path):
-                os.remove(wav_path)
-        except Exception:
-            pass
+        # 预热只是优化：失败不影响正式调用，正式调用自己会重试 / 熔断
+        prewarm_total.inc(target=target, result="error")
+        log.warning("prewarm.failed", target=target, error=repr(e))
+
+async def _prewarm(accent: str, is_pcm: bool):
+    """
+    用户还在说话时并行准备 stop 之后要用的东西：ASR / TTS 连接池里建好连接、按口音解析 voice、
+    拉起转码线程（裸 PCM 上传不需要 ffmpeg 解码，跳过）。上传被放弃时整体取消
+    """
+    jobs = [
+        _prewarm_one("asr", asr_chain().prewarm(accent)),
+        _prewarm_one("tts", tts_chain().prewarm(accent)),
+    ]
+    if not is_pcm:
+        jobs.append(_prewarm_one("transcode", prewarm_transcoder()))
+    await asyncio.gather(*jobs)
+
+def finish_upload_session(utterance_id: str, owner: object = None) -> asyncio.Task:
+    """
+    收到 stop：会话移交给后台流水线（ASR → 文本推送 → TTS），返回可取消的 task。
+    调用方负责把 task 的生命周期绑到上传连接上（连接断开就 cancel）。
+    """
+    _owned_session(utterance_id, owner)
+    ses = _sessions.pop(utterance_id)
+    ses["utterance_id"] = utterance_id
+    task = asyncio.create_task(on_stop_and_publish(ses["conv_id"], ses["buf"], ses))
+
+    # 还没开始跑就被取消时 on_stop_and_publish 的 finally 不会执行，这里兜底释放缓冲与排号
+    def _cleanup(_):
+        ses["buf"].close()
+        sequencer.release(ses["conv_id"], ses["seq"])
+
+    task.add_done_callback(_cleanup)
+    return task
+
+async def run_until_disconnect(ws: WebSocket, task: asyncio.Task, hb: Optional[Heartbeat] = None):
+    """等流水线跑完，同时继续读上传连接：客户端中途断开就取消流水线（不再转码 / 调 Whisper / 合成）"""
+    while not task.done():
+        recv = asyncio.ensure_future(ws.receive())
+        await asyncio.wait({task, recv}, return_when=asyncio.FIRST_COMPLETED)
+        if not recv.done():
+            recv.cancel()
+            break
         try:
-            if webm_path and os.path.exists(webm_path):
-                os.remove(webm_path)
+            pkt = recv.result()
         except Exception:
-            pass
+            pkt = {"type": "websocket.disconnect"}
+        if hb is not None:
+            hb.touch()
+            if pkt.get("text"):
+                try:
+                    if json.loads(pkt["text"]).get("type") == "pong":
+                        hb.pong()
+                except Exception:
+                    pass
+        if pkt.get("type") == "websocket.disconnect":
+            if not task.done():
+                task.cancel()
+                pipeline_cancelled_total.inc(reason="client_disconnect")
+                log.info("pipeline.cancelled", reason="client_disconnect")
+            raise WebSocketDisconnect(pkt.get("code", 1000))
+    await task
 
-    print("[on_stop] asr done text len=", len(text))
-    print("[on_stop] ASR text:", text)
+def discard_upload_session(utterance_id: Optional[str], owner: object = None):
+    """
+    注销未完成的一段上传：释放缓冲（内存预算 / 溢出的临时文件），并让出它的排号。
+    给了 owner 时只注销自己持有的会话（已被别的连接接管的不动）
+    """
+    ses = _sessions.get(utterance_id or "")
+    if ses is None or (owner is not None and ses["owner"] is not owner):
+        return
+    del _sessions[utterance_id]
+    if ses:
+        if ses.get("expiry") is not None:
+            ses["expiry"].cancel()
+        if ses.get("prewarm") is not None:
+            ses["prewarm"].cancel()
+        ses["buf"].close()
+        sequencer.release(ses["conv_id"], ses["seq"])
 
-    # 1) final 文本推给 /ws/asr-text
+def _asr_error_msg(e: Exception) -> dict:
+    if isinstance(e, ProviderUnavailable):
+        code = "ASR_UNAVAILABLE"
+    elif isinstance(e, DeadlineExceeded):
+        code = "DEADLINE_EXCEEDED"
+    else:
+        code = "ASR_FAILED"
+    return {"type": "error", "stage": "asr", "code": code, "message": str(e)}
+
+async def _archive_upload(audio: UploadBuffer, is_pcm: bool) -> Optional[str]:
+    """原始录音归档（裸 PCM 包成 WAV），返回回放地址；失败 / 关闭时为 None"""
+    if not settings.audio_archive_enabled:
+        return None
     try:
-        await channel.pub_text(conv_id, {"type": "final", "text": text})
-        print(f"[push] final -> {conv_id}")
+        if is_pcm:
+            wav = await asyncio.to_thread(lambda: pcm_to_wav(audio.read_all(), ASR_SAMPLE_RATE))
+            return await archive("upload", wav, "wav")
+        return await archive("upload", audio.source(), "webm")
     except Exception as e:
-        print("[push] final error:", repr(e))
+        log.warning("audio.archive_failed", kind="upload", error=repr(e))
+        return None
 
-    # 2) TTS（按模型分流；目前 free/paid 等价，实现由 services 负责）
+async def _prepare_audio(audio: UploadBuffer, is_pcm: bool, deadline: Deadline, archived: Optional[dict] = None):
+    """
+    解码 → VAD；返回 (pcm, 原始音频, 裁掉的秒数)，整段静音返回 None。
+    archived 不为 None 时与解码并行归档原始录音，地址写进 archived["sourceAudioUrl"]（归档完才返回，之后缓冲才能释放）
+    """
+    archiving = asyncio.create_task(_archive_upload(audio, is_pcm)) if archived is not None else None
     try:
-        print(f"[tts] begin {model=} {accent=}")
-        if model == "free":
-            await synth_and_stream_free(conv_id, text, accent)
-        else:
-            await synth_and_stream_paid(conv_id, text, accent)
-        print("[tts] done")
+        return await _decode_and_trim(audio, is_pcm, deadline)
+    finally:
+        if archiving is not None:
+            archived["sourceAudioUrl"] = await archiving
+
+async def _decode_and_trim(audio: UploadBuffer, is_pcm: bool, deadline: Deadline):
+    if is_pcm:
+        # 裸 PCM：无需解码，也没有可透传的原始压缩音频
+        src = None
+        pcm = audio.read_all()
+        pcm = pcm[: len(pcm) - (len(pcm) % 2)]
+    else:
+        src = audio.source()
+        pcm = await run_transcode(decode_to_pcm16_16k, src, deadline)
+    trimmed = 0.0
+    if settings.vad_enabled:
+        vad = trim_silence(pcm)
+        record_vad_metrics(vad)
+        log.debug("vad", input_s=round(vad.input_seconds, 2), kept_s=round(vad.kept_seconds, 2), silent=vad.is_silent)
+        if vad.is_silent:
+            return None
+        pcm = vad.pcm
+        trimmed = vad.input_seconds - vad.kept_seconds
+    return pcm, src, trimmed
+
+async def _encode_upload(pcm: bytes, src, trimmed: float, is_pcm: bool, deadline: Deadline):
+    upload = await run_transcode(encode_for_asr, pcm, src, trimmed, in_process_only=is_pcm, deadline=deadline)
+    log.debug("asr.upload", encoding=upload.encoding, bytes=len(upload.data))
+    return upload
+
+async def _recognize(
+    audio: UploadBuffer, is_pcm: bool, deadline: Deadline, archived: Optional[dict] = None
+) -> Optional[str]:
+    """解码 → VAD → ASR（带缓存）；整段静音返回 None"""
+    prepared = await _prepare_audio(audio, is_pcm, deadline, archived)
+    if prepared is None:
+        return None
+    pcm, src, trimmed = prepared
+    chain = asr_chain()
+
+    async def _transcribe() -> tuple[str, bool]:
+        upload = await _encode_upload(pcm, src, trimmed, is_pcm, deadline)
+        res = await chain.transcribe(upload.data, upload.filename, upload.mime, deadline)
+        if not res.primary:
+            log.info("asr.fallback", provider=res.provider)
+        return res.text, res.primary
+
+    if settings.asr_cache_enabled:
+        return await asr_cache.get_or_transcribe(audio_key(pcm, chain.cache_tag), _transcribe)
+    text, _ = await _transcribe()
+    return text
+
+# -------- 增量模式（TTS_INPUT_STREAMING）：识别增量同时推给前端（interim）和 TTS --------
+_SILENT = object()
+
+async def _recognize_live(
+    audio: UploadBuffer, is_pcm: bool, deadline: Deadline, outs: list[asyncio.Queue], spoke: asyncio.Future,
+    archived: Optional[dict] = None,
+):
+    """
+    识别并把文本增量分发到 outs（文本推送一路、TTS 一路），结束时分发 EOF / _SILENT / 异常。
+    spoke：首个增量到达时为 True；没有任何文本就结束（静音 / 空转写 / 出错）时为 False
+    """
+    def _emit(item):
+        for q in outs:
+            q.put_nowait(item)
+        if not spoke.done():
+            spoke.set_result(isinstance(item, str))
+
+    t0 = time.monotonic()
+    try:
+        try:
+            prepared = await _prepare_audio(audio, is_pcm, deadline, archived)
+        finally:
+            audio.close()
+        if prepared is None:
+            _emit(_SILENT)
+            return
+        pcm, src, trimmed = prepared
+        chain = asr_chain()
+        key = audio_key(pcm, chain.cache_tag) if settings.asr_cache_enabled else None
+        cached = asr_cache.get(key) if key else None
+        if cached is not None:
+            if cached:
+                _emit(cached)
+            _emit(EOF)
+            log.info("stage.done", stage="asr", ms=_ms_since(t0), chars=len(cached), cached=True)
+            return
+
+        upload = await _encode_upload(pcm, src, trimmed, is_pcm, deadline)
+        stream = chain.transcribe_stream(upload.data, upload.filename, upload.mime, deadline)
+        try:
+            async for delta in stream:
+                _emit(delta)
+        finally:
+            await stream.aclose()
+        if not stream.primary:
+            log.info("asr.fallback", provider=stream.provider)
+        elif key:
+            asr_cache.put(key, stream.text)
+        _emit(EOF)
+        log.info("stage.done", stage="asr", ms=_ms_since(t0), chars=len(stream.text))
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
-        print("[push][tts] error:", repr(e))
+        log.warning("stage.error", stage="asr", ms=_ms_since(t0), error=repr(e))
+        _emit(e)
+
+async def _publish_text_live(conv_id: str, seq: Optional[int], q: asyncio.Queue, tagged, archived: dict):
+    """按段序号轮到本段后推 interim（累计文本），最后推 final / 静音 final / error"""
+    if seq is not None:
+        # 只挡文本下发，识别本身不等，所以排队时间不延长时限
+        await sequencer.wait(conv_id, "text", seq)
+    text = ""
+    while True:
+        item = await q.get()
+        if isinstance(item, str):
+            text += item
+            await channel.pub_text(conv_id, tagged({"type": "interim", "text": text}))
+            continue
+        if item is _SILENT:
+            await channel.pub_text(conv_id, _with_source(conv_id, tagged({"type": "final", "text": "", "silent": True}), archived))
+        elif isinstance(item, Exception):
+            await channel.pub_text(conv_id, tagged(_asr_error_msg(item)))
+        else:
+            log.debug("asr.text", text=text)
+            await channel.pub_text(conv_id, _with_source(conv_id, tagged({"type": "final", "text": text}), archived))
+        break
+    if seq is not None:
+        sequencer.finish(conv_id, "text", seq)
+
+async def _drain_text(q: asyncio.Queue) -> AsyncGenerator[str, None]:
+    while True:
+        item = await q.get()
+        if isinstance(item, Exception):
+            raise item
+        if not isinstance(item, str):
+            return
+        yield item
+
+async def _on_stop_live(
+    conv_id: str, audio: UploadBuffer, is_pcm: bool, accent: str,
+    utt_id: Optional[str], seq: Optional[int], deadline: Deadline, tagged,
+):
+    """识别与合成重叠：首个识别增量到达后就开始 TTS，片段按标点 / 停顿切好陆续送进合成器"""
+    text_q: asyncio.Queue = asyncio.Queue()
+    tts_q: asyncio.Queue = asyncio.Queue()
+    spoke = asyncio.get_running_loop().create_future()
+    archived: dict = {}
+    asr = asyncio.create_task(_recognize_live(audio, is_pcm, deadline, [text_q, tts_q], spoke, archived))
+    publisher = asyncio.create_task(_publish_text_live(conv_id, seq, text_q, tagged, archived))
+    try:
+        if await spoke:
+            await _wait_turn(conv_id, "tts", seq, deadline)
+            try:
+                await synth_and_stream_live(conv_id, _drain_text(tts_q), accent, deadline, utt_id)
+            except Exception as e:
+                log.warning("stage.error", stage="tts", error=repr(e))
+        await asr
+        await publisher
+    finally:
+        asr.cancel()
+        publisher.cancel()
+
+def _with_source(conv_id: str, payload: dict, archived: dict) -> dict:
+    """final 消息带上原始录音的回放地址（已归档时），并登记这段录音属于本会话"""
+    if archived.get("sourceAudioUrl"):
+        grant_audio(conv_id, archived["sourceAudioUrl"])
+        payload["sourceAudioUrl"] = archived["sourceAudioUrl"]
+    return payload
+
+async def _wait_turn(conv_id: str, stage: str, seq: Optional[int], deadline: Deadline):
+    """按段序号排队；排队时间不计入本段时限"""
+    if seq is None:
+        return
+    t0 = time.monotonic()
+    await sequencer.wait(conv_id, stage, seq)
+    deadline.extend(time.monotonic() - t0)
+
+def _ms_since(t0: float) -> int:
+    return round((time.monotonic() - t0) * 1000)
+
+async def on_stop_and_publish(conv_id: str, audio: UploadBuffer, ses: Optional[dict] = None):
+    ses = ses if ses is not None else {}
+    # 本段流水线（含其中创建的 task）的日志都带上会话与段 ID
+    with log_context(conv_id=conv_id, utterance_id=ses.get("utterance_id")):
+        await _on_stop(conv_id, audio, ses)
+
+async def _on_stop(conv_id: str, audio: UploadBuffer, ses: dict):
+    accent = ses.get("accent", "American English")
+    model  = (ses.get("model") or "free").lower()
+    is_pcm = ses.get("format") == "pcm16"
+    utt_id = ses.get("utterance_id")
+    seq = ses.get("seq")
+    # 本段语音的总时限：转码 / ASR / TTS 首包共用
+    deadline = Deadline(settings.utterance_deadline_seconds)
+
+    def _tagged(payload: dict) -> dict:
+        if utt_id:
+            payload["utteranceId"] = utt_id
+        return payload
+
+    t_begin = time.monotonic()
+    log.info("pipeline.begin", accent=accent, model=model, live=settings.tts_input_streaming)
+    try:
+        if settings.tts_input_streaming:
+            await _on_stop_live(conv_id, audio, is_pcm, accent, utt_id, seq, deadline, _tagged)
+            return
+
+        # 0) 识别：与同会话的其它段并行（同时归档原始录音）
+        archived: dict = {}
+        t0 = time.monotonic()
+        try:
+            text = await _recognize(audio, is_pcm, deadline, archived)
+        except Exception as e:
+            # 识别失败不再把错误串当成转写推送（也不会拿它去合成语音）：单独发 error 消息后结束本段
+            log.warning("stage.error", stage="asr", ms=_ms_since(t0), error=repr(e))
+            await _wait_turn(conv_id, "text", seq, deadline)
+            await channel.pub_text(conv_id, _tagged(_asr_error_msg(e)))
+            return
+        finally:
+            audio.close()
+        log.info("stage.done", stage="asr", ms=_ms_since(t0), chars=len(text) if text is not None else None,
+                 silent=text is None)
+
+        # 1) final 文本推给 /ws/asr-text：前一段的文本发出之后才轮到本段
+        await _wait_turn(conv_id, "text", seq, deadline)
+        if text is None:
+            # 整段静音：不调 Whisper、不调 TTS，只告诉前端这段没有内容
+            await channel.pub_text(conv_id, _with_source(conv_id, _tagged({"type": "final", "text": "", "silent": True}), archived))
+            return
+        log.debug("asr.text", text=text)
+        try:
+            await channel.pub_text(conv_id, _with_source(conv_id, _tagged({"type": "final", "text": text}), archived))
+        except Exception as e:
+            log.warning("push.error", stage="text", error=repr(e))
+        if seq is not None:
+            sequencer.finish(conv_id, "text", seq)
+
+        # 2) TTS（按模型分流；目前 free/paid 等价，实现由 services 负责）：前一段播完才开始
+        await _wait_turn(conv_id, "tts", seq, deadline)
+        try:
+            if model == "free":
+                await synth_and_stream_free(conv_id, text, accent, deadline, utt_id)
+            else:
+                await synth_and_stream_paid(conv_id, text, accent, deadline, utt_id)
+        except Exception as e:
+            log.warning("stage.error", stage="tts", error=repr(e))
+    finally:
+        if seq is not None:
+            sequencer.release(conv_id, seq)
+        log.info("pipeline.done", ms=_ms_since(t_begin))
@@ -22,16 +22,139 @@ class Settings(BaseModel):
         "http://127.0.0.1:3000",
     ]
     
+    # Upload buffering：小于阈值留在内存，超过才落盘；单次上传与全进程内存都有上限
+    upload_spool_max_memory: int = int(os.getenv("UPLOAD_SPOOL_MAX_MEMORY", str(1024 * 1024)))
+    upload_memory_budget: int = int(os.getenv("UPLOAD_MEMORY_BUDGET", str(64 * 1024 * 1024)))
+    upload_max_bytes: int = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+    upload_max_seconds: float = float(os.getenv("UPLOAD_MAX_SECONDS", "300"))
+    # 可续传上传：断线后会话保留的秒数；每收到多少片回一次 ack
+    upload_resume_grace_seconds: float = float(os.getenv("UPLOAD_RESUME_GRACE_SECONDS", "30"))
+    upload_ack_every: int = int(os.getenv("UPLOAD_ACK_EVERY", "5"))
+
+    # VAD / 静音裁剪（ASR 之前，16k 单声道 PCM 上做）
+    vad_enabled: bool = os.getenv("VAD_ENABLED", "true").lower() in ("1", "true", "yes")
+    vad_frame_ms: int = int(os.getenv("VAD_FRAME_MS", "20"))
+    vad_threshold_dbfs: float = float(os.getenv("VAD_THRESHOLD_DBFS", "-50"))
+    vad_noise_margin_db: float = float(os.getenv("VAD_NOISE_MARGIN_DB", "10"))
+    vad_min_spread_db: float = float(os.getenv("VAD_MIN_SPREAD_DB", "15"))
+    vad_pad_ms: int = int(os.getenv("VAD_PAD_MS", "200"))
+    vad_max_gap_ms: int = int(os.getenv("VAD_MAX_GAP_MS", "600"))
+    vad_min_speech_ms: int = int(os.getenv("VAD_MIN_SPEECH_MS", "200"))
+
     # OpenAI Whisper API Settings (for ASR)
     openai_api_key: str | None = os.getenv("OPENAI_API_KEY")
     whisper_api_url: str = os.getenv("WHISPER_API_URL", "https://api.openai.com/v1/audio/transcriptions")
     whisper_model: str = os.getenv("WHISPER_MODEL", "whisper-1")
+    # ASR 提供方可接受的上传编码，按偏好排序（webm=透传原始 Opus / flac / wav）
+    asr_upload_encodings: list[str] = [
+        e.strip().lower() for e in os.getenv("ASR_UPLOAD_ENCODINGS", "webm,flac,wav").split(",") if e.strip()
+    ]
+    # VAD 裁掉超过这么多秒时不再透传原始 webm（否则静音又被传回去计费）
+    asr_passthrough_max_trim_seconds: float = float(os.getenv("ASR_PASSTHROUGH_MAX_TRIM_SECONDS", "1.0"))
+    # 提供方链（按顺序主备）：asr = openai / local，tts = elevenlabs / local（local 为不访问外网的本地替身）
+    asr_providers: list[str] = [
+        p.strip().lower() for p in os.getenv("ASR_PROVIDERS", "openai").split(",") if p.strip()
+    ]
+    tts_providers: list[str] = [
+        p.strip().lower() for p in os.getenv("TTS_PROVIDERS", "elevenlabs").split(",") if p.strip()
+    ]
+    local_asr_text: str = os.getenv("LOCAL_ASR_TEXT", "This is a local test transcript.")
+    # 熔断：连续失败 N 次后断开，冷却若干秒后放一个探测请求
+    provider_breaker_failures: int = int(os.getenv("PROVIDER_BREAKER_FAILURES", "5"))
+    provider_breaker_reset_seconds: float = float(os.getenv("PROVIDER_BREAKER_RESET_SECONDS", "30"))
+    # 上游调用：单次超时 / 重试次数 / 是否对冲（p95 未返回时再发一路）
+    asr_timeout_seconds: float = float(os.getenv("ASR_TIMEOUT_SECONDS", "120"))
+    asr_retry_attempts: int = int(os.getenv("ASR_RETRY_ATTEMPTS", "3"))
+    asr_hedge_enabled: bool = os.getenv("ASR_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+    # 流式转写（模型需支持 stream=true，如 gpt-4o-transcribe；whisper-1 不支持）
+    asr_stream_enabled: bool = os.getenv("ASR_STREAM_ENABLED", "false").lower() in ("1", "true", "yes")
+    # ASR 结果缓存（按归一化音频内容哈希 + 模型名），重传/重复提交同一段录音时直接返回
+    asr_cache_enabled: bool = os.getenv("ASR_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    asr_cache_max_entries: int = int(os.getenv("ASR_CACHE_MAX_ENTRIES", "1024"))
+    asr_cache_ttl_seconds: float = float(os.getenv("ASR_CACHE_TTL_SECONDS", "3600"))
     
     # ElevenLabs API Settings (for TTS)
     eleven_api_key: str | None = os.getenv("ELEVENLABS_API_KEY")
     eleven_api_base: str = os.getenv("ELEVENLABS_API_URL", "https://api.elevenlabs.io/v1")
     default_voice_id: str = os.getenv("DEFAULT_VOICE_ID", "21m00Tcm4TlvDq8ikWAM")
-    
+
+    # TTS 上游：首包超时（可重试/对冲）与分片间读超时（首包之后不再重试）
+    tts_first_byte_timeout_seconds: float = float(os.getenv("TTS_FIRST_BYTE_TIMEOUT_SECONDS", "10"))
+    tts_read_timeout_seconds: float = float(os.getenv("TTS_READ_TIMEOUT_SECONDS", "15"))
+    tts_retry_attempts: int = int(os.getenv("TTS_RETRY_ATTEMPTS", "2"))
+    tts_hedge_enabled: bool = os.getenv("TTS_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+
+    # 上游连接池（按提供方共享）与 upload start 时的预热
+    http_pool_max_connections: int = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "20"))
+    http_keepalive_seconds: float = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "60"))
+    prewarm_enabled: bool = os.getenv("PREWARM_ENABLED", "true").lower() in ("1", "true", "yes")
+    prewarm_timeout_seconds: float = float(os.getenv("PREWARM_TIMEOUT_SECONDS", "5"))
+    # 转码（ffmpeg 解码 / FLAC 编码）线程池大小：不再在事件循环里同步跑 ffmpeg
+    transcode_workers: int = int(os.getenv("TRANSCODE_WORKERS", "4"))
+
+    # 每段语音的总时限（从 stop 起算，转码 + ASR + TTS 首包共用）与重试退避参数
+    utterance_deadline_seconds: float = float(os.getenv("UTTERANCE_DEADLINE_SECONDS", "90"))
+    retry_base_delay_ms: int = int(os.getenv("RETRY_BASE_DELAY_MS", "200"))
+    retry_max_delay_ms: int = int(os.getenv("RETRY_MAX_DELAY_MS", "2000"))
+    # 对冲阈值 = 最近样本的 p95，且不低于该值（样本不足 20 个时不对冲）
+    hedge_min_delay_ms: int = int(os.getenv("HEDGE_MIN_DELAY_MS", "300"))
+
+    # TTS 下行分片合并：首片立即发送，之后攒够 min_bytes 或等满 max_delay_ms 再发一帧（0 = 不合并）
+    tts_coalesce_min_bytes: int = int(os.getenv("TTS_COALESCE_MIN_BYTES", "4096"))
+    tts_coalesce_max_delay_ms: int = int(os.getenv("TTS_COALESCE_MAX_DELAY_MS", "20"))
+    # 订阅重放缓冲（每会话 text 一个、tts 每种格式一个）：按字节与存活时间封顶
+    replay_max_bytes: int = int(os.getenv("REPLAY_MAX_BYTES", str(2 * 1024 * 1024)))
+    replay_max_age_seconds: float = float(os.getenv("REPLAY_MAX_AGE_SECONDS", "30"))
+    # 最后一个 tts 订阅者断开后，等它重连的宽限期；超过才取消合成
+    tts_resume_grace_seconds: float = float(os.getenv("TTS_RESUME_GRACE_SECONDS", "3"))
+    # 增量合成：ASR 增量边出边送 TTS，不等整段识别完；按标点 / 停顿超时切片
+    tts_input_streaming: bool = os.getenv("TTS_INPUT_STREAMING", "false").lower() in ("1", "true", "yes")
+    tts_chunk_min_chars: int = int(os.getenv("TTS_CHUNK_MIN_CHARS", "40"))
+    tts_flush_timeout_ms: int = int(os.getenv("TTS_FLUSH_TIMEOUT_MS", "400"))
+    # WebSocket 心跳：服务端定期 ping，超过空闲时限没收到客户端任何消息就关闭；Channel 定期清理死订阅（0 = 关闭）
+    ws_ping_interval_seconds: float = float(os.getenv("WS_PING_INTERVAL_SECONDS", "20"))
+    ws_idle_timeout_seconds: float = float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", "60"))
+    ws_sweep_interval_seconds: float = float(os.getenv("WS_SWEEP_INTERVAL_SECONDS", "30"))
+    # 音频归档（上传录音 + 合成结果，按内容哈希去重落盘），历史回放只读磁盘
+    audio_archive_enabled: bool = os.getenv("AUDIO_ARCHIVE_ENABLED", "true").lower() in ("1", "true", "yes")
+    audio_store_dir: str = os.getenv("AUDIO_STORE_DIR", "./audio_store")
+    # 结构化日志：text / json 输出，全局与分模块级别（"app.core.pubsub=DEBUG,..."），
+    # 按事件名采样（"ws.connected=100,..."），转写原文默认脱敏，有界队列满了丢弃
+    log_format: str = os.getenv("LOG_FORMAT", "text").lower()
+    log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    log_levels: str = os.getenv("LOG_LEVELS", "")
+    log_sample: str = os.getenv("LOG_SAMPLE", "")
+    log_transcripts: bool = os.getenv("LOG_TRANSCRIPTS", "false").lower() in ("1", "true", "yes")
+    log_queue_size: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    # 事件循环延迟：采样间隔、卡住多久抓一次调用栈；平滑延迟超过阈值时拒绝新上传与昂贵接口（0 = 关闭）
+    loop_lag_interval_ms: int = int(os.getenv("LOOP_LAG_INTERVAL_MS", "100"))
+    loop_stall_dump_ms: int = int(os.getenv("LOOP_STALL_DUMP_MS", "500"))
+    load_shed_lag_ms: int = int(os.getenv("LOAD_SHED_LAG_MS", "200"))
+    load_shed_paths: list[str] = [
+        p.strip() for p in os.getenv(
+            "LOAD_SHED_PATHS",
+            "/api/v1/auth/login,/api/v1/auth/register,/api/v1/auth/reset-password,"
+            "/api/v1/auth/change-password,/api/v1/conversations/search",
+        ).split(",") if p.strip()
+    ]
+    # 管理员按需剖析：单次 CPU 采样的最长秒数
+    profile_max_seconds: float = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+    # 数据库查询统计：慢查询阈值（毫秒）、单请求查询条数预算（0 = 不检查）、是否在响应头里带 X-DB-*（默认仅 dev）
+    db_slow_query_ms: float = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+    db_query_budget: int = int(os.getenv("DB_QUERY_BUDGET", "20"))
+    db_stats_headers: bool = (
+        os.getenv("DB_STATS_HEADERS") or ("true" if os.getenv("ENV", "dev") == "dev" else "false")
+    ).lower() in ("1", "true", "yes")
+    # Postgres 连接池：大小、借连接超时、空闲连接回收秒数、每连接预编译语句缓存（走 pgbouncer 事务模式时设 0）
+    db_pool_min_size: int = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+    db_pool_max_size: int = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+    db_pool_acquire_timeout_seconds: float = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT_SECONDS", "5"))
+    db_pool_max_inactive_seconds: float = float(os.getenv("DB_POOL_MAX_INACTIVE_SECONDS", "300"))
+    db_statement_cache_size: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+    db_pool_warmup: bool = os.getenv("DB_POOL_WARMUP", "true").lower() in ("1", "true", "yes")
+    # /readyz 里数据库往返探测的时限
+    db_ready_timeout_seconds: float = float(os.getenv("DB_READY_TIMEOUT_SECONDS", "2"))
+
     # Voice Mapping for accents
     voice_map: dict[str, str] = {
         "American English": os.getenv("VOICE_ID_AMERICAN", ""),
@@ -0,0 +1,72 @@
+# app/core/audio_formats.py
+"""
+TTS 下行可协商的输出格式。name 与 ElevenLabs 的 output_format 取值一致，
+客户端在 /ws/tts-audio 的 start 消息里用 format 指定（也接受下面的简写别名）。
+"""
+import shutil
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class TtsFormat:
+    name: str              # 规范名，同时作为 ElevenLabs output_format
+    codec: str             # mp3 / opus / pcm
+    sample_rate: int
+    bitrate_kbps: Optional[int]
+    mime: str
+
+    def ffmpeg_output_args(self) -> list[str]:
+        """本地从 PCM 编码到该格式时 ffmpeg 的输出参数（写到 stdout）"""
+        if self.codec == "mp3":
+            return ["-c:a", "libmp3lame", "-b:a", f"{self.bitrate_kbps}k", "-ar", str(self.sample_rate), "-f", "mp3"]
+        if self.codec == "opus":
+            return ["-c:a", "libopus", "-b:a", f"{self.bitrate_kbps}k", "-application", "voip", "-f", "ogg"]
+        return ["-ar", str(self.sample_rate), "-ac", "1", "-f", "s16le"]
+
+
+def _pcm(rate: int) -> TtsFormat:
+    return TtsFormat(f"pcm_{rate}", "pcm", rate, None, f"audio/pcm;rate={rate};bits=16;channels=1")
+
+
+TTS_FORMATS: dict[str, TtsFormat] = {f.name: f for f in (
+    TtsFormat("mp3_44100_128", "mp3", 44100, 128, "audio/mpeg"),
+    TtsFormat("mp3_44100_64", "mp3", 44100, 64, "audio/mpeg"),
+    TtsFormat("mp3_22050_32", "mp3", 22050, 32, "audio/mpeg"),
+    TtsFormat("opus_48000_64", "opus", 48000, 64, "audio/ogg;codecs=opus"),
+    TtsFormat("opus_48000_32", "opus", 48000, 32, "audio/ogg;codecs=opus"),
+    _pcm(16000),
+    _pcm(24000),
+    _pcm(44100),
+)}
+
+_ALIASES = {
+    "mp3": "mp3_44100_128",
+    "audio/mpeg": "mp3_44100_128",
+    "opus": "opus_48000_32",
+    "pcm": "pcm_24000",
+    "pcm16": "pcm_16000",
+}
+
+DEFAULT_TTS_FORMAT = "mp3_44100_128"
+
+# 多个订阅者格式不一致时，上游只合成一次 PCM，再在本地编码成各自的格式
+MIXED_SOURCE_FORMAT = "pcm_24000"
+
+
+def resolve_tts_format(requested: Optional[str]) -> TtsFormat:
+    """未知/缺省一律回落到默认 mp3，保证旧客户端行为不变"""
+    key = (requested or "").strip().lower()
+    key = _ALIASES.get(key, key)
+    return TTS_FORMATS.get(key) or TTS_FORMATS[DEFAULT_TTS_FORMAT]
+
+
+def negotiate_tts_format(requested: Optional[str]) -> TtsFormat:
+    """
+    订阅时协商下行格式（结果写进 ready，之后不再改变）。
+    订阅者格式不一致时靠本地 ffmpeg 转码；没有 ffmpeg 就只能人人默认格式，非默认的请求在这里就降级
+    """
+    fmt = resolve_tts_format(requested)
+    if fmt.name != DEFAULT_TTS_FORMAT and shutil.which("ffmpeg") is None:
+        return TTS_FORMATS[DEFAULT_TTS_FORMAT]
+    return fmt
@@ -0,0 +1,159 @@
+# app/core/db_pool.py
+"""
+Postgres 连接池：显式配置 + 预热 + 健康度。
+  - 作为 Tortoise 的 engine 模块使用（"engine": "app.core.db_pool"，见 app.core.db）：
+    InstrumentedAsyncpgClient 只在建池时把 asyncpg 池包一层，记录借用等待时间、在用 / 排队连接数，
+    并给借连接加上 DB_POOL_ACQUIRE_TIMEOUT_SECONDS 超时（池耗尽时请求快速失败，而不是无限排队）
+  - warm_pool：启动时并发借满 min_size 个连接各跑一次 SELECT 1，第一个请求不用付建连的钱
+  - readiness：/readyz 用，汇报池利用率、最近的借用等待与一次数据库往返延迟；池耗尽或库不通时 ready=False
+SQLite 没有连接池，只做往返探测。
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Optional
+
+from tortoise import connections
+from tortoise.backends.asyncpg.client import AsyncpgDBClient
+
+from app.config import settings
+from app.core.log import get_logger
+from app.core.metrics import Counter, Gauge, Histogram
+
+log = get_logger(__name__)
+
+db_pool_size = Gauge("db_pool_size", "Open connections in the DB pool")
+db_pool_in_use = Gauge("db_pool_in_use", "DB pool connections currently checked out")
+db_pool_waiting = Gauge("db_pool_waiting", "Tasks waiting to acquire a DB pool connection")
+db_pool_acquire_seconds = Histogram(
+    "db_pool_acquire_seconds", "Time spent waiting for a DB pool connection",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+db_pool_acquire_timeouts_total = Counter(
+    "db_pool_acquire_timeouts_total", "DB pool acquisitions that hit DB_POOL_ACQUIRE_TIMEOUT_SECONDS")
+
+# 最近这么多次借用的等待时间，/readyz 汇报平均与最大值
+_RECENT_WAITS = 256
+
+
+class _TimedPool:
+    """asyncpg.Pool 的薄包装：Tortoise 只调 acquire / release，其余属性原样转发"""
+
+    def __init__(self, pool, max_size: int):
+        self._pool = pool
+        self.max_size = max_size
+        self.in_use = 0
+        self.waiting = 0
+        self.recent_waits: deque = deque(maxlen=_RECENT_WAITS)
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    async def acquire(self):
+        timeout = settings.db_pool_acquire_timeout_seconds or None
+        self.waiting += 1
+        db_pool_waiting.set(self.waiting)
+        t0 = time.perf_counter()
+        try:
+            conn = await self._pool.acquire(timeout=timeout)
+        except asyncio.TimeoutError:
+            db_pool_acquire_timeouts_total.inc()
+            log.warning("db.pool_exhausted", waited_s=timeout, in_use=self.in_use, max_size=self.max_size)
+            raise
+        finally:
+            waited = time.perf_counter() - t0
+            self.waiting -= 1
+            db_pool_waiting.set(self.waiting)
+            db_pool_acquire_seconds.observe(waited)
+            self.recent_waits.append(waited)
+        self.in_use += 1
+        db_pool_in_use.set(self.in_use)
+        db_pool_size.set(self._pool.get_size())
+        return conn
+
+    async def release(self, conn):
+        self.in_use -= 1
+        db_pool_in_use.set(self.in_use)
+        await self._pool.release(conn)
+
+    def exhausted(self) -> bool:
+        return self.in_use >= self.max_size and self.waiting > 0
+
+    def status(self) -> dict:
+        waits = list(self.recent_waits)
+        return {
+            "size": self._pool.get_size(),
+            "idle": self._pool.get_idle_size(),
+            "minSize": self._pool.get_min_size(),
+            "maxSize": self.max_size,
+            "inUse": self.in_use,
+            "waiting": self.waiting,
+            "utilization": round(self.in_use / self.max_size, 3) if self.max_size else None,
+            "acquireWaitMs": {
+                "avg": round(sum(waits) / len(waits) * 1000, 2) if waits else 0.0,
+                "max": round(max(waits) * 1000, 2) if waits else 0.0,
+                "samples": len(waits),
+            },
+        }
+
+
+class InstrumentedAsyncpgClient(AsyncpgDBClient):
+    async def create_pool(self, **kwargs):
+        pool = await super().create_pool(**kwargs)
+        return _TimedPool(pool, self.pool_maxsize)
+
+
+# Tortoise 的 engine 模块约定
+client_class = InstrumentedAsyncpgClient
+
+
+def pool_credentials() -> dict:
+    """注入 Postgres 连接配置的池参数（DATABASE_URL 的查询参数里显式写了的优先）"""
+    return {
+        "minsize": settings.db_pool_min_size,
+        "maxsize": settings.db_pool_max_size,
+        "max_inactive_connection_lifetime": settings.db_pool_max_inactive_seconds,
+        "statement_cache_size": settings.db_statement_cache_size,
+    }
+
+
+def _pool() -> Optional[_TimedPool]:
+    pool = getattr(connections.get("default"), "_pool", None)
+    return pool if isinstance(pool, _TimedPool) else None
+
+
+async def warm_pool():
+    """并发借出 min_size 个连接各跑一次 SELECT 1（顺带触发建池）；失败只记日志，不阻止启动"""
+    if not settings.db_pool_warmup:
+        return
+    conn = connections.get("default")
+    n = settings.db_pool_min_size if isinstance(conn, InstrumentedAsyncpgClient) else 1
+    t0 = time.perf_counter()
+    try:
+        await asyncio.gather(*(conn.execute_query("SELECT 1") for _ in range(max(1, n))))
+    except Exception as e:
+        log.warning("db.pool_warmup_failed", error=repr(e))
+        return
+    pool = _pool()
+    if pool is not None:
+        db_pool_size.set(pool.get_size())
+    log.info("db.pool_warm", connections=n, ms=round((time.perf_counter() - t0) * 1000, 1))
+
+
+async def readiness() -> dict:
+    """池耗尽时不再探测（探测本身也要排队借连接）；否则限时跑一次 SELECT 1 测往返"""
+    pool = _pool()
+    out = {"ready": False, "db": {"ok": False, "latencyMs": None}, "pool": pool.status() if pool else None}
+    if pool is not None and pool.exhausted():
+        out["db"]["error"] = "POOL_EXHAUSTED"
+        return out
+    t0 = time.perf_counter()
+    try:
+        await asyncio.wait_for(
+            connections.get("default").execute_query("SELECT 1"), settings.db_ready_timeout_seconds)
+    except Exception as e:
+        out["db"]["error"] = "TIMEOUT" if isinstance(e, asyncio.TimeoutError) else repr(e)
+        return out
+    out["db"] = {"ok": True, "latencyMs": round((time.perf_counter() - t0) * 1000, 2)}
+    out["ready"] = True
+    return out
@@ -0,0 +1,177 @@
+# app/core/db_stats.py
+"""
+数据库查询统计：
+  - 包装 Tortoise 各后端客户端的 execute_* 方法，每条语句计时（db_queries_total / db_query_seconds）
+  - 每个 HTTP 请求一份统计（contextvar）：查询条数、DB 总耗时、最慢的一条；
+    记进按路由分的直方图，开发环境（或 DB_STATS_HEADERS=true）时写进响应头 X-DB-*
+  - 慢查询日志：超过 DB_SLOW_QUERY_MS 的语句连同 app 内的调用位置一起记录
+  - 查询预算：单个请求超过 DB_QUERY_BUDGET 条即记 db.query_budget_exceeded，N+1 在开发期就会冒出来
+"""
+import contextvars
+import functools
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.core.log import get_logger
+from app.core.metrics import Counter, Histogram
+
+log = get_logger(__name__)
+
+db_queries_total = Counter("db_queries_total", "SQL statements executed, by operation")
+db_query_seconds = Histogram(
+    "db_query_seconds", "SQL statement latency",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+db_slow_queries_total = Counter("db_slow_queries_total", "SQL statements slower than DB_SLOW_QUERY_MS")
+db_request_queries = Histogram(
+    "db_request_queries", "SQL statements per HTTP request, by route",
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+db_request_seconds = Histogram(
+    "db_request_seconds", "Total DB time per HTTP request, by route",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+db_query_budget_exceeded_total = Counter(
+    "db_query_budget_exceeded_total", "HTTP requests that ran more SQL statements than DB_QUERY_BUDGET, by route")
+
+_EXECUTE_METHODS = ("execute_query", "execute_query_dict", "execute_insert", "execute_many", "execute_script")
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_SQL_LOG_CHARS = 500
+
+
+class QueryStats:
+    __slots__ = ("count", "seconds", "slowest", "slowest_sql")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest = 0.0
+        self.slowest_sql: Optional[str] = None
+
+
+_stats: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar("db_stats", default=None)
+# 后端方法之间会互相调用（如事务里的 execute_many），只记最外层一次
+_inside: contextvars.ContextVar[bool] = contextvars.ContextVar("db_stats_inside", default=False)
+
+
+@contextmanager
+def track_queries():
+    """统计 with 块内（及其中创建的 task）执行的语句：with track_queries() as st: ...; st.count"""
+    st = QueryStats()
+    token = _stats.set(st)
+    try:
+        yield st
+    finally:
+        _stats.reset(token)
+
+
+def _call_site() -> Optional[str]:
+    """app 目录下、本模块之外最近的一帧：慢查询是哪个路由 / 服务发出的"""
+    f = sys._getframe(2)
+    while f is not None:
+        path = f.f_code.co_filename
+        if path.startswith(_APP_DIR) and path != __file__:
+            return f"{os.path.relpath(path, _APP_DIR)}:{f.f_lineno} {f.f_code.co_name}"
+        f = f.f_back
+    return None
+
+
+def _record(sql: str, elapsed: float):
+    op = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else "UNKNOWN"
+    db_queries_total.inc(op=op)
+    db_query_seconds.observe(elapsed)
+    st = _stats.get()
+    if st is not None:
+        st.count += 1
+        st.seconds += elapsed
+        if elapsed > st.slowest:
+            st.slowest, st.slowest_sql = elapsed, sql
+    if settings.db_slow_query_ms > 0 and elapsed * 1000 >= settings.db_slow_query_ms:
+        db_slow_queries_total.inc()
+        log.warning("db.slow_query", ms=round(elapsed * 1000, 1), sql=sql[:_SQL_LOG_CHARS], site=_call_site())
+
+
+def _wrap(fn):
+    @functools.wraps(fn)
+    async def wrapper(self, query, *args, **kwargs):
+        if _inside.get():
+            return await fn(self, query, *args, **kwargs)
+        token = _inside.set(True)
+        t0 = time.perf_counter()
+        try:
+            return await fn(self, query, *args, **kwargs)
+        finally:
+            _inside.reset(token)
+            _record(query, time.perf_counter() - t0)
+
+    wrapper._db_stats = True
+    return wrapper
+
+
+def instrument_db():
+    """给已加载的全部 Tortoise 后端客户端类装上计时（幂等；在 Tortoise.init 之后调用）"""
+    from tortoise.backends.base.client import BaseDBAsyncClient
+
+    pending = [BaseDBAsyncClient]
+    seen = set()
+    while pending:
+        cls = pending.pop()
+        if cls in seen:
+            continue
+        seen.add(cls)
+        pending.extend(cls.__subclasses__())
+        for name in _EXECUTE_METHODS:
+            fn = cls.__dict__.get(name)
+            if fn is not None and not getattr(fn, "_db_stats", False):
+                setattr(cls, name, _wrap(fn))
+
+
+def _route_name(scope: Scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class DbStatsMiddleware:
+    """每个 HTTP 请求一份查询统计：指标按路由模板聚合，可选写进响应头，超预算记日志"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.headers = settings.db_stats_headers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries() as st:
+            async def send_with_stats(message: Message):
+                if message["type"] == "http.response.start" and self.headers:
+                    headers = list(message.get("headers", []))
+                    headers += [
+                        (b"x-db-queries", str(st.count).encode()),
+                        (b"x-db-time-ms", f"{st.seconds * 1000:.1f}".encode()),
+                        (b"x-db-slowest-ms", f"{st.slowest * 1000:.1f}".encode()),
+                    ]
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_stats)
+            finally:
+                route = _route_name(scope)
+                db_request_queries.observe(st.count, route=route)
+                db_request_seconds.observe(st.seconds, route=route)
+                budget = settings.db_query_budget
+                if budget > 0 and st.count > budget:
+                    db_query_budget_exceeded_total.inc(route=route)
+                    log.warning(
+                        "db.query_budget_exceeded", route=route, method=scope["method"], queries=st.count,
+                        budget=budget, db_ms=round(st.seconds * 1000, 1),
+                        slowest_sql=(st.slowest_sql or "")[:_SQL_LOG_CHARS],
+                    )
@@ -0,0 +1,41 @@
+# app/core/framing.py
+"""
+/ws/conversation 的二进制分帧：每帧 = 6 字节头 + 负载
+  头（大端）: channel u8 | type u8 | seq u32
+  - channel: 1=upload 2=text 3=tts
+  - type   : 1=json（负载为 UTF-8 JSON，与旧三条 socket 的控制消息格式一致）
+             2=audio（负载为原始音频字节）
+  - seq    : 每个方向、每个 channel 独立递增
+"""
+import struct
+
+HEADER = struct.Struct(">BBI")
+HEADER_SIZE = HEADER.size
+
+CH_UPLOAD = 1
+CH_TEXT = 2
+CH_TTS = 3
+CHANNELS = (CH_UPLOAD, CH_TEXT, CH_TTS)
+
+T_JSON = 1
+T_AUDIO = 2
+
+SEQ_MASK = 0xFFFFFFFF
+
+
+class FrameError(ValueError):
+    pass
+
+
+def pack_frame(channel: int, ftype: int, seq: int, payload: bytes) -> bytes:
+    return HEADER.pack(channel, ftype, seq & SEQ_MASK) + payload
+
+
+def unpack_frame(data: bytes) -> tuple[int, int, int, memoryview]:
+    """返回 (channel, type, seq, payload)；payload 为 memoryview，不拷贝"""
+    if len(data) < HEADER_SIZE:
+        raise FrameError("frame too short")
+    channel, ftype, seq = HEADER.unpack_from(data)
+    if channel not in CHANNELS or ftype not in (T_JSON, T_AUDIO):
+        raise FrameError(f"bad frame header channel={channel} type={ftype}")
+    return channel, ftype, seq, memoryview(data)[HEADER_SIZE:]
@@ -0,0 +1,100 @@
+# app/core/heartbeat.py
+"""
+WebSocket 应用层心跳：服务端每 WS_PING_INTERVAL_SECONDS 发一条 {"type": "ping", "ts"}，客户端回 pong。
+收到客户端的任何消息都算活着（touch）；超过 WS_IDLE_TIMEOUT_SECONDS 什么都没收到就主动关闭连接，
+半开的 TCP（客户端早已消失但没有 FIN）不会再一直占着 Channel 里的订阅。
+ASGI 拿不到协议层的 ping/pong 帧，所以用 JSON 消息实现。
+空闲超时只对回过 pong 的客户端生效：只收不发的旧客户端不会被每分钟踢一次，
+它们的死连接靠 uvicorn 协议层的 ping（--ws-ping-interval / --ws-ping-timeout）发现。
+"""
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable, Optional
+
+from starlette.websockets import WebSocket
+
+from app.config import settings
+from app.core.log import get_logger
+from app.core.metrics import Counter
+
+log = get_logger(__name__)
+
+ws_idle_timeouts_total = Counter(
+    "ws_idle_timeouts_total", "WebSocket connections closed after missing heartbeats, by endpoint")
+
+# 1001 going away：连接空闲超时，客户端可以直接重连（带 resumeFrom 补齐）
+IDLE_CLOSE_CODE = 1001
+
+
+def ping_msg() -> str:
+    return json.dumps({"type": "ping", "ts": int(time.time() * 1000)})
+
+
+class Heartbeat:
+    """
+    每条连接一个：
+        async with Heartbeat(ws, "ws_text") as hb:
+            while True:
+                raw = await ws.receive_text()
+                hb.touch()
+                if msg.get("type") == "pong":
+                    hb.pong()
+    send_ping 缺省为 ws.send_text(ping_msg())；多路复用连接传自己的发送函数（要加帧头）
+    """
+
+    def __init__(
+        self,
+        ws: WebSocket,
+        endpoint: str,
+        send_ping: Optional[Callable[[], Awaitable[None]]] = None,
+        interval: Optional[float] = None,
+        idle_timeout: Optional[float] = None,
+    ):
+        self.ws = ws
+        self.endpoint = endpoint
+        self.interval = settings.ws_ping_interval_seconds if interval is None else interval
+        self.idle_timeout = settings.ws_idle_timeout_seconds if idle_timeout is None else idle_timeout
+        self._send_ping = send_ping or (lambda: ws.send_text(ping_msg()))
+        self.last_seen = time.monotonic()
+        self.armed = False      # 收到过 pong 才开始计空闲超时
+        self.expired = False
+        self._task: Optional[asyncio.Task] = None
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def pong(self):
+        """客户端回了 pong：说明它认得应用层心跳，从此开始计空闲超时"""
+        self.armed = True
+        self.touch()
+
+    async def __aenter__(self) -> "Heartbeat":
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.armed and self.idle_timeout > 0 and time.monotonic() - self.last_seen > self.idle_timeout:
+                await self._expire()
+                return
+            try:
+                await self._send_ping()
+            except Exception:
+                return  # 连接已经断了，收帧循环自己会发现
+
+    async def _expire(self):
+        self.expired = True
+        ws_idle_timeouts_total.inc(endpoint=self.endpoint)
+        log.info("ws.idle_timeout", endpoint=self.endpoint, idle_timeout_s=self.idle_timeout)
+        try:
+            # 对端已消失时关闭握手等不到回应，不在这里久等；收帧循环随后收到 disconnect 并退订
+            await asyncio.wait_for(self.ws.close(code=IDLE_CLOSE_CODE), 1.0)
+        except Exception:
+            pass
@@ -0,0 +1,34 @@
+# app/core/http_clients.py
+"""
+按提供方共享的 httpx 连接池：同一上游复用 TCP/TLS 连接，不再每次调用都新建 AsyncClient。
+超时按请求传入（ASR / TTS 各自的时限不同），这里的客户端本身不设默认超时。
+应用关闭时由 main.on_shutdown 调 close_all()。
+"""
+from typing import Dict
+
+import httpx
+
+from app.config import settings
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def get_client(name: str) -> httpx.AsyncClient:
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=None,
+            limits=httpx.Limits(
+                max_connections=settings.http_pool_max_connections,
+                max_keepalive_connections=settings.http_pool_max_connections,
+                keepalive_expiry=settings.http_keepalive_seconds,
+            ),
+        )
+        _clients[name] = client
+    return client
+
+
+async def close_all():
+    for client in list(_clients.values()):
+        await client.aclose()
+    _clients.clear()
@@ -0,0 +1,175 @@
+# app/core/log.py
+"""
+结构化日志（替代热路径上的 print）：
+  - 非阻塞：app.* 日志先进有界队列（QueueHandler），由后台线程（QueueListener）写 stdout；
+    队列满了直接丢弃并计数（log_dropped_total），事件循环永远不会卡在 stdout 上
+  - 结构化：log.info("asr.done", ms=812, chars=32) —— 事件名 + 字段；
+    conv_id / utterance_id 等通过 log_context 绑在 contextvar 上，同一 task（及其派生 task）里的日志自动带上
+  - 分模块级别：LOG_LEVEL 全局，LOG_LEVELS="app.services.tts_elevenlabs=DEBUG,..." 单独调整
+  - 采样：高频事件 log.debug("ws.connected", sample=100) 只记每 100 次中的 1 次；LOG_SAMPLE 可按事件名覆盖
+  - 脱敏：字段名为 text / transcript 的值默认只记录长度，LOG_TRANSCRIPTS=true 才输出原文
+"""
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from app.config import settings
+from app.core.metrics import Counter
+
+log_dropped_total = Counter("log_dropped_total", "Log records dropped because the log queue was full")
+
+_REDACTED_FIELDS = ("text", "transcript")
+
+_context: contextvars.ContextVar[dict] = contextvars.ContextVar("log_context", default={})
+
+
+@contextmanager
+def log_context(**fields):
+    """在当前上下文（及此后创建的 task）里给所有日志附加字段，如 conv_id / utterance_id"""
+    token = _context.set({**_context.get(), **{k: v for k, v in fields.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def bind_context(**fields):
+    """不需要恢复的场景（如整条连接 / 整个 task 的生命周期）直接绑定"""
+    _context.set({**_context.get(), **{k: v for k, v in fields.items() if v is not None}})
+
+
+def _redact(fields: dict) -> dict:
+    if settings.log_transcripts:
+        return fields
+    for k in _REDACTED_FIELDS:
+        v = fields.get(k)
+        if isinstance(v, str):
+            fields[k] = f"<{len(v)} chars>"
+    return fields
+
+
+class StructLogger:
+    def __init__(self, name: str):
+        self._logger = logging.getLogger(name)
+        self._seen: Dict[str, int] = {}
+
+    def _log(self, level: int, event: str, sample: Optional[int], exc_info, fields: dict):
+        if not self._logger.isEnabledFor(level):
+            return
+        every = _sample_overrides.get(event, sample) or 1
+        if every > 1:
+            n = self._seen.get(event, 0)
+            self._seen[event] = n + 1
+            if n % every:
+                return
+            fields["sampled"] = every
+        merged = _redact({**_context.get(), **fields})
+        self._logger.log(level, event, exc_info=exc_info, extra={"fields": merged})
+
+    def debug(self, event: str, sample: Optional[int] = None, **fields):
+        self._log(logging.DEBUG, event, sample, None, fields)
+
+    def info(self, event: str, sample: Optional[int] = None, **fields):
+        self._log(logging.INFO, event, sample, None, fields)
+
+    def warning(self, event: str, sample: Optional[int] = None, exc_info=None, **fields):
+        self._log(logging.WARNING, event, sample, exc_info, fields)
+
+    def error(self, event: str, sample: Optional[int] = None, exc_info=None, **fields):
+        self._log(logging.ERROR, event, sample, exc_info, fields)
+
+
+def get_logger(name: str) -> StructLogger:
+    return StructLogger(name)
+
+
+# -------- 输出 --------
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """队列满了丢弃（不阻塞调用方）；入队前只做最便宜的准备，格式化留给后台线程"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_dropped_total.inc()
+
+
+def _iso(created: float) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(created)) + f".{int(created % 1 * 1000):03d}Z"
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        out = {"ts": _iso(record.created), "level": record.levelname, "logger": record.name, "event": record.msg}
+        out.update(getattr(record, "fields", {}))
+        if record.exc_text:
+            out["exc"] = record.exc_text
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """开发用：2026-01-01T00:00:00.000Z INFO  ws_upload upload.start conv_id=… accent=…"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = " ".join(f"{k}={v}" for k, v in getattr(record, "fields", {}).items())
+        line = f"{_iso(record.created)} {record.levelname:<5} {record.name.rsplit('.', 1)[-1]} {record.msg}"
+        if fields:
+            line += " " + fields
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+def _parse_pairs(spec: str) -> Dict[str, str]:
+    pairs = {}
+    for item in spec.split(","):
+        if "=" in item:
+            k, v = item.split("=", 1)
+            if k.strip() and v.strip():
+                pairs[k.strip()] = v.strip()
+    return pairs
+
+
+_sample_overrides: Dict[str, int] = {k: int(v) for k, v in _parse_pairs(settings.log_sample).items()}
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging():
+    """挂到 "app" 日志树上（不影响 uvicorn 自己的日志）；重复调用无副作用"""
+    global _listener
+    if _listener is not None:
+        return
+    root = logging.getLogger("app")
+    root.setLevel(settings.log_level.upper())
+    for name, level in _parse_pairs(settings.log_levels).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    sink = logging.StreamHandler(sys.stdout)
+    sink.setFormatter(JsonFormatter() if settings.log_format == "json" else TextFormatter())
+    q: queue.Queue = queue.Queue(maxsize=settings.log_queue_size)
+    root.handlers = [_DroppingQueueHandler(q)]
+    root.propagate = False
+    _listener = logging.handlers.QueueListener(q, sink, respect_handler_level=False)
+    _listener.start()
+
+
+def shutdown_logging():
+    """停机时把队列里剩下的写完"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,139 @@
+# app/core/loop_monitor.py
+"""
+事件循环延迟监控 + 过载保护：
+  - 采样：每 LOOP_LAG_INTERVAL_MS 睡一次，实际醒来比预期晚多少就是循环延迟，记进直方图；
+    lag 取“上升立即跟随、下降缓慢衰减”的平滑值，避免刚恢复就把流量全放进来
+  - 看门狗线程：采样协程超过 LOOP_STALL_DUMP_MS 没有心跳（循环被同步代码卡住），
+    直接抓事件循环线程的调用栈和当前 task 记日志，卡住的是谁一目了然
+  - 过载：平滑 lag 超过 LOAD_SHED_LAG_MS 时拒绝新的上传会话（SERVER_BUSY / 1013）与
+    LOAD_SHED_PATHS 里的昂贵 REST 接口（503 + Retry-After），已在进行的语音段不受影响
+"""
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import settings
+from app.core.log import get_logger
+from app.core.metrics import Counter, Gauge, Histogram
+
+log = get_logger(__name__)
+
+event_loop_lag_seconds = Histogram(
+    "event_loop_lag_seconds", "Event loop scheduling lag per sample",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+event_loop_lag_smoothed_seconds = Gauge(
+    "event_loop_lag_smoothed_seconds", "Smoothed event loop lag used for load shedding")
+event_loop_stalls_total = Counter(
+    "event_loop_stalls_total", "Event loop stalls longer than LOOP_STALL_DUMP_MS (stack logged)")
+load_shed_total = Counter("load_shed_total", "Requests rejected while the event loop was overloaded, by endpoint")
+
+# 平滑 lag 下降时的衰减系数（每个采样周期保留的比例）
+_DECAY = 0.7
+
+
+class LoopMonitor:
+    def __init__(self):
+        self.lag = 0.0
+        self._beat = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def overloaded(self) -> bool:
+        return settings.load_shed_lag_ms > 0 and self.lag * 1000 > settings.load_shed_lag_ms
+
+    def start(self):
+        interval = settings.loop_lag_interval_ms / 1000
+        if interval <= 0 or self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.create_task(self._sample(interval))
+        if settings.loop_stall_dump_ms > 0:
+            self._stop.clear()
+            self._watchdog = threading.Thread(
+                target=self._watch, args=(settings.loop_stall_dump_ms / 1000,), name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._watchdog is not None:
+            self._stop.set()
+            self._watchdog = None
+
+    async def _sample(self, interval: float):
+        stall = settings.loop_stall_dump_ms / 1000
+        while True:
+            t0 = time.monotonic()
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            self._beat = now
+            lag = max(0.0, now - t0 - interval)
+            event_loop_lag_seconds.observe(lag)
+            self.lag = lag if lag > self.lag else self.lag * _DECAY + lag * (1 - _DECAY)
+            event_loop_lag_smoothed_seconds.set(self.lag)
+            if stall > 0 and lag >= stall:
+                log.warning("loop.lag", lag_ms=round(lag * 1000))
+
+    def _watch(self, threshold: float):
+        """独立线程：循环卡住期间采样协程无法更新心跳，这里替它看着，卡住一次只抓一次栈"""
+        dumped_for = None
+        while not self._stop.wait(threshold / 2):
+            beat = self._beat
+            stalled = time.monotonic() - beat
+            if stalled < threshold or dumped_for == beat:
+                continue
+            dumped_for = beat
+            event_loop_stalls_total.inc()
+            frame = sys._current_frames().get(self._loop_thread)
+            log.warning(
+                "loop.stall",
+                stalled_ms=round(stalled * 1000),
+                task=self._current_task(),
+                stack="".join(traceback.format_stack(frame)) if frame is not None else None,
+            )
+
+    def _current_task(self) -> Optional[str]:
+        try:
+            task = asyncio.current_task(self._loop)
+        except Exception:
+            return None
+        if task is None:
+            return None
+        coro = task.get_coro()
+        return f"{task.get_name()} {getattr(coro, '__qualname__', coro)!s}"
+
+
+loop_monitor = LoopMonitor()
+
+
+class LoadShedMiddleware:
+    """过载时对 LOAD_SHED_PATHS（前缀匹配）直接回 503，不进入路由；其余请求照常处理"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.paths = tuple(settings.load_shed_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http" and loop_monitor.overloaded() and scope["method"] != "OPTIONS":
+            path = scope["path"]
+            for prefix in self.paths:
+                if path.startswith(prefix):
+                    load_shed_total.inc(endpoint=prefix)
+                    resp = JSONResponse(
+                        {"detail": "SERVER_BUSY"}, status_code=503, headers={"Retry-After": "1"})
+                    await resp(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
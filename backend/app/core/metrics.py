@@ -0,0 +1,102 @@
+# app/core/metrics.py
+"""
+进程内指标（Prometheus 文本格式，由 GET /metrics 导出）。
+只做计数器 / 仪表 / 直方图三种，够用即可，不引入 prometheus_client。
+"""
+import bisect
+from typing import Dict, Iterable, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _key(labels: dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: LabelKey, extra: Iterable[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        _REGISTRY[name] = self
+
+    def _lines(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        head = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(head + self._lines())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        k = _key(labels)
+        self._values[k] = self._values.get(k, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_key(labels), 0.0)
+
+    def _lines(self) -> list[str]:
+        return [f"{self.name}{_fmt_labels(k)} {v}" for k, v in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[_key(labels)] = float(value)
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float]):
+        super().__init__(name, help)
+        self.buckets = sorted(buckets)
+        # labels -> [每个桶的计数..., +Inf 计数, sum]
+        self._values: Dict[LabelKey, list] = {}
+
+    def observe(self, value: float, **labels):
+        k = _key(labels)
+        row = self._values.get(k)
+        if row is None:
+            row = self._values[k] = [0] * (len(self.buckets) + 1) + [0.0]
+        row[bisect.bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def _lines(self) -> list[str]:
+        out = []
+        for k, row in self._values.items():
+            acc = 0
+            for i, le in enumerate(self.buckets):
+                acc += row[i]
+                out.append(f"{self.name}_bucket{_fmt_labels(k, [('le', str(le))])} {acc}")
+            acc += row[len(self.buckets)]
+            out.append(f"{self.name}_bucket{_fmt_labels(k, [('le', '+Inf')])} {acc}")
+            out.append(f"{self.name}_sum{_fmt_labels(k)} {row[-1]}")
+            out.append(f"{self.name}_count{_fmt_labels(k)} {acc}")
+        return out
+
+
+_REGISTRY: Dict[str, _Metric] = {}
+
+
+def render_prometheus() -> str:
+    return "\n".join(m.render() for m in _REGISTRY.values()) + "\n"
@@ -0,0 +1,120 @@
+# app/core/profiler.py
+"""
+线上按需剖析（由管理员接口触发，平时不运行任何东西，零开销）：
+  - CPU：独立线程按固定频率抓 sys._current_frames()，把调用栈折叠成
+    "根;…;叶 次数" 的 collapsed 文本（flamegraph.pl / speedscope / inferno 可直接读）。
+    采样线程只读帧对象，不设 sys.setprofile，被剖析的代码不变慢；同一时间只允许一个剖析
+  - 内存：tracemalloc 按需开启；每次快照与上一次比较，按分配位置列出增长最多的条目，用来找泄漏
+"""
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter as _Tally
+from typing import Dict, Optional
+
+_cpu_lock = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> str:
+    parts = []
+    while frame is not None:
+        parts.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    parts.reverse()
+    return ";".join(parts)
+
+
+def sample_cpu(seconds: float, hz: int, thread_id: Optional[int] = None) -> Dict[str, object]:
+    """
+    同步阻塞 seconds 秒（在线程里调用）。thread_id 给定时只采该线程（如事件循环线程），否则采全部线程。
+    返回 {"samples": 总采样次数, "stacks": {折叠栈: 次数}}
+    """
+    if not _cpu_lock.acquire(blocking=False):
+        raise ProfilerBusy("a CPU profile is already running")
+    try:
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        stacks: _Tally = _Tally()
+        interval = 1.0 / hz
+        end = time.monotonic() + seconds
+        samples = 0
+        while time.monotonic() < end:
+            for tid, frame in sys._current_frames().items():
+                if tid == me or (thread_id is not None and tid != thread_id):
+                    continue
+                # 多线程时以线程名作根，火焰图按线程分开
+                root = "" if thread_id is not None else f"{names.get(tid, tid)};"
+                stacks[root + _collapse(frame)] += 1
+            samples += 1
+            time.sleep(interval)
+        return {"samples": samples, "stacks": dict(stacks)}
+    finally:
+        _cpu_lock.release()
+
+
+def render_collapsed(stacks: Dict[str, int]) -> str:
+    return "".join(f"{stack} {n}\n" for stack, n in sorted(stacks.items(), key=lambda kv: -kv[1]))
+
+
+# -------- 内存 --------
+_last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+
+def memory_start(frames: int):
+    global _last_snapshot
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+        _last_snapshot = None
+
+
+def memory_stop():
+    global _last_snapshot
+    tracemalloc.stop()
+    _last_snapshot = None
+
+
+def _stat_row(stat) -> dict:
+    row = {
+        "where": [f"{f.filename}:{f.lineno}" for f in stat.traceback],
+        "size": stat.size,
+        "count": stat.count,
+    }
+    if hasattr(stat, "size_diff"):
+        row.update(sizeDiff=stat.size_diff, countDiff=stat.count_diff)
+    return row
+
+
+def memory_snapshot(limit: int, group_by: str = "lineno") -> dict:
+    """
+    拍一张快照：返回占用最多的 limit 个分配位置；有上一张快照时另附增长最多的 limit 个（diff）。
+    快照在线程里拍（遍历全部追踪块，堆大时要几百毫秒）
+    """
+    global _last_snapshot
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc is not running")
+    snap = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    current, peak = tracemalloc.get_traced_memory()
+    out = {
+        "tracedBytes": current,
+        "peakBytes": peak,
+        "top": [_stat_row(s) for s in snap.statistics(group_by)[:limit]],
+        "diff": None,
+    }
+    if _last_snapshot is not None:
+        grown = [s for s in snap.compare_to(_last_snapshot, group_by) if s.size_diff > 0]
+        out["diff"] = [_stat_row(s) for s in grown[:limit]]
+    _last_snapshot = snap
+    return out
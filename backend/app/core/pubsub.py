@@ -1,14 +1,31 @@
 # backend/app/core/pubsub.py
-from typing import Dict, Set
-from starlette.websockets import WebSocket
+import asyncio
+from typing import Callable, Dict, Optional, Set, Union
+from starlette.websockets import WebSocket, WebSocketState
 import json
 
+from app.config import settings
+from app.core.audio_formats import DEFAULT_TTS_FORMAT
+from app.core.log import get_logger
+from app.core.metrics import Counter, Gauge
+from app.core.replay import ReplayStore, replay_frames_total, replay_gaps_total
+
+log = get_logger(__name__)
+
+ws_subscribers = Gauge("ws_subscribers", "Live Channel subscribers, by topic")
+ws_subscribers_reaped_total = Counter(
+    "ws_subscribers_reaped_total", "Dead subscribers removed by the Channel sweeper, by topic and reason")
+
 class Channel:
     """
     简单 PubSub：
       - text：发 JSON 文本
-      - tts ：发 JSON 控制 + 二进制音频分片
+      - tts ：发 JSON 控制 + 二进制音频分片；每个订阅者带一个协商好的输出格式，
+              发布时可按格式过滤（fmt=None 表示发给所有人）
+    发布的每一帧同时写进重放缓冲（text 按会话、tts 按会话 + 格式，见 app.core.replay），
+    订阅时带 resume_from 可先补发错过的帧再接实时流。
     由路由负责 ws.accept()；这里不再 accept。
+    路由没来得及退订的死连接（发送失败 / 已关闭）由 sweep 定期清掉，空的 conv_id 键随退订一并删除。
     """
     def __init__(self):
         # topic -> conv_id -> set(WebSocket)
@@ -16,45 +33,204 @@ class Channel:
             "text": {},
             "tts": {},
         }
+        # tts 订阅者 -> 输出格式名（见 app.core.audio_formats）
+        self._tts_fmt: Dict[WebSocket, str] = {}
+        # conv_id -> 在等“最后一个 tts 订阅者离开”的事件（合成中途没人听了就提前关上游）
+        self._tts_idle: Dict[str, asyncio.Event] = {}
+        # conv_id -> 在等“有 tts 订阅者（重新）加入”的事件（断线重连的宽限期）
+        self._tts_back: Dict[str, asyncio.Event] = {}
+        self.replay = ReplayStore()
+        # 发送失败过的订阅者，下一次 sweep 时退订
+        self._failed: Set[WebSocket] = set()
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def _add(self, topic: str, conv_id: str, ws: WebSocket):
+        subs = self._topics[topic].setdefault(conv_id, set())
+        if ws not in subs:
+            subs.add(ws)
+            ws_subscribers.inc(topic=topic)
+
+    def _remove(self, topic: str, conv_id: str, ws: WebSocket):
+        subs = self._topics[topic].get(conv_id)
+        if subs is None or ws not in subs:
+            return
+        subs.discard(ws)
+        ws_subscribers.dec(topic=topic)
+        if not subs:
+            del self._topics[topic][conv_id]
 
     # -------- subscribe / unsubscribe（不 accept，仅登记） --------
-    async def sub_text(self, conv_id: str, ws: WebSocket):
-        self._topics["text"].setdefault(conv_id, set()).add(ws)
+    async def sub_text(self, conv_id: str, ws: WebSocket, resume_from: Optional[int] = None):
+        await self._resume("text", ("text", conv_id), ws, resume_from)
+        self._add("text", conv_id, ws)
 
     def unsub_text(self, conv_id: str, ws: WebSocket):
-        self._topics["text"].get(conv_id, set()).discard(ws)
+        self._remove("text", conv_id, ws)
+
+    async def sub_tts(
+        self, conv_id: str, ws: WebSocket, fmt: str = DEFAULT_TTS_FORMAT, resume_from: Optional[int] = None
+    ):
+        """resume_from=None：若该格式正有一段在播（已发 start 未发 stop），从这段的 start 开始补"""
+        key = ("tts", conv_id, fmt)
+        if resume_from is None:
+            ring = self.replay.get(key)
+            resume_from = ring.open_seq if ring is not None else None
+        await self._resume("tts", key, ws, resume_from)
+        self._add("tts", conv_id, ws)
+        self._tts_fmt[ws] = fmt
+        ev = self._tts_back.pop(conv_id, None)
+        if ev is not None:
+            ev.set()
 
-    async def sub_tts(self, conv_id: str, ws: WebSocket):
-        self._topics["tts"].setdefault(conv_id, set()).add(ws)
+    async def _resume(self, topic: str, key: tuple, ws: WebSocket, seq: Optional[int]):
+        """
+        补发序号 >= seq 的帧。补发期间仍可能有新帧发布，所以循环到追平为止；
+        追平之后调用方同步登记订阅（中间没有 await），不会漏帧也不会重帧。
+        早于缓冲窗口的部分已经丢了：先发一条 gap 告诉客户端，再从最早保留的帧补起
+        """
+        ring = self.replay.get(key)
+        if ring is None or seq is None:
+            return
+        while True:
+            # 比缓冲窗口还旧，或比当前序号还新（空闲太久缓冲被整体清掉后重新编号）
+            if seq < ring.first_seq or seq > ring.next_seq:
+                replay_gaps_total.inc(topic=topic)
+                await ws.send_text(json.dumps({"type": "gap", "from": seq, "to": ring.first_seq}))
+                seq = ring.first_seq
+            frames = ring.since(seq)
+            if not frames:
+                return
+            for f in frames:
+                if isinstance(f.data, str):
+                    await ws.send_text(f.data)
+                else:
+                    await ws.send_bytes(f.data)
+            seq = frames[-1].seq + 1
+            replay_frames_total.inc(len(frames), topic=topic)
 
     def unsub_tts(self, conv_id: str, ws: WebSocket):
-        self._topics["tts"].get(conv_id, set()).discard(ws)
+        self._remove("tts", conv_id, ws)
+        self._tts_fmt.pop(ws, None)
+        if not self.has_tts(conv_id):
+            ev = self._tts_idle.pop(conv_id, None)
+            if ev is not None:
+                ev.set()
 
-    # -------- publish --------
-    async def pub_text(self, conv_id: str, payload: dict):
-        conns = list(self._topics["text"].get(conv_id, set()))
-        msg = json.dumps(payload)
-        for s in conns:
+    def has_tts(self, conv_id: str) -> bool:
+        return bool(self._topics["tts"].get(conv_id))
+
+    async def wait_tts_idle(self, conv_id: str, grace: float = 0.0):
+        """阻塞直到该会话没有任何 tts 订阅者，且 grace 秒内没人重新订阅（给断线重连留的窗口）"""
+        while True:
+            while self.has_tts(conv_id):
+                await self._tts_idle.setdefault(conv_id, asyncio.Event()).wait()
+            if grace <= 0:
+                return
+            back = self._tts_back.setdefault(conv_id, asyncio.Event())
             try:
-                await s.send_text(msg)
-            except Exception:
-                pass
+                await asyncio.wait_for(back.wait(), grace)
+            except asyncio.TimeoutError:
+                if not self.has_tts(conv_id):
+                    self._tts_back.pop(conv_id, None)
+                    return
 
-    async def pub_tts_json(self, conv_id: str, payload: dict):
+    def tts_formats(self, conv_id: str) -> Set[str]:
+        """当前订阅者请求的全部输出格式（去重）"""
+        return {self._tts_fmt.get(s, DEFAULT_TTS_FORMAT) for s in self._topics["tts"].get(conv_id, set())}
+
+    def _tts_conns(self, conv_id: str, fmt: Optional[str]):
         conns = list(self._topics["tts"].get(conv_id, set()))
-        msg = json.dumps(payload)
+        if fmt is None:
+            return conns
+        return [s for s in conns if self._tts_fmt.get(s, DEFAULT_TTS_FORMAT) == fmt]
+
+    def _tts_targets(self, conv_id: str, fmt: Optional[str]) -> Set[str]:
+        """本次发布要写入的 tts 格式：指定格式，或当前订阅的 + 仍有重放缓冲的全部格式"""
+        if fmt is not None:
+            return {fmt}
+        return self.tts_formats(conv_id) | {k[2] for k in self.replay.keys_for("tts", conv_id)}
+
+    def _json_frame(self, key: tuple, payload: dict) -> tuple[int, str]:
+        ring = self.replay.ring(key)
+        seq = ring.reserve()
+        msg = json.dumps({**payload, "seq": seq})
+        self.replay.publish(key, msg, seq)
+        return seq, msg
+
+    async def _send_all(self, conns, data: Union[str, bytes], send: Callable[[WebSocket], Callable]):
         for s in conns:
             try:
-                await s.send_text(msg)
+                await send(s)(data)
             except Exception:
-                pass
+                self._failed.add(s)
 
-    async def pub_tts_bytes(self, conv_id: str, chunk: bytes):
-        conns = list(self._topics["tts"].get(conv_id, set()))
-        for s in conns:
+    # -------- 清理 --------
+    @staticmethod
+    def _is_closed(ws) -> bool:
+        return WebSocketState.DISCONNECTED in (
+            getattr(ws, "client_state", None), getattr(ws, "application_state", None))
+
+    def sweep(self) -> int:
+        """退订发送失败过 / 已关闭的连接（路由没收到 disconnect 的半开连接、心跳超时被关的连接），返回清掉的个数"""
+        reaped = 0
+        for topic, convs in self._topics.items():
+            for conv_id, subs in list(convs.items()):
+                for ws in list(subs):
+                    if ws in self._failed:
+                        reason = "send_failed"
+                    elif self._is_closed(ws):
+                        reason = "closed"
+                    else:
+                        continue
+                    if topic == "tts":
+                        self.unsub_tts(conv_id, ws)
+                    else:
+                        self.unsub_text(conv_id, ws)
+                    ws_subscribers_reaped_total.inc(topic=topic, reason=reason)
+                    reaped += 1
+        self._failed.clear()
+        return reaped
+
+    async def _sweep_forever(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
             try:
-                await s.send_bytes(chunk)
-            except Exception:
-                pass
+                n = self.sweep()
+                if n:
+                    log.info("pubsub.reaped", count=n)
+            except Exception as e:
+                log.error("pubsub.sweep_error", exc_info=e)
+
+    def start_sweeper(self):
+        if self._sweeper is None and settings.ws_sweep_interval_seconds > 0:
+            self._sweeper = asyncio.create_task(self._sweep_forever(settings.ws_sweep_interval_seconds))
+
+    def stop_sweeper(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+
+    # -------- publish --------
+    async def pub_text(self, conv_id: str, payload: dict):
+        _, msg = self._json_frame(("text", conv_id), payload)
+        conns = list(self._topics["text"].get(conv_id, set()))
+        await self._send_all(conns, msg, lambda s: s.send_text)
+
+    async def pub_tts_json(self, conv_id: str, payload: dict, fmt: Optional[str] = None):
+        # 每个格式一个重放缓冲、各自编号，同一条控制消息按格式分别带上自己的 seq
+        for f in self._tts_targets(conv_id, fmt):
+            key = ("tts", conv_id, f)
+            seq, msg = self._json_frame(key, payload)
+            if payload.get("type") == "start":
+                self.replay.ring(key).open_seq = seq
+            elif payload.get("type") == "stop":
+                self.replay.ring(key).open_seq = None
+            await self._send_all(self._tts_conns(conv_id, f), msg, lambda s: s.send_text)
+
+    async def pub_tts_bytes(self, conv_id: str, chunk: bytes, fmt: Optional[str] = None):
+        chunk = chunk if isinstance(chunk, bytes) else bytes(chunk)
+        for f in self._tts_targets(conv_id, fmt):
+            self.replay.publish(("tts", conv_id, f), chunk)
+            await self._send_all(self._tts_conns(conv_id, f), chunk, lambda s: s.send_bytes)
 
 channel = Channel()
@@ -0,0 +1,123 @@
+# app/core/replay.py
+"""
+订阅重放：每个会话（tts 再按输出格式）一个有界环形缓冲，保存最近发布的帧及其序号。
+迟到 / 断线重连的订阅者带上 resumeFrom 即可补齐错过的帧，而不是整段重新合成。
+  - 序号在同一个环内连续：JSON 帧在负载里带 "seq"，二进制帧的序号 = 前一帧 + 1（客户端自己数）
+  - 容量同时受字节数（REPLAY_MAX_BYTES）与存活时间（REPLAY_MAX_AGE_SECONDS）约束，先到先淘汰
+  - 帧按发布时的 str / bytes 对象原样保存、原样重发，不拷贝
+"""
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from app.config import settings
+from app.core.metrics import Counter, Gauge
+
+replay_frames_total = Counter("replay_frames_total", "Frames re-sent to resuming subscribers, by topic")
+replay_gaps_total = Counter("replay_gaps_total", "Resume requests older than the retained window, by topic")
+replay_buffer_bytes = Gauge("replay_buffer_bytes", "Bytes held in subscriber replay buffers")
+
+
+@dataclass
+class Frame:
+    seq: int
+    data: Union[str, bytes]     # str = JSON 文本帧，bytes = 二进制帧
+    size: int
+    at: float
+
+
+class ReplayRing:
+    def __init__(self, max_bytes: int, max_age: float):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.frames: deque[Frame] = deque()
+        self.bytes = 0
+        self.next_seq = 1
+        # 尚未结束的一段（tts 的 start 之后、stop 之前）的起始序号：新订阅者从这里开始补
+        self.open_seq: Optional[int] = None
+
+    def reserve(self) -> int:
+        """先取序号（JSON 帧要把序号写进负载），再 append"""
+        seq = self.next_seq
+        self.next_seq += 1
+        return seq
+
+    def append(self, seq: int, data: Union[str, bytes]):
+        size = len(data)
+        self.frames.append(Frame(seq, data, size, time.monotonic()))
+        self.bytes += size
+        self.evict()
+
+    def evict(self) -> int:
+        """按字节上限与存活时间淘汰最旧的帧，返回释放的字节数"""
+        freed = 0
+        cutoff = time.monotonic() - self.max_age
+        while self.frames and (self.bytes > self.max_bytes or self.frames[0].at < cutoff):
+            f = self.frames.popleft()
+            self.bytes -= f.size
+            freed += f.size
+        if self.open_seq is not None and (not self.frames or self.frames[0].seq > self.open_seq):
+            self.open_seq = None    # 这一段的开头已经被淘汰，从中间补没有意义
+        return freed
+
+    @property
+    def first_seq(self) -> int:
+        return self.frames[0].seq if self.frames else self.next_seq
+
+    def since(self, seq: int) -> List[Frame]:
+        """序号 >= seq 的全部帧（按序）"""
+        if not self.frames or seq >= self.next_seq:
+            return []
+        start = max(0, seq - self.frames[0].seq)
+        return [self.frames[i] for i in range(start, len(self.frames))]
+
+
+Key = Tuple[str, ...]   # ("text", conv_id) / ("tts", conv_id, fmt)
+
+
+class ReplayStore:
+    """key -> ReplayRing；过期的环定期整体清掉，避免会话越积越多"""
+
+    def __init__(self):
+        self._rings: Dict[Key, ReplayRing] = {}
+        self._by_conv: Dict[Tuple[str, str], Set[Key]] = {}   # (topic, conv_id) -> 该会话的全部环
+        self._last_sweep = 0.0
+
+    def ring(self, key: Key) -> ReplayRing:
+        r = self._rings.get(key)
+        if r is None:
+            r = self._rings[key] = ReplayRing(settings.replay_max_bytes, settings.replay_max_age_seconds)
+            self._by_conv.setdefault(key[:2], set()).add(key)
+        return r
+
+    def get(self, key: Key) -> Optional[ReplayRing]:
+        return self._rings.get(key)
+
+    def keys_for(self, topic: str, conv_id: str) -> Set[Key]:
+        return set(self._by_conv.get((topic, conv_id), ()))
+
+    def publish(self, key: Key, data: Union[str, bytes], seq: Optional[int] = None) -> int:
+        r = self.ring(key)
+        if seq is None:
+            seq = r.reserve()
+        before = r.bytes
+        r.append(seq, data)
+        replay_buffer_bytes.inc(r.bytes - before)
+        self._maybe_sweep()
+        return seq
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < 1.0:
+            return
+        self._last_sweep = now
+        for key, r in list(self._rings.items()):
+            replay_buffer_bytes.dec(r.evict())
+            if not r.frames:
+                del self._rings[key]
+                group = self._by_conv.get(key[:2])
+                if group is not None:
+                    group.discard(key)
+                    if not group:
+                        del self._by_conv[key[:2]]
@@ -0,0 +1,305 @@
+# app/core/resilience.py
+"""
+上游调用（ASR / TTS）的时限、重试与对冲请求：
+  - Deadline：每段语音一个总时限（从 stop 开始计），转码 / ASR / TTS 首包共用，层层往下传
+  - retry_async：幂等调用遇到可重试错误时按「全抖动」指数退避重试，退避不会睡过时限
+  - hedged / hedged_stream：首个请求在 p95 阈值内没有结果（首包）就再发一个，先到者胜、另一个取消
+  - CircuitBreaker：提供方连续失败后熔断，快速失败并交给备用提供方
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+import httpx
+
+from app.config import settings
+from app.core.log import get_logger
+from app.core.metrics import Counter, Gauge, Histogram
+
+T = TypeVar("T")
+
+log = get_logger(__name__)
+
+provider_latency_seconds = Histogram(
+    "provider_latency_seconds", "Provider latency (ASR: full response, TTS: first byte)",
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32),
+)
+provider_retries_total = Counter("provider_retries_total", "Provider call retries, by stage")
+provider_hedges_total = Counter(
+    "provider_hedges_total", "Hedged provider requests; result=won when the hedge beat the primary")
+deadline_exceeded_total = Counter("deadline_exceeded_total", "Utterances that ran out of time, by stage")
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, stage: str):
+        super().__init__(f"deadline exceeded during {stage}")
+        self.stage = stage
+
+
+class Deadline:
+    """单调时钟上的绝对截止时间"""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """本次调用可用的超时：剩余时间，且不超过 cap"""
+        r = self.remaining()
+        return r if cap is None else min(r, cap)
+
+    def extend(self, seconds: float):
+        """排队等待（如等前一段语音播完）不该算进本段的处理时限"""
+        self.expires_at += seconds
+
+    def exceeded(self, stage: str) -> DeadlineExceeded:
+        deadline_exceeded_total.inc(stage=stage)
+        return DeadlineExceeded(stage)
+
+    def check(self, stage: str):
+        if self.remaining() <= 0:
+            raise self.exceeded(stage)
+
+
+class LatencyTracker:
+    """滑动窗口延迟样本，用来推导对冲阈值（p95）"""
+
+    def __init__(self, stage: str, window: int = 200, min_samples: int = 20):
+        self.stage = stage
+        self.min_samples = min_samples
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+        provider_latency_seconds.observe(seconds, stage=self.stage)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if len(self._samples) < self.min_samples:
+            return None
+        s = sorted(self._samples)
+        return s[min(len(s) - 1, int(q * len(s)))]
+
+    def hedge_delay(self) -> Optional[float]:
+        """样本不足时不对冲；否则取 p95，且不低于 HEDGE_MIN_DELAY_MS"""
+        p95 = self.quantile(0.95)
+        if p95 is None:
+            return None
+        return max(p95, settings.hedge_min_delay_ms / 1000)
+
+
+def is_retryable(e: BaseException) -> bool:
+    """网络错误 / 超时 / 408、425、429、5xx 可重试；其余（4xx、配置错误等）直接失败"""
+    if isinstance(e, httpx.HTTPStatusError):
+        code = e.response.status_code
+        return code in (408, 425, 429) or code >= 500
+    return isinstance(e, httpx.TransportError)
+
+
+async def retry_async(
+    fn: Callable[[], Awaitable[T]],
+    *,
+    stage: str,
+    deadline: Deadline,
+    attempts: int,
+    retry_on: Callable[[BaseException], bool] = is_retryable,
+) -> T:
+    base = settings.retry_base_delay_ms / 1000
+    cap = settings.retry_max_delay_ms / 1000
+    for attempt in range(1, attempts + 1):
+        deadline.check(stage)
+        try:
+            return await fn()
+        except Exception as e:
+            if attempt >= attempts or not retry_on(e):
+                raise
+            delay = random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+            if delay >= deadline.remaining():
+                raise
+            provider_retries_total.inc(stage=stage)
+            log.info("retry", stage=stage, attempt=attempt, error=repr(e), delay_ms=round(delay * 1000))
+            await asyncio.sleep(delay)
+    raise AssertionError("unreachable")
+
+
+def _record_hedge(stage: str, hedged: bool, hedge_won: bool):
+    if hedged:
+        provider_hedges_total.inc(stage=stage, result="won" if hedge_won else "lost")
+
+
+async def hedged(fn: Callable[[], Awaitable[T]], *, stage: str, delay: Optional[float]) -> T:
+    """
+    一次性调用（如 ASR POST）的对冲：delay 秒内没结果就并发再发一次，取先成功者。
+    delay=None 表示不对冲。fn 必须幂等。
+    """
+    if delay is None:
+        return await fn()
+    primary = asyncio.create_task(fn())
+    tasks = [primary]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            tasks.append(asyncio.create_task(fn()))
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.exception() is None:
+                    _record_hedge(stage, len(tasks) > 1, t is not primary)
+                    return t.result()
+                error = error or t.exception()
+        raise error
+    finally:
+        for t in tasks:
+            if not t.done():
+                t.cancel()
+
+
+EOF = object()
+
+
+async def pump_stream(chunks: AsyncIterator[bytes], q: asyncio.Queue):
+    """在独立 task 里消费上游流（httpx 流的进出都留在同一个 task 内），结果/异常/EOF 放进队列"""
+    try:
+        async for chunk in chunks:
+            await q.put(chunk)
+        await q.put(EOF)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        await q.put(e)
+
+
+async def hedged_stream(
+    factory: Callable[[], AsyncIterator[bytes]],
+    *,
+    stage: str,
+    delay: Optional[float],
+    first_byte_timeout: float,
+    tracker: Optional[LatencyTracker] = None,
+) -> AsyncGenerator[bytes, None]:
+    """
+    流式调用的对冲：只在首包之前对冲。delay 秒内没有首包就再开一路，先出首包者胜，另一路立即关闭；
+    首包之后不再切换（已经发给客户端的字节无法撤回）。
+    首包前失败或超过 first_byte_timeout 则抛出，由外层 retry_async 决定是否重试。
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    streams: list[tuple[asyncio.Queue, asyncio.Task, float]] = []
+    waiters: dict[asyncio.Task, int] = {}
+
+    def _open():
+        q: asyncio.Queue = asyncio.Queue(maxsize=64)
+        streams.append((q, asyncio.create_task(pump_stream(factory(), q)), loop.time()))
+        waiters[asyncio.create_task(q.get())] = len(streams) - 1
+
+    winner: Optional[int] = None
+    try:
+        _open()
+        hedge_at = started + delay if delay is not None else None
+        give_up_at = started + first_byte_timeout
+        first = None
+        error: Optional[BaseException] = None
+        while winner is None:
+            wake_at = min(give_up_at, hedge_at) if hedge_at is not None else give_up_at
+            done, _ = await asyncio.wait(
+                waiters, timeout=max(0.0, wake_at - loop.time()), return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                idx = waiters.pop(t)
+                item = t.result()
+                if isinstance(item, Exception):
+                    error = error or item
+                elif winner is None:
+                    winner, first = idx, item
+            if winner is not None:
+                break
+            if not waiters:
+                raise error
+            now = loop.time()
+            if now >= give_up_at:
+                raise httpx.ReadTimeout(f"{stage}: no first byte within {first_byte_timeout:.1f}s")
+            if hedge_at is not None and now >= hedge_at:
+                hedge_at = None
+                _open()
+
+        _record_hedge(stage, len(streams) > 1, winner > 0)
+        if tracker is not None:
+            tracker.observe(loop.time() - streams[winner][2])
+        for idx, (_, task, _) in enumerate(streams):
+            if idx != winner:
+                task.cancel()
+
+        q = streams[winner][0]
+        item = first
+        while item is not EOF:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+            item = await q.get()
+    finally:
+        for t in waiters:
+            t.cancel()
+        for _, task, _ in streams:
+            task.cancel()
+
+
+provider_circuit_state = Gauge(
+    "provider_circuit_state", "Provider circuit breaker state (0=closed, 1=half-open, 2=open)")
+provider_short_circuits_total = Counter(
+    "provider_short_circuits_total", "Calls rejected without trying because the provider circuit was open")
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败 failure_threshold 次后断开（open），reset_timeout 秒内直接拒绝（快速失败）；
+    冷却期过后放行一个探测请求（half-open），成功则恢复（closed），失败则重新断开。
+    """
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+    _STATE_VALUE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._set(self.CLOSED)
+
+    def _set(self, state: str):
+        self.state = state
+        provider_circuit_state.set(self._STATE_VALUE[state], provider=self.name)
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                provider_short_circuits_total.inc(provider=self.name)
+                return False
+            self._set(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                provider_short_circuits_total.inc(provider=self.name)
+                return False
+            self._probing = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self._probing = False
+        if self.state != self.CLOSED:
+            self._set(self.CLOSED)
+
+    def record_failure(self):
+        self._probing = False
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set(self.OPEN)
+
+    def release(self):
+        """调用被取消 / 时限用尽：不算成功也不算失败，只归还半开状态的探测名额"""
+        self._probing = False
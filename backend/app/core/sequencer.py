@@ -0,0 +1,74 @@
+# app/core/sequencer.py
+"""
+同一会话内多段语音（utterance）并行处理、按序输出：
+  - 每段上传 start 时发一个递增序号
+  - 上传 / 转码 / ASR 各段并行跑；到了输出阶段（text / tts）按序号依次放行，
+    前一段该阶段没结束（或没放弃）之前，后一段在这里等
+  - 任何一段被取消 / 出错都必须 release，否则后面的会一直等
+"""
+import asyncio
+from typing import Dict, Set, Tuple
+
+STAGES = ("text", "tts")
+
+
+class UtteranceSequencer:
+    def __init__(self, stages: Tuple[str, ...] = STAGES):
+        self.stages = stages
+        self._issued: Dict[str, int] = {}                    # conv_id -> 已发出的最大序号
+        self._next: Dict[Tuple[str, str], int] = {}          # (conv_id, stage) -> 下一个放行的序号
+        self._done: Dict[Tuple[str, str], Set[int]] = {}     # (conv_id, stage) -> 已提前结束、尚未轮到的序号
+        self._waiters: Dict[Tuple[str, str, int], asyncio.Event] = {}
+
+    def issue(self, conv_id: str) -> int:
+        n = self._issued.get(conv_id, 0) + 1
+        self._issued[conv_id] = n
+        for st in self.stages:
+            self._next.setdefault((conv_id, st), 1)
+            self._done.setdefault((conv_id, st), set())
+        return n
+
+    async def wait(self, conv_id: str, stage: str, n: int):
+        """阻塞到第 n 段在该阶段轮到自己"""
+        if self._next.get((conv_id, stage), 1) >= n:
+            return
+        key = (conv_id, stage, n)
+        ev = self._waiters.setdefault(key, asyncio.Event())
+        try:
+            await ev.wait()
+        finally:
+            # 等待中被取消时 finish 不会来取走这个事件：自己清掉，否则 _waiters 只增不减
+            if self._waiters.get(key) is ev:
+                del self._waiters[key]
+
+    def finish(self, conv_id: str, stage: str, n: int):
+        """第 n 段该阶段输出完毕（或放弃），放行后续序号"""
+        key = (conv_id, stage)
+        if key not in self._next or n < self._next[key]:
+            return
+        done = self._done[key]
+        done.add(n)
+        while self._next[key] in done:
+            done.discard(self._next[key])
+            self._next[key] += 1
+        ev = self._waiters.pop((conv_id, stage, self._next[key]), None)
+        if ev is not None:
+            ev.set()
+        self._gc(conv_id)
+
+    def release(self, conv_id: str, n: int):
+        """第 n 段结束（正常 / 取消 / 出错）：所有阶段都视为完成"""
+        for st in self.stages:
+            self.finish(conv_id, st, n)
+
+    def _gc(self, conv_id: str):
+        """该会话所有已发序号在所有阶段都放行完：清掉状态，避免会话越积越多"""
+        issued = self._issued.get(conv_id, 0)
+        if all(self._next.get((conv_id, st), 1) > issued for st in self.stages):
+            self._issued.pop(conv_id, None)
+            for st in self.stages:
+                self._next.pop((conv_id, st), None)
+                self._done.pop((conv_id, st), None)
+
+
+sequencer = UtteranceSequencer()
@@ -0,0 +1,131 @@
+# app/core/upload_buffer.py
+"""
+上传音频缓冲：小录音留在内存，超过阈值（或全进程内存预算用完）才落盘。
+同时对单次上传做字节数 / 时长硬上限，超限抛 UploadLimitError，由路由回 error 帧。
+"""
+import os
+import tempfile
+import time
+from typing import Union
+
+from app.config import settings
+
+
+class UploadLimitError(Exception):
+    def __init__(self, code: str, message: str, limit: int):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.limit = limit
+
+    def to_msg(self) -> dict:
+        return {"type": "error", "code": self.code, "message": self.message, "limit": self.limit}
+
+
+class _MemoryBudget:
+    """整个 worker 内所有上传缓冲可占用的内存总量"""
+    def __init__(self, cap: int):
+        self.cap = cap
+        self.used = 0
+
+    def try_reserve(self, n: int) -> bool:
+        if self.used + n > self.cap:
+            return False
+        self.used += n
+        return True
+
+    def release(self, n: int):
+        self.used = max(0, self.used - n)
+
+
+memory_budget = _MemoryBudget(settings.upload_memory_budget)
+
+
+class UploadBuffer:
+    def __init__(
+        self,
+        suffix: str = ".webm",
+        spool_threshold: int = settings.upload_spool_max_memory,
+        max_bytes: int = settings.upload_max_bytes,
+        max_seconds: float = settings.upload_max_seconds,
+        bytes_per_second: int = 0,
+    ):
+        self.suffix = suffix
+        self.spool_threshold = spool_threshold
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        # 裸 PCM 上传时可由字节数精确换算音频时长（0 = 未知，只按墙钟计时）
+        self.bytes_per_second = bytes_per_second
+        self.started = time.monotonic()
+        self.size = 0
+        self._mem = bytearray()
+        self._reserved = 0
+        self._file = None  # 溢出后的 NamedTemporaryFile
+
+    # -------- 写入 --------
+    def remaining_seconds(self) -> float:
+        return self.max_seconds - (time.monotonic() - self.started)
+
+    def write(self, data: bytes):
+        if self.size + len(data) > self.max_bytes:
+            raise UploadLimitError("UPLOAD_TOO_LARGE", "upload exceeds size limit", self.max_bytes)
+        too_long = self.remaining_seconds() <= 0
+        if self.bytes_per_second:
+            too_long = too_long or (self.size + len(data)) / self.bytes_per_second > self.max_seconds
+        if too_long:
+            raise UploadLimitError("UPLOAD_TOO_LONG", "upload exceeds duration limit", int(self.max_seconds))
+
+        if self._file is None:
+            n = len(data)
+            if self.size + n <= self.spool_threshold and memory_budget.try_reserve(n):
+                self._mem += data
+                self._reserved += n
+                self.size += n
+                return
+            self._spill()
+        self._file.write(data)
+        self.size += len(data)
+
+    def _spill(self):
+        self._file = tempfile.NamedTemporaryFile(delete=False, suffix=self.suffix)
+        self._file.write(self._mem)
+        self._mem = bytearray()
+        memory_budget.release(self._reserved)
+        self._reserved = 0
+
+    # -------- 读取 --------
+    @property
+    def in_memory(self) -> bool:
+        return self._file is None
+
+    def source(self) -> Union[bytes, str]:
+        """交给转码：仍在内存返回 bytes（走 stdin），已落盘返回文件路径"""
+        if self._file is None:
+            return bytes(self._mem)
+        self._file.flush()
+        return self._file.name
+
+    def read_all(self) -> bytes:
+        src = self.source()
+        if isinstance(src, bytes):
+            return src
+        with open(src, "rb") as f:
+            return f.read()
+
+    # -------- 释放 --------
+    def close(self):
+        memory_budget.release(self._reserved)
+        self._reserved = 0
+        self._mem = bytearray()
+        f = self._file
+        self._file = None
+        if f is not None:
+            try:
+                f.close()
+            except Exception:
+                pass
+            try:
+                if os.path.exists(f.name):
+                    os.remove(f.name)
+            except Exception:
+                pass
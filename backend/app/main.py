@@ -6,21 +6,34 @@ from pathlib import Path
 from glob import glob
 
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 # 你的配置与 DB
 from app.config import settings
 from app.core.db import init_db, close_db
+from app.core.db_pool import readiness
+from app.core.http_clients import close_all as close_http_clients
+from app.core.db_stats import DbStatsMiddleware
+from app.core.log import setup_logging, shutdown_logging
+from app.core.loop_monitor import LoadShedMiddleware, loop_monitor
+from app.core.metrics import render_prometheus
+from app.core.pubsub import channel
 
-from app.api.v1.routers import auth, accents, session as session_router, conversations, admin
+from app.services.asr_openai import shutdown_transcoder
+from app.api.v1.routers import auth, accents, session as session_router, conversations, admin, audio, profiling
 
 
 from app.api.v1.routers.ws_text import router as ws_text_router
 from app.api.v1.routers.ws_upload import router as ws_upload_router
 from app.api.v1.routers.ws_tts import router as ws_tts_router
+from app.api.v1.routers.ws_conversation import router as ws_conversation_router
 
 logger = logging.getLogger("uvicorn.error")
 
+# app.* 的结构化日志：经队列由后台线程输出，热路径上不做同步 IO
+setup_logging()
+
 def _ensure_ffmpeg_on_path() -> None:
     """
     目标：不写死绝对路径；在启动时自动把常见安装目录加入 PATH。
@@ -85,7 +98,14 @@ def _ensure_ffmpeg_on_path() -> None:
     logger.info("[ffmpeg] which(ffmpeg)=%s", shutil.which("ffmpeg"))
     logger.info("[ffmpeg] which(ffprobe)=%s", shutil.which("ffprobe"))
 
-app = FastAPI(title=settings.APP_NAME)
+# 默认用 orjson 编码响应体（比标准库 json 快数倍）
+app = FastAPI(title=settings.APP_NAME, default_response_class=ORJSONResponse)
+
+# 每个请求的 SQL 条数 / 耗时（最内层，被拒绝的请求不计）
+app.add_middleware(DbStatsMiddleware)
+
+# 事件循环过载时昂贵接口直接 503（放在 CORS 内层，拒绝响应同样带 CORS 头）
+app.add_middleware(LoadShedMiddleware)
 
 # CORS（带 Cookie）
 app.add_middleware(
@@ -102,10 +122,19 @@ async def on_startup():
     _ensure_ffmpeg_on_path()
     # 你的 DB 初始化
     await init_db()
+    # 定期清理断开但没退订的 WebSocket 订阅
+    channel.start_sweeper()
+    # 事件循环延迟采样 + 卡顿看门狗（驱动过载保护）
+    loop_monitor.start()
 
 @app.on_event("shutdown")
 async def on_shutdown():
+    loop_monitor.stop()
+    channel.stop_sweeper()
+    await close_http_clients()
+    shutdown_transcoder()
     await close_db()
+    shutdown_logging()
 
 # REST
 app.include_router(auth.router, prefix="/api/v1")
@@ -113,12 +142,28 @@ app.include_router(accents.router, prefix="/api/v1")
 app.include_router(session_router.router, prefix="/api/v1")
 app.include_router(conversations.router, prefix="/api/v1")
 app.include_router(admin.router, prefix="/api/v1")
+app.include_router(profiling.router, prefix="/api/v1")
+app.include_router(audio.router, prefix="/api/v1")
 
 # WebSocket（保持他原装装饰器路径）
 app.include_router(ws_text_router)
 app.include_router(ws_upload_router)
 app.include_router(ws_tts_router)
+# 单连接多路复用（新客户端）；上面三条保留给旧客户端
+app.include_router(ws_conversation_router)
 
 @app.get("/healthz")
 def healthz():
+    # 存活探针：进程在就行，不碰数据库
     return {"ok": True}
+
+@app.get("/readyz")
+async def readyz():
+    # 就绪探针：数据库不通或连接池耗尽时 503，编排层暂停往这个 worker 派流量
+    status = await readiness()
+    return ORJSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Prometheus 文本格式
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
@@ -41,10 +41,18 @@ class UserDetailResponse(UserResponse):
     statistics: Optional[dict] = None
 
 
+class PaginationOut(BaseModel):
+    """分页信息"""
+    total: int
+    page: int
+    pageSize: int
+    totalPages: int
+
+
 class UserListResponse(BaseModel):
     """用户列表响应"""
     users: list[UserResponse]
-    pagination: dict
+    pagination: PaginationOut
 
 
 # ============ 创建用户相关 ============
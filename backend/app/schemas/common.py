@@ -0,0 +1,9 @@
+from typing import Generic, TypeVar
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+class ApiResponse(BaseModel, Generic[T]):
+    """统一响应外壳：{"success": true, "data": ...}"""
+    success: bool = True
+    data: T
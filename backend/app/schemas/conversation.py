@@ -31,11 +31,24 @@ class TranscriptOut(BaseModel):
     startMs: int | None = None
     endMs: int | None = None
     text: str
+    audioUrl: str | None = None
 
 class ConversationDetailOut(BaseModel):
     conversation: ConversationDetail
     transcripts: list[TranscriptOut]
-    audioUrl: str | None = None
+    audioUrl: str | None = None     # 最近一段已归档的音频（各段自己的地址在 transcripts[].audioUrl）
+
+class TranscriptSearchHit(BaseModel):
+    conversationId: str
+    seq: int
+    rank: float
+    snippet: str
+
+class TranscriptSearchOut(BaseModel):
+    items: list[TranscriptSearchHit]
+    q: str
+    offset: int
+    limit: int
 
 class ConversationTitleIn(BaseModel):
     title: str
@@ -0,0 +1,112 @@
+"""
+ASR 结果缓存：按「归一化音频（16k 单声道 PCM，VAD 之后）的内容哈希 + 模型名」缓存转写文本。
+客户端断网重传、QA/演示反复提交同一段录音时直接命中，不再调 Whisper。
+  - 容量上限（条数）+ TTL 双重淘汰，LRU 顺序
+  - 同一段音频并发到达时只调一次上游（其余等待同一结果）
+  - 只缓存成功结果，失败（以及备用提供方给出的结果）不缓存
+"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from app.config import settings
+from app.core.metrics import Counter, Gauge
+
+asr_cache_hits = Counter("asr_cache_hits_total", "ASR transcripts served from the content-hash cache")
+asr_cache_misses = Counter("asr_cache_misses_total", "ASR cache lookups that called the provider")
+asr_cache_evictions = Counter("asr_cache_evictions_total", "ASR cache entries evicted, by reason")
+asr_cache_entries = Gauge("asr_cache_entries", "ASR transcripts currently cached")
+
+_HASH_CHUNK = 64 * 1024
+
+
+def audio_key(pcm: bytes, model: str) -> str:
+    """流式哈希（分块 update，不复制整段 PCM），模型名参与 key"""
+    h = hashlib.sha256()
+    h.update(model.encode())
+    h.update(b"\0")
+    view = memoryview(pcm)
+    for i in range(0, len(view), _HASH_CHUNK):
+        h.update(view[i:i + _HASH_CHUNK])
+    return h.hexdigest()
+
+
+class AsrCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._items: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()  # key -> (过期时间, 文本)
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def get(self, key: str) -> Optional[str]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires, text = item
+        if expires < time.monotonic():
+            del self._items[key]
+            asr_cache_evictions.inc(reason="ttl")
+            asr_cache_entries.set(len(self._items))
+            return None
+        self._items.move_to_end(key)
+        return text
+
+    def put(self, key: str, text: str):
+        self._items[key] = (time.monotonic() + self.ttl, text)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+            asr_cache_evictions.inc(reason="size")
+        asr_cache_entries.set(len(self._items))
+
+    def clear(self):
+        self._items.clear()
+        asr_cache_entries.set(0)
+
+    async def get_or_transcribe(self, key: str, transcribe: Callable[[], Awaitable[Tuple[str, bool]]]) -> str:
+        """
+        命中直接返回；未命中调 transcribe() -> (文本, 是否可缓存)，同 key 的并发请求共享这一次调用。
+        发起那次调用的请求被取消（如客户端断开）时，仍在等待的请求不跟着取消，而是重新查一遍并自己接手调用
+        """
+        while True:
+            text = self.get(key)
+            if text is not None:
+                asr_cache_hits.inc()
+                return text
+            pending = self._inflight.get(key)
+            if pending is None:
+                break
+            try:
+                text = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # 自己被取消照常抛出；只是共享的那次调用被取消，则回到循环顶部重试
+                if not pending.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                continue
+            asr_cache_hits.inc()
+            return text
+
+        asr_cache_misses.inc()
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            text, cacheable = await transcribe()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # 没有并发等待者时也不报 "exception was never retrieved"
+            raise
+        else:
+            if cacheable:
+                self.put(key, text)
+            fut.set_result(text)
+            return text
+        finally:
+            self._inflight.pop(key, None)
+
+
+asr_cache = AsrCache(settings.asr_cache_max_entries, settings.asr_cache_ttl_seconds)
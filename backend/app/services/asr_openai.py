@@ -1,28 +1,170 @@
-import tempfile, os
+import asyncio
+import io
+import json
+import subprocess
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import AsyncGenerator, Callable, Optional, TypeVar, Union
 import ffmpeg
 import httpx
 from ..config import settings
+from ..core.http_clients import get_client
+from ..core.metrics import Counter
+from ..core.resilience import Deadline, LatencyTracker, hedged, hedged_stream, retry_async
+from .providers import AsrProvider
 
-def webm_to_wav_16k_mono(webm_path: str) -> str:
-    """把 webm/opus 转 16k 单声道 wav，返回 wav 路径（调用方负责删除）"""
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as wav_file:
-        (
-            ffmpeg
-            .input(webm_path)
-            .output(wav_file.name, ac=1, ar="16000", format="wav")
-            .overwrite_output()
-            .run(quiet=True)
-        )
-        return wav_file.name
+ASR_SAMPLE_RATE = 16000
+
+asr_latency = LatencyTracker("asr")
+
+asr_upload_encoding_total = Counter("asr_upload_encoding_total", "ASR uploads by chosen encoding")
+asr_upload_bytes_total = Counter("asr_upload_bytes_total", "Bytes sent to the ASR provider, by encoding")
+asr_upload_saved_bytes_total = Counter(
+    "asr_upload_saved_bytes_total", "Bytes saved versus sending 16 kHz WAV, by encoding")
+
+T = TypeVar("T")
+
+# ffmpeg 子进程的 communicate 是阻塞调用：放进独立线程池，不占事件循环
+_transcode_pool: Optional[ThreadPoolExecutor] = None
+_ffmpeg_warm = False
+
+def _pool() -> ThreadPoolExecutor:
+    global _transcode_pool
+    if _transcode_pool is None:
+        _transcode_pool = ThreadPoolExecutor(max_workers=settings.transcode_workers, thread_name_prefix="transcode")
+    return _transcode_pool
+
+async def run_transcode(fn: Callable[..., T], *args, **kwargs) -> T:
+    """在转码线程池里跑 decode_to_pcm16_16k / encode_for_asr 等同步函数"""
+    return await asyncio.get_running_loop().run_in_executor(_pool(), lambda: fn(*args, **kwargs))
+
+def _ffmpeg_version():
+    global _ffmpeg_warm
+    subprocess.run(["ffmpeg", "-version"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10)
+    _ffmpeg_warm = True
+
+async def prewarm_transcoder():
+    """拉起一个转码线程；首次还会跑一遍 ffmpeg -version，把可执行文件和动态库读进页缓存"""
+    if _ffmpeg_warm:
+        await run_transcode(lambda: None)
+    else:
+        await run_transcode(_ffmpeg_version)
+
+def shutdown_transcoder():
+    global _transcode_pool
+    if _transcode_pool is not None:
+        _transcode_pool.shutdown(wait=False, cancel_futures=True)
+        _transcode_pool = None
+
+def _run_ffmpeg(stream, input: Optional[bytes], deadline: Optional[Deadline]) -> bytes:
+    """跑一次 ffmpeg 并取 stdout；超过 deadline 直接杀掉子进程"""
+    proc = stream.run_async(pipe_stdin=input is not None, pipe_stdout=True, pipe_stderr=True)
+    try:
+        out, err = proc.communicate(input, timeout=deadline.remaining() if deadline else None)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+        raise deadline.exceeded("transcode")
+    if proc.returncode:
+        raise ffmpeg.Error("ffmpeg", out, err)
+    return out
+
+def decode_to_pcm16_16k(src: Union[str, bytes], deadline: Optional[Deadline] = None) -> bytes:
+    """
+    把 webm/opus 解码成 16k 单声道 s16le PCM（内存中返回，供 VAD 等后续处理）
+    src 为 bytes 时经 stdin 喂给 ffmpeg（内存中的短录音不落盘），为 str 时按文件路径读取
+    """
+    in_memory = isinstance(src, (bytes, bytearray))
+    stream = (
+        ffmpeg
+        .input("pipe:0" if in_memory else src)
+        .output("pipe:1", ac=1, ar=str(ASR_SAMPLE_RATE), format="s16le", acodec="pcm_s16le")
+    )
+    return _run_ffmpeg(stream, src if in_memory else None, deadline)
+
+def pcm16_to_wav(pcm: bytes, sample_rate: int = ASR_SAMPLE_RATE) -> bytes:
+    """给裸 PCM 加 WAV 头（纯内存，不走 ffmpeg）"""
+    bio = io.BytesIO()
+    with wave.open(bio, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm)
+    return bio.getvalue()
+
+def pcm16_to_flac(pcm: bytes, sample_rate: int = ASR_SAMPLE_RATE, deadline: Optional[Deadline] = None) -> bytes:
+    """无损压缩，语音通常约为 WAV 的一半"""
+    stream = (
+        ffmpeg
+        .input("pipe:0", format="s16le", ac=1, ar=str(sample_rate))
+        .output("pipe:1", format="flac", compression_level=5)
+    )
+    return _run_ffmpeg(stream, pcm, deadline)
+
+@dataclass
+class AsrUpload:
+    data: bytes
+    filename: str
+    mime: str
+    encoding: str
+
+def encode_for_asr(
+    pcm: bytes,
+    original: Optional[Union[str, bytes]],
+    trimmed_seconds: float,
+    in_process_only: bool = False,
+    deadline: Optional[Deadline] = None,
+) -> AsrUpload:
+    """
+    按 ASR_UPLOAD_ENCODINGS（提供方支持的编码，按偏好排序）挑选上传格式：
+      - webm：原样透传浏览器录的 Opus（最小）；仅当有原始 webm 且 VAD 裁掉的不超过
+              ASR_PASSTHROUGH_MAX_TRIM_SECONDS 时可用，否则会把已裁掉的静音又传回去计费
+      - flac：裁剪后的 PCM 无损压缩
+      - wav ：裁剪后的 PCM 加 WAV 头（兜底）
+    in_process_only=True 时跳过需要 ffmpeg 子进程的编码（裸 PCM 上传路径）
+    """
+    wav_bytes = len(pcm) + 44
+    upload = None
+    for enc in settings.asr_upload_encodings:
+        if enc == "webm" and original is not None and trimmed_seconds <= settings.asr_passthrough_max_trim_seconds:
+            if isinstance(original, str):
+                with open(original, "rb") as f:
+                    original = f.read()
+            upload = AsrUpload(bytes(original), "audio.webm", "audio/webm", "webm")
+        elif enc == "flac" and not in_process_only:
+            try:
+                upload = AsrUpload(pcm16_to_flac(pcm, deadline=deadline), "audio.flac", "audio/flac", "flac")
+            except (ffmpeg.Error, OSError):
+                continue  # 编码失败就退回列表里的下一种
+        elif enc == "wav":
+            upload = AsrUpload(pcm16_to_wav(pcm), "audio.wav", "audio/wav", "wav")
+        if upload is not None:
+            break
+    if upload is None:
+        upload = AsrUpload(pcm16_to_wav(pcm), "audio.wav", "audio/wav", "wav")
 
-async def transcribe_wav_via_url(wav_path: str) -> str:
+    asr_upload_encoding_total.inc(encoding=upload.encoding)
+    asr_upload_bytes_total.inc(len(upload.data), encoding=upload.encoding)
+    asr_upload_saved_bytes_total.inc(max(0, wav_bytes - len(upload.data)), encoding=upload.encoding)
+    return upload
+
+async def transcribe_wav_via_url(
+    audio: bytes,
+    filename: str = "audio.wav",
+    mime: str = "audio/wav",
+    deadline: Optional[Deadline] = None,
+) -> str:
     """
     通过 HTTP 直连 WHISPER_API_URL 调 ASR：
       POST multipart/form-data:
         - model=settings.whisper_model
-        - file=@wav (audio/wav)
+        - file=音频字节（wav / flac / webm，见 encode_for_asr）
         - response_format=verbose_json
       头：Authorization: Bearer OPENAI_API_KEY
+    转写是幂等的：单次超时取 min(剩余时限, ASR_TIMEOUT_SECONDS)，可重试错误按退避重试，
+    ASR_HEDGE_ENABLED 时超过 p95 未返回会再发一路对冲请求。
     """
     if not settings.openai_api_key:
         raise RuntimeError("OPENAI_API_KEY not set")
@@ -32,11 +174,111 @@ async def transcribe_wav_via_url(wav_path: str) -> str:
         "model": settings.whisper_model,
         "response_format": "verbose_json",
     }
+    deadline = deadline or Deadline(settings.asr_timeout_seconds)
 
-    async with httpx.AsyncClient(timeout=120) as client:
-        with open(wav_path, "rb") as f:
-            files = {"file": ("audio.wav", f, "audio/wav")}
-            resp = await client.post(settings.whisper_api_url, headers=headers, data=data, files=files)
+    async def _post_once() -> str:
+        t0 = time.monotonic()
+        files = {"file": (filename, audio, mime)}
+        resp = await get_client("openai").post(
+            settings.whisper_api_url, headers=headers, data=data, files=files,
+            timeout=deadline.timeout(settings.asr_timeout_seconds))
         resp.raise_for_status()
         js = resp.json()
+        asr_latency.observe(time.monotonic() - t0)
         return (js.get("text") or "").strip()
+
+    async def _attempt() -> str:
+        delay = asr_latency.hedge_delay() if settings.asr_hedge_enabled else None
+        return await hedged(_post_once, stage="asr", delay=delay)
+
+    return await retry_async(_attempt, stage="asr", deadline=deadline, attempts=settings.asr_retry_attempts)
+
+async def _stream_transcription(
+    audio: bytes, filename: str, mime: str, timeout: float
+) -> AsyncGenerator[str, None]:
+    """stream=true：服务端以 SSE 逐段推送 transcript.text.delta，直到 transcript.text.done"""
+    headers = {"Authorization": f"Bearer {settings.openai_api_key}"}
+    data = {"model": settings.whisper_model, "response_format": "json", "stream": "true"}
+    files = {"file": (filename, audio, mime)}
+    async with get_client("openai").stream(
+        "POST", settings.whisper_api_url, headers=headers, data=data, files=files, timeout=timeout
+    ) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            payload = line[5:].strip()
+            if payload == "[DONE]":
+                break
+            ev = json.loads(payload)
+            if ev.get("type") == "transcript.text.delta" and ev.get("delta"):
+                yield ev["delta"]
+            elif ev.get("type") == "transcript.text.done":
+                break
+
+async def transcribe_stream_via_url(
+    audio: bytes, filename: str, mime: str, deadline: Deadline
+) -> AsyncGenerator[str, None]:
+    """
+    流式转写（ASR_STREAM_ENABLED，需模型支持 stream，如 gpt-4o-transcribe）：
+    首个增量之前失败可按退避重试；之后增量已经推给前端 / TTS，不再重试
+    """
+    if not settings.openai_api_key:
+        raise RuntimeError("OPENAI_API_KEY not set")
+
+    async def _open():
+        timeout = deadline.timeout(settings.asr_timeout_seconds)
+        gen = hedged_stream(
+            lambda: _stream_transcription(audio, filename, mime, timeout),
+            stage="asr", delay=None, first_byte_timeout=timeout,
+        )
+        try:
+            return await gen.__anext__(), gen
+        except StopAsyncIteration:
+            return None, gen
+
+    first, gen = await retry_async(_open, stage="asr", deadline=deadline, attempts=settings.asr_retry_attempts)
+    try:
+        if first is None:
+            return
+        yield first
+        async for delta in gen:
+            yield delta
+    finally:
+        await gen.aclose()
+
+class OpenAIWhisperASR(AsrProvider):
+    """OpenAI 兼容的 /audio/transcriptions 接口（WHISPER_API_URL + WHISPER_MODEL）"""
+    name = "openai"
+
+    @property
+    def cache_tag(self) -> str:
+        return f"openai:{settings.whisper_model}"
+
+    async def prewarm(self, accent: str):
+        """
+        GET {base}/models/{model}：把到 ASR 的 TCP/TLS 连接建好留在连接池里，stop 之后的 POST 直接复用。
+        只为建连，不关心返回状态
+        """
+        if not settings.openai_api_key:
+            return
+        base = settings.whisper_api_url.rsplit("/audio/", 1)[0]
+        await get_client("openai").get(
+            f"{base}/models/{settings.whisper_model}",
+            headers={"Authorization": f"Bearer {settings.openai_api_key}"},
+            timeout=settings.prewarm_timeout_seconds,
+        )
+
+    async def transcribe(self, audio: bytes, filename: str, mime: str, deadline: Deadline) -> str:
+        return await transcribe_wav_via_url(audio, filename, mime, deadline)
+
+    async def transcribe_stream(self, audio: bytes, filename: str, mime: str, deadline: Deadline) -> AsyncGenerator[str, None]:
+        if settings.asr_stream_enabled:
+            gen = transcribe_stream_via_url(audio, filename, mime, deadline)
+        else:
+            gen = super().transcribe_stream(audio, filename, mime, deadline)
+        try:
+            async for delta in gen:
+                yield delta
+        finally:
+            await gen.aclose()
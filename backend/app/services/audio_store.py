@@ -0,0 +1,218 @@
+# app/services/audio_store.py
+"""
+音频归档：上传的原始录音与合成出的 TTS 按内容哈希（sha256）落盘，同一内容只存一份。
+  - 路径 AUDIO_STORE_DIR/ab/ab…(64 位哈希).ext，key = "<sha256>.<ext>"，对外 URL = /api/v1/audio/<key>
+  - 先写同目录临时文件再 rename，读端永远看不到半个文件；内容不可变，ETag 直接用哈希
+  - 语音段 (会话, utteranceId) -> TTS 归档 URL：前端 append_segment 时带上 utteranceId，服务端回填
+    Transcript.audio_url；合成比 append 晚结束时，归档完成后再补写那一行
+回看历史时只读磁盘，不再调用合成提供方。
+"""
+import asyncio
+import hashlib
+import io
+import os
+import re
+import tempfile
+import time
+import wave
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+from app.config import settings
+from app.core.log import get_logger
+from app.core.metrics import Counter
+from app.models.conversation import Conversation
+from app.models.transcript import Transcript
+
+log = get_logger(__name__)
+
+audio_archived_total = Counter("audio_archived_total", "Audio blobs archived, by kind and result (stored / dedup / error)")
+audio_archived_bytes_total = Counter("audio_archived_bytes_total", "Bytes written to the audio archive, by kind")
+
+# 扩展名 -> Content-Type（只接受这几种，key 校验也据此进行）
+AUDIO_MIME = {
+    "mp3": "audio/mpeg",
+    "ogg": "audio/ogg",
+    "webm": "audio/webm",
+    "wav": "audio/wav",
+}
+_KEY_RE = re.compile(r"^([0-9a-f]{64})\.(%s)$" % "|".join(AUDIO_MIME))
+_COPY_CHUNK = 1024 * 1024
+
+
+def pcm_to_wav(pcm: bytes, sample_rate: int) -> bytes:
+    """16-bit 单声道 PCM 包一层 WAV 头，浏览器 <audio> 可直接播放"""
+    out = io.BytesIO()
+    with wave.open(out, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm)
+    return out.getvalue()
+
+
+class AudioStore:
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root)
+
+    @staticmethod
+    def parse_key(key: str) -> Optional[Tuple[str, str]]:
+        """合法 key 返回 (sha256, ext)，否则 None（拒绝路径穿越等任意输入）"""
+        m = _KEY_RE.match(key or "")
+        return (m.group(1), m.group(2)) if m else None
+
+    def path_for(self, key: str) -> Optional[Path]:
+        parsed = self.parse_key(key)
+        if parsed is None:
+            return None
+        digest, _ = parsed
+        return self.root / digest[:2] / key
+
+    @staticmethod
+    def url_for(key: str) -> str:
+        return f"/api/v1/audio/{key}"
+
+    def _commit(self, digest: str, ext: str, write) -> Tuple[str, bool]:
+        """把内容写到 key 对应的位置；已存在（同内容）直接复用。返回 (key, 是否新写入)"""
+        key = f"{digest}.{ext}"
+        path = self.path_for(key)
+        if path.exists():
+            return key, False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        return key, True
+
+    def put_bytes(self, data: bytes, ext: str) -> Tuple[str, bool]:
+        """同步写入（会做哈希与磁盘 IO，放到线程里调用）"""
+        return self._commit(hashlib.sha256(data).hexdigest(), ext, lambda f: f.write(data))
+
+    def put_file(self, src: Union[str, Path], ext: str) -> Tuple[str, bool]:
+        """已落盘的上传：流式哈希后再拷贝，不整段读进内存"""
+        h = hashlib.sha256()
+        with open(src, "rb") as f:
+            for block in iter(lambda: f.read(_COPY_CHUNK), b""):
+                h.update(block)
+
+        def _copy(dst):
+            with open(src, "rb") as f:
+                for block in iter(lambda: f.read(_COPY_CHUNK), b""):
+                    dst.write(block)
+
+        return self._commit(h.hexdigest(), ext, _copy)
+
+
+audio_store = AudioStore(settings.audio_store_dir)
+
+
+async def archive(kind: str, data: Union[bytes, str, Path], ext: str) -> Optional[str]:
+    """
+    归档一段音频（bytes 或已落盘文件的路径），返回可播放的 URL。
+    归档只是附带的：关闭或失败时返回 None，不影响识别 / 合成主流程
+    """
+    if not settings.audio_archive_enabled or not data:
+        return None
+    try:
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            key, stored = await asyncio.to_thread(audio_store.put_bytes, bytes(data), ext)
+        else:
+            key, stored = await asyncio.to_thread(audio_store.put_file, data, ext)
+    except Exception as e:
+        audio_archived_total.inc(kind=kind, result="error")
+        log.warning("audio.archive_failed", kind=kind, error=repr(e))
+        return None
+    audio_archived_total.inc(kind=kind, result="stored" if stored else "dedup")
+    if stored:
+        audio_archived_bytes_total.inc(os.path.getsize(audio_store.path_for(key)), kind=kind)
+    return audio_store.url_for(key)
+
+
+# -------- 语音段 -> TTS 归档 URL --------
+# 合成结束与前端 append_segment 的先后不确定：先到的一方登记，后到的一方完成回填。
+# 只在本进程内有效，条目超过 _LINK_TTL 秒或总数超过 _LINK_MAX 就丢弃（最多是这段没有回填 URL）
+_LINK_TTL = 600.0
+_LINK_MAX = 4096
+# (conv_id, utterance_id) -> ("url", audio_url) / ("transcript", transcript_id)，以及登记时间
+_links: "OrderedDict[Tuple[str, str], Tuple[str, Union[str, int], float]]" = OrderedDict()
+
+
+def _prune_links():
+    cutoff = time.monotonic() - _LINK_TTL
+    while _links and (len(_links) > _LINK_MAX or next(iter(_links.values()))[2] < cutoff):
+        _links.popitem(last=False)
+
+
+async def link_tts(conv_id: str, utterance_id: Optional[str], url: Optional[str]):
+    """合成归档完成：该段的 Transcript 已经写入就直接回填，否则登记等 append_segment 来取"""
+    grant_audio(conv_id, url)
+    if not utterance_id or not url:
+        return
+    key = (str(conv_id), utterance_id)
+    entry = _links.pop(key, None)
+    if entry is not None and entry[0] == "transcript":
+        try:
+            await Transcript.filter(id=entry[1]).update(audio_url=url)
+        except Exception as e:
+            log.warning("audio.backfill_failed", transcript_id=entry[1], error=repr(e))
+        return
+    _links[key] = ("url", url, time.monotonic())
+    _prune_links()
+
+
+def claim_tts(conv_id: str, utterance_id: Optional[str], transcript_id: Optional[int] = None) -> Optional[str]:
+    """
+    append_segment 调用：已有归档 URL 就取走返回；否则（给了 transcript_id 时）登记，合成归档后由 link_tts 回填。
+    写入 Transcript 之前先不带 transcript_id 取一次，写入之后再带上取一次，中间完成的归档也不会漏
+    """
+    if not utterance_id:
+        return None
+    key = (str(conv_id), utterance_id)
+    entry = _links.get(key)
+    if entry is not None and entry[0] == "url":
+        del _links[key]
+        return entry[1]
+    if transcript_id is not None:
+        _links.pop(key, None)
+        _links[key] = ("transcript", transcript_id, time.monotonic())
+        _prune_links()
+    return None
+
+
+# -------- 归档音频的归属 --------
+# /audio/<key> 只给所属会话的用户播放。已写进 Transcript.audio_url 的按数据库判断；
+# 刚归档、还没落到 Transcript 上的（合成刚结束 / 原始录音）在这里记下所属会话，同样按 _LINK_TTL / _LINK_MAX 淘汰
+# key -> (会话 id 集合, 最近登记时间)；同一内容可能属于多个会话（去重）
+_grants: "OrderedDict[str, Tuple[set, float]]" = OrderedDict()
+
+
+def grant_audio(conv_id: str, url: Optional[str]):
+    """登记刚归档的音频属于哪个会话"""
+    key = url.rsplit("/", 1)[-1] if url else None
+    if not key or audio_store.parse_key(key) is None:
+        return
+    convs = _grants.pop(key, (set(), 0.0))[0]
+    convs.add(str(conv_id))
+    _grants[key] = (convs, time.monotonic())
+    cutoff = time.monotonic() - _LINK_TTL
+    while _grants and (len(_grants) > _LINK_MAX or next(iter(_grants.values()))[1] < cutoff):
+        _grants.popitem(last=False)
+
+
+async def user_owns_audio(user_id, key: str) -> bool:
+    """该用户是否有权播放这段归档：属于其某个会话的 Transcript，或刚归档时登记在其会话下"""
+    if await Transcript.filter(audio_url=audio_store.url_for(key), conversation__user_id=user_id).exists():
+        return True
+    entry = _grants.get(key)
+    if entry is None or time.monotonic() - entry[1] > _LINK_TTL:
+        return False
+    return await Conversation.filter(id__in=list(entry[0]), user_id=user_id).exists()
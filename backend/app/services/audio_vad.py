@@ -0,0 +1,82 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.config import settings
+from app.core.metrics import Counter
+
+vad_input_seconds = Counter("vad_input_seconds_total", "Audio seconds entering the VAD stage")
+vad_trimmed_seconds = Counter("vad_trimmed_seconds_total", "Audio seconds removed by silence trimming")
+vad_silent_utterances = Counter("vad_silent_utterances_total", "Utterances skipped as silent (no ASR/TTS call)")
+
+@dataclass
+class VadResult:
+    pcm: bytes              # 裁剪后的 16-bit 单声道 PCM
+    input_seconds: float
+    kept_seconds: float
+    is_silent: bool
+
+def _dilate(mask: np.ndarray, pad: int) -> np.ndarray:
+    """把语音帧向两侧各扩 pad 帧，避免切掉字头字尾"""
+    if pad <= 0 or not mask.any():
+        return mask
+    kernel = np.ones(2 * pad + 1, dtype=np.int32)
+    return np.convolve(mask.astype(np.int32), kernel, mode="same") > 0
+
+def trim_silence(pcm: bytes, sample_rate: int = 16000) -> VadResult:
+    """
+    基于帧能量的向量化 VAD：
+      1) 按 VAD_FRAME_MS 分帧，算每帧 RMS（dBFS）
+      2) 阈值 = max(VAD_THRESHOLD_DBFS, 噪声底(10 分位) + VAD_NOISE_MARGIN_DB)；
+         10/90 分位相差不足 VAD_MIN_SPREAD_DB 时（整段连续说话，10 分位也是语音）不估噪声底，只用绝对阈值
+      3) 语音帧两侧补 VAD_PAD_MS；去掉首尾静音，内部超过 VAD_MAX_GAP_MS 的停顿压缩到该长度
+      4) 有效语音不足 VAD_MIN_SPEECH_MS 视为整段静音
+    """
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    input_seconds = len(samples) / sample_rate
+    frame = max(1, sample_rate * settings.vad_frame_ms // 1000)
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return VadResult(b"", input_seconds, 0.0, True)
+
+    framed = samples[: n_frames * frame].reshape(n_frames, frame)
+    f32 = framed.astype(np.float32)
+    rms = np.sqrt(np.mean(f32 * f32, axis=1)) / 32768.0
+    db = 20.0 * np.log10(np.maximum(rms, 1e-10))
+    p10, p90 = (float(x) for x in np.percentile(db, (10, 90)))
+    threshold = settings.vad_threshold_dbfs
+    if p90 - p10 >= settings.vad_min_spread_db:
+        threshold = max(threshold, p10 + settings.vad_noise_margin_db)
+    voiced = db > threshold
+
+    min_speech_frames = settings.vad_min_speech_ms // settings.vad_frame_ms
+    if int(voiced.sum()) < max(1, min_speech_frames):
+        return VadResult(b"", input_seconds, 0.0, True)
+
+    keep = _dilate(voiced, settings.vad_pad_ms // settings.vad_frame_ms)
+
+    # 内部长停顿：每段连续静音只保留前 max_gap 帧
+    max_gap = settings.vad_max_gap_ms // settings.vad_frame_ms
+    idx = np.flatnonzero(keep)
+    first, last = idx[0], idx[-1]
+    keep[:first] = False
+    keep[last + 1:] = False
+    inner = ~keep[first:last + 1]
+    if inner.any():
+        # 每个静音帧在其所属静音段里的序号（从 0 开始）
+        run_start = np.flatnonzero(np.diff(np.concatenate(([0], inner.astype(np.int8)))) == 1)
+        starts = np.zeros(len(inner), dtype=np.int64)
+        starts[run_start] = run_start
+        starts = np.maximum.accumulate(starts)
+        pos_in_run = np.arange(len(inner)) - starts
+        keep[first:last + 1] |= inner & (pos_in_run < max_gap)
+
+    kept = framed[keep].reshape(-1)
+    # 最后一个不满帧的尾巴属于尾部静音，直接丢弃
+    return VadResult(kept.tobytes(), input_seconds, len(kept) / sample_rate, False)
+
+def record_vad_metrics(res: VadResult):
+    vad_input_seconds.inc(res.input_seconds)
+    vad_trimmed_seconds.inc(res.input_seconds - res.kept_seconds)
+    if res.is_silent:
+        vad_silent_utterances.inc()
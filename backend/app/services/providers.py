@@ -0,0 +1,428 @@
+# app/services/providers.py
+"""
+ASR / TTS 提供方抽象与故障转移：
+  - AsrProvider / TtsProvider：统一接口；OpenAI Whisper（asr_openai）、ElevenLabs（tts_elevenlabs）
+    与本地替身 LocalASR / LocalTTS 都是其实现
+  - 每个提供方一个熔断器：连续失败后快速失败，不再每段语音都等满超时
+  - ASR_PROVIDERS / TTS_PROVIDERS 按顺序配置主备，主用熔断或失败时切到下一个
+本地替身不访问外网，可配置延迟与故障注入，联调和测试可直接用它们驱动整条流水线（见 use_providers）。
+"""
+import asyncio
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import AsyncGenerator, AsyncIterator, Optional, Sequence
+
+import numpy as np
+
+from app.config import settings
+from app.core.audio_formats import TTS_FORMATS
+from app.core.log import get_logger
+from app.core.metrics import Counter
+from app.core.resilience import CircuitBreaker, Deadline, DeadlineExceeded
+from app.services.tts_transcode import PcmStreamEncoder
+
+log = get_logger(__name__)
+
+provider_failovers_total = Counter(
+    "provider_failovers_total", "Requests served by a non-primary provider, by stage and provider")
+
+
+class ProviderUnavailable(Exception):
+    """链上所有提供方都失败或处于熔断状态"""
+
+    def __init__(self, stage: str, errors: list[str]):
+        super().__init__(f"no {stage} provider available: " + ("; ".join(errors) or "none configured"))
+        self.stage = stage
+        self.errors = errors
+
+
+class AsrProvider(ABC):
+    name: str = ""
+
+    @property
+    def cache_tag(self) -> str:
+        """参与 ASR 缓存 key：同一段音频换了提供方 / 模型不能命中旧结果"""
+        return self.name
+
+    async def prewarm(self, accent: str):
+        """上传 start 时调用：提前建好连接等，默认什么都不做；失败不影响后续正式调用"""
+
+    @abstractmethod
+    async def transcribe(self, audio: bytes, filename: str, mime: str, deadline: Deadline) -> str:
+        ...
+
+    async def transcribe_stream(self, audio: bytes, filename: str, mime: str, deadline: Deadline) -> AsyncGenerator[str, None]:
+        """按识别进度产出文本增量（拼起来即全文）；不支持流式的提供方整段识别完一次性产出"""
+        text = await self.transcribe(audio, filename, mime, deadline)
+        if text:
+            yield text
+
+
+class TtsProvider(ABC):
+    name: str = ""
+
+    async def prewarm(self, accent: str):
+        """上传 start 时调用：提前建好连接、解析口音对应的 voice 等，默认什么都不做"""
+
+    @abstractmethod
+    def stream(self, text: str, accent: str, output_format: str, deadline: Deadline) -> AsyncIterator[bytes]:
+        """按 output_format（TTS_FORMATS 的 name）流式返回音频字节；空文本不产出任何分片"""
+        ...
+
+    async def stream_text(
+        self, fragments: AsyncIterator[str], accent: str, output_format: str, deadline: Deadline
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        增量合成：fragments 是陆续到来的文本片段（已按标点 / 超时切好），边收文本边出音频。
+        不支持输入流的提供方逐片调用 stream 依次拼接（pcm / mp3 可直接拼接）
+        """
+        async for text in fragments:
+            async for chunk in self.stream(text, accent, output_format, deadline):
+                yield chunk
+
+
+# ---------------- 本地替身 ----------------
+
+class LocalASR(AsrProvider):
+    """不调外网：返回固定文本，可注入延迟 / 异常"""
+    name = "local"
+
+    def __init__(self, text: Optional[str] = None, latency: float = 0.0, error: Optional[Exception] = None):
+        self.text = text
+        self.latency = latency
+        self.error = error
+
+    async def transcribe(self, audio: bytes, filename: str, mime: str, deadline: Deadline) -> str:
+        if self.latency:
+            await asyncio.sleep(min(self.latency, deadline.remaining()))
+        deadline.check("asr")
+        if self.error is not None:
+            raise self.error
+        return self.text if self.text is not None else settings.local_asr_text
+
+    async def transcribe_stream(self, audio: bytes, filename: str, mime: str, deadline: Deadline) -> AsyncGenerator[str, None]:
+        """模拟流式识别：延迟均摊到每个词上，逐词产出"""
+        words = (self.text if self.text is not None else settings.local_asr_text).split(" ")
+        for i, w in enumerate(words):
+            if self.latency:
+                await asyncio.sleep(min(self.latency / len(words), deadline.remaining()))
+            deadline.check("asr")
+            if self.error is not None:
+                raise self.error
+            yield w if i == 0 else " " + w
+
+
+def _tone(sample_rate: int, seconds: float, freq: float = 440.0) -> bytes:
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    return (0.2 * 32767 * np.sin(2 * np.pi * freq * t)).astype("<i2").tobytes()
+
+
+class LocalTTS(TtsProvider):
+    """
+    不调外网：按文本长度合成一段正弦提示音（每字约 60ms，最长 10s）。
+    pcm_* 直接输出；mp3 / opus 经本地 ffmpeg 编码。可注入首包延迟 / 异常。
+    """
+    name = "local"
+
+    def __init__(self, latency: float = 0.0, error: Optional[Exception] = None, chunk_ms: int = 100):
+        self.latency = latency
+        self.error = error
+        self.chunk_ms = chunk_ms
+
+    async def stream(self, text: str, accent: str, output_format: str, deadline: Deadline) -> AsyncGenerator[bytes, None]:
+        if not text or not text.strip():
+            return
+        if self.latency:
+            await asyncio.sleep(min(self.latency, deadline.remaining()))
+        deadline.check("tts")
+        if self.error is not None:
+            raise self.error
+
+        fmt = TTS_FORMATS[output_format]
+        rate = fmt.sample_rate if fmt.codec == "pcm" else 24000
+        pcm = _tone(rate, min(10.0, 0.06 * len(text)))
+        step = rate * 2 * self.chunk_ms // 1000
+        if fmt.codec == "pcm":
+            for i in range(0, len(pcm), step):
+                yield pcm[i:i + step]
+                await asyncio.sleep(0)
+            return
+
+        enc = PcmStreamEncoder(rate, fmt)
+        await enc.start()
+
+        async def _feed():
+            for i in range(0, len(pcm), step):
+                await enc.feed(pcm[i:i + step])
+            await enc.finish()
+
+        feeder = asyncio.create_task(_feed())
+        try:
+            async for out in enc.output():
+                yield out
+            await feeder
+        finally:
+            feeder.cancel()
+            enc.kill()
+
+
+# ---------------- 故障转移链 ----------------
+
+@dataclass
+class AsrResult:
+    text: str
+    provider: str
+    primary: bool     # 是否由链上第一个提供方给出（只缓存主用结果）
+
+
+def _breaker(stage: str, name: str) -> CircuitBreaker:
+    return CircuitBreaker(
+        f"{stage}:{name}", settings.provider_breaker_failures, settings.provider_breaker_reset_seconds)
+
+
+async def _prewarm_first_usable(members, accent: str):
+    """只预热正式调用时会先用到的那个提供方：跳过熔断中的，且不占用半开状态的探测名额"""
+    for p, breaker in members:
+        if breaker.state != CircuitBreaker.OPEN:
+            await p.prewarm(accent)
+            return
+
+
+class AsrStream:
+    """
+    FailoverAsr.transcribe_stream 的结果：异步迭代得到文本增量；
+    迭代结束后 text（全文）/ provider / primary 可用
+    """
+
+    def __init__(self, members, audio: bytes, filename: str, mime: str, deadline: Deadline):
+        self._gen = self._run(members, audio, filename, mime, deadline)
+        self.text = ""
+        self.provider = ""
+        self.primary = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        delta = await self._gen.__anext__()
+        self.text += delta
+        return delta
+
+    async def aclose(self):
+        await self._gen.aclose()
+
+    async def _run(self, members, audio, filename, mime, deadline) -> AsyncGenerator[str, None]:
+        """首个增量之前失败可切到下一个提供方；之后已推给前端 / TTS，失败只记入熔断器并抛出"""
+        errors: list[str] = []
+        for i, (p, breaker) in enumerate(members):
+            if not breaker.allow():
+                errors.append(f"{p.name}: circuit open")
+                continue
+            gen = p.transcribe_stream(audio, filename, mime, deadline)
+            try:
+                try:
+                    first = await gen.__anext__()
+                except StopAsyncIteration:
+                    breaker.record_success()
+                    self.provider, self.primary = p.name, i == 0
+                    return
+                except (asyncio.CancelledError, DeadlineExceeded):
+                    breaker.release()
+                    raise
+                except Exception as e:
+                    breaker.record_failure()
+                    errors.append(f"{p.name}: {e!r}")
+                    log.warning("asr.provider_failed", provider=p.name, error=repr(e))
+                    continue
+
+                self.provider, self.primary = p.name, i == 0
+                if i > 0:
+                    provider_failovers_total.inc(stage="asr", provider=p.name)
+                yield first
+                try:
+                    async for delta in gen:
+                        yield delta
+                except Exception:
+                    breaker.record_failure()
+                    raise
+                breaker.record_success()
+                return
+            finally:
+                await gen.aclose()
+        raise ProviderUnavailable("asr", errors)
+
+
+class _Replayable:
+    """
+    可重放的文本片段流：故障转移时备用提供方要从头拿到主用已经消费掉的片段。
+    同一时刻只有一个消费者（链上提供方依次尝试）
+    """
+
+    def __init__(self, source: AsyncIterator[str]):
+        self._source = source.__aiter__()
+        self._seen: list[str] = []
+        self.error: Optional[Exception] = None   # 文本来源（ASR）自身的失败，不记到 TTS 提供方头上
+
+    async def iterate(self) -> AsyncGenerator[str, None]:
+        i = 0
+        while True:
+            if i < len(self._seen):
+                yield self._seen[i]
+            else:
+                if self.error is not None:
+                    raise self.error
+                try:
+                    item = await self._source.__anext__()
+                except StopAsyncIteration:
+                    return
+                except Exception as e:
+                    self.error = e
+                    raise
+                self._seen.append(item)
+                yield item
+            i += 1
+
+
+class FailoverAsr:
+    def __init__(self, providers: Sequence[AsrProvider]):
+        self.members = [(p, _breaker("asr", p.name)) for p in providers]
+
+    @property
+    def cache_tag(self) -> str:
+        return self.members[0][0].cache_tag if self.members else ""
+
+    async def prewarm(self, accent: str):
+        await _prewarm_first_usable(self.members, accent)
+
+    def transcribe_stream(self, audio: bytes, filename: str, mime: str, deadline: Deadline) -> AsrStream:
+        return AsrStream(self.members, audio, filename, mime, deadline)
+
+    async def transcribe(self, audio: bytes, filename: str, mime: str, deadline: Deadline) -> AsrResult:
+        errors: list[str] = []
+        for i, (p, breaker) in enumerate(self.members):
+            if not breaker.allow():
+                errors.append(f"{p.name}: circuit open")
+                continue
+            try:
+                text = await p.transcribe(audio, filename, mime, deadline)
+            except (asyncio.CancelledError, DeadlineExceeded):
+                breaker.release()
+                raise
+            except Exception as e:
+                breaker.record_failure()
+                errors.append(f"{p.name}: {e!r}")
+                log.warning("asr.provider_failed", provider=p.name, error=repr(e))
+                continue
+            breaker.record_success()
+            if i > 0:
+                provider_failovers_total.inc(stage="asr", provider=p.name)
+            return AsrResult(text, p.name, i == 0)
+        raise ProviderUnavailable("asr", errors)
+
+
+class FailoverTts:
+    def __init__(self, providers: Sequence[TtsProvider]):
+        self.members = [(p, _breaker("tts", p.name)) for p in providers]
+
+    async def prewarm(self, accent: str):
+        await _prewarm_first_usable(self.members, accent)
+
+    def stream(self, text: str, accent: str, output_format: str, deadline: Deadline) -> AsyncGenerator[bytes, None]:
+        """首包之前失败可切到下一个提供方；首包之后已下发给客户端，失败只记入熔断器并抛出"""
+        return self._failover(lambda p: p.stream(text, accent, output_format, deadline))
+
+    def stream_text(
+        self, fragments: AsyncIterator[str], accent: str, output_format: str, deadline: Deadline
+    ) -> AsyncGenerator[bytes, None]:
+        """增量合成；切换提供方时把已消费的文本片段重放给备用提供方"""
+        replay = _Replayable(fragments)
+        return self._failover(lambda p: p.stream_text(replay.iterate(), accent, output_format, deadline), replay)
+
+    async def _failover(self, open_stream, replay: Optional[_Replayable] = None) -> AsyncGenerator[bytes, None]:
+        errors: list[str] = []
+        for i, (p, breaker) in enumerate(self.members):
+            if not breaker.allow():
+                errors.append(f"{p.name}: circuit open")
+                continue
+            gen = open_stream(p)
+            try:
+                try:
+                    first = await gen.__anext__()
+                except StopAsyncIteration:
+                    breaker.record_success()
+                    return
+                except (asyncio.CancelledError, DeadlineExceeded):
+                    breaker.release()
+                    raise
+                except Exception as e:
+                    if replay is not None and replay.error is not None:
+                        breaker.release()
+                        raise replay.error
+                    breaker.record_failure()
+                    errors.append(f"{p.name}: {e!r}")
+                    log.warning("tts.provider_failed", provider=p.name, error=repr(e))
+                    continue
+
+                breaker.record_success()
+                if i > 0:
+                    provider_failovers_total.inc(stage="tts", provider=p.name)
+                yield first
+                try:
+                    async for chunk in gen:
+                        yield chunk
+                except Exception:
+                    if replay is None or replay.error is None:
+                        breaker.record_failure()
+                    raise
+                return
+            finally:
+                await gen.aclose()
+        raise ProviderUnavailable("tts", errors)
+
+
+def _make_asr(name: str) -> AsrProvider:
+    if name == "openai":
+        from app.services.asr_openai import OpenAIWhisperASR
+        return OpenAIWhisperASR()
+    if name == "local":
+        return LocalASR()
+    raise ValueError(f"unknown ASR provider: {name}")
+
+
+def _make_tts(name: str) -> TtsProvider:
+    if name == "elevenlabs":
+        from app.services.tts_elevenlabs import ElevenLabsTTS
+        return ElevenLabsTTS()
+    if name == "local":
+        return LocalTTS()
+    raise ValueError(f"unknown TTS provider: {name}")
+
+
+_asr_chain: Optional[FailoverAsr] = None
+_tts_chain: Optional[FailoverTts] = None
+
+
+def asr_chain() -> FailoverAsr:
+    global _asr_chain
+    if _asr_chain is None:
+        _asr_chain = FailoverAsr([_make_asr(n) for n in settings.asr_providers])
+    return _asr_chain
+
+
+def tts_chain() -> FailoverTts:
+    global _tts_chain
+    if _tts_chain is None:
+        _tts_chain = FailoverTts([_make_tts(n) for n in settings.tts_providers])
+    return _tts_chain
+
+
+def use_providers(
+    asr: Optional[Sequence[AsrProvider]] = None,
+    tts: Optional[Sequence[TtsProvider]] = None,
+):
+    """替换提供方链（测试 / 联调时换成本地替身），熔断器随之重置"""
+    global _asr_chain, _tts_chain
+    if asr is not None:
+        _asr_chain = FailoverAsr(asr)
+    if tts is not None:
+        _tts_chain = FailoverTts(tts)
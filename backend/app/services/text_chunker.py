@@ -0,0 +1,100 @@
+# app/services/text_chunker.py
+"""
+把 ASR 陆续给出的文本增量切成适合送进 TTS 的片段（增量合成用）：
+  - 句末标点（. ! ? 。！？ 等）后立即切出一段，首段尽早开始合成
+  - 逗号 / 分号等次级停顿：缓冲够 TTS_CHUNK_MIN_CHARS 才切，避免切得太碎影响语调
+  - 增量停顿超过 TTS_FLUSH_TIMEOUT_MS：把已有文本按最后一个词边界切出去，不在词中间断开
+"""
+import asyncio
+import re
+from typing import AsyncGenerator, AsyncIterator, Optional
+
+from app.config import settings
+from app.core.resilience import EOF, pump_stream
+
+# 西文标点要后跟空白才算断句（避免 "3.5"、"U.S." 这类被切开）；全角标点直接断
+_SENTENCE_END = re.compile(r"[.!?…]+[\"')\]]*\s+|[。！？]+")
+_CLAUSE_END = re.compile(r"[,;:]\s+|[，、；：]")
+_ENDS_SENTENCE = re.compile(r"[.!?…。！？]+[\"')\]]*\s*$")
+
+
+class TextChunker:
+    def __init__(self, min_chars: int = 0):
+        self.min_chars = min_chars
+        self._buf = ""
+
+    @property
+    def pending(self) -> str:
+        return self._buf
+
+    def _cut(self, end: int) -> str:
+        out, self._buf = self._buf[:end], self._buf[end:]
+        return out.strip()
+
+    def feed(self, delta: str) -> list[str]:
+        """追加一段增量，返回此刻可以送去合成的片段（可能为空）"""
+        self._buf += delta
+        out: list[str] = []
+        while True:
+            m = _SENTENCE_END.search(self._buf)
+            if m is None:
+                break
+            piece = self._cut(m.end())
+            if piece:
+                out.append(piece)
+        if len(self._buf) >= self.min_chars:
+            last = None
+            for last in _CLAUSE_END.finditer(self._buf):
+                pass
+            if last is not None and last.end() >= self.min_chars:
+                piece = self._cut(last.end())
+                if piece:
+                    out.append(piece)
+        return out
+
+    def flush_words(self) -> Optional[str]:
+        """超时切分：缓冲以句末标点结尾就整段切出；否则只切到最后一个空白处，末尾可能没说完的半个词留下"""
+        if _ENDS_SENTENCE.search(self._buf):
+            return self.flush()
+        idx = max(self._buf.rfind(" "), self._buf.rfind("\n"))
+        if idx <= 0:
+            return None
+        piece = self._cut(idx + 1)
+        return piece or None
+
+    def flush(self) -> Optional[str]:
+        """输入结束：剩下的全部切出"""
+        piece = self._cut(len(self._buf))
+        return piece or None
+
+
+async def chunk_text_stream(
+    deltas: AsyncIterator[str],
+    min_chars: Optional[int] = None,
+    flush_timeout: Optional[float] = None,
+) -> AsyncGenerator[str, None]:
+    """按标点与超时把文本增量流切成 TTS 片段流；上游异常原样抛出"""
+    chunker = TextChunker(settings.tts_chunk_min_chars if min_chars is None else min_chars)
+    flush_timeout = settings.tts_flush_timeout_ms / 1000 if flush_timeout is None else flush_timeout
+    q: asyncio.Queue = asyncio.Queue()
+    pump = asyncio.create_task(pump_stream(deltas, q))
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(q.get(), flush_timeout if chunker.pending.strip() else None)
+            except asyncio.TimeoutError:
+                piece = chunker.flush_words()
+                if piece:
+                    yield piece
+                continue
+            if item is EOF:
+                break
+            if isinstance(item, Exception):
+                raise item
+            for piece in chunker.feed(item):
+                yield piece
+        piece = chunker.flush()
+        if piece:
+            yield piece
+    finally:
+        pump.cancel()
@@ -1,8 +1,18 @@
+import asyncio
+import base64
+import json
 import os
 import httpx
-import asyncio
-from typing import AsyncGenerator
-from app.core.pubsub import channel
+import websockets
+from typing import AsyncGenerator, AsyncIterator
+from app.config import settings
+from app.core.http_clients import get_client
+from app.core.log import get_logger
+from app.core.audio_formats import DEFAULT_TTS_FORMAT
+from app.core.resilience import Deadline, LatencyTracker, hedged_stream, retry_async
+from app.services.providers import TtsProvider
+
+log = get_logger(__name__)
 
 ELEVEN_API = os.getenv("ELEVENLABS_API_URL", "https://api.elevenlabs.io/v1")
 ELEVEN_KEY = os.getenv("ELEVENLABS_API_KEY", "")
@@ -22,17 +32,20 @@ def _pick_voice_id_by_accent(accent: str) -> str:
     return VOICE_ID_AMERICAN
     # return "21m00Tcm4TlvDq8ikWAM"
 
-async def _stream_elevenlabs(text: str, voice_id: str) -> AsyncGenerator[bytes, None]:
+async def _stream_elevenlabs(
+    text: str, voice_id: str, output_format: str = DEFAULT_TTS_FORMAT
+) -> AsyncGenerator[bytes, None]:
     if not text or not text.strip():
-        print("[tts] skip empty text")
+        log.debug("tts.skip_empty")
         return
     if not ELEVEN_KEY:
         raise RuntimeError("ELEVENLABS_API_KEY is missing")
 
-    url = f"{ELEVEN_API}/text-to-speech/{voice_id}/stream?optimize_streaming_latency=2"
+    url = (f"{ELEVEN_API}/text-to-speech/{voice_id}/stream"
+           f"?optimize_streaming_latency=2&output_format={output_format}")
     headers = {
         "xi-api-key": ELEVEN_KEY,
-        "accept": "audio/mpeg",
+        "accept": "*/*",
         "content-type": "application/json",
     }
     payload = {
@@ -41,35 +54,126 @@ async def _stream_elevenlabs(text: str, voice_id: str) -> AsyncGenerator[bytes,
         "voice_settings": {"stability": 0.4, "similarity_boost": 0.7},
     }
 
-    print(f"[tts] HTTP POST {url} voice={voice_id}")
-    async with httpx.AsyncClient(timeout=None) as client:
-        async with client.stream("POST", url, headers=headers, json=payload) as resp:
-            resp.raise_for_status()
-            async for chunk in resp.aiter_bytes():
-                if chunk:
-                    yield chunk
-                await asyncio.sleep(0)
-
-async def _synth_and_stream_common(conv_id: str, text: str, accent: str):
-    voice_id = _pick_voice_id_by_accent(accent)
-    # 1) 通知前端开始
-    await channel.pub_tts_json(conv_id, {"type": "start", "mime": "audio/mpeg"})
-    print(f"[tts→ws] start -> {conv_id}")
+    log.debug("tts.http_stream", voice=voice_id, format=output_format)
+    # 首包时限由 hedged_stream 控制；这里的读超时约束的是分片之间的停顿
+    timeout = httpx.Timeout(settings.tts_read_timeout_seconds, connect=settings.tts_first_byte_timeout_seconds)
+    async with get_client("elevenlabs").stream("POST", url, headers=headers, json=payload, timeout=timeout) as resp:
+        resp.raise_for_status()
+        async for chunk in resp.aiter_bytes():
+            if chunk:
+                yield chunk
+
+async def _stream_input_elevenlabs(
+    fragments: AsyncIterator[str], voice_id: str, output_format: str, deadline: Deadline
+) -> AsyncGenerator[bytes, None]:
+    """
+    stream-input WebSocket：文本片段边到边发（每片 flush，立即生成），音频边回边产出。
+    片段来自正在进行的 ASR，等文本期间不算读超时；文本发完后才受分片间读超时约束。
+    """
+    if not ELEVEN_KEY:
+        raise RuntimeError("ELEVENLABS_API_KEY is missing")
+    base = ELEVEN_API.replace("https://", "wss://", 1).replace("http://", "ws://", 1)
+    url = (f"{base}/text-to-speech/{voice_id}/stream-input"
+           f"?model_id=eleven_monolingual_v1&optimize_streaming_latency=2&output_format={output_format}")
+    log.debug("tts.ws_stream_input", voice=voice_id, format=output_format)
+
+    async with websockets.connect(
+        url,
+        additional_headers={"xi-api-key": ELEVEN_KEY},
+        open_timeout=deadline.timeout(settings.tts_first_byte_timeout_seconds),
+    ) as ws:
+        await ws.send(json.dumps({
+            "text": " ",
+            "voice_settings": {"stability": 0.4, "similarity_boost": 0.7},
+        }))
 
+        async def _send():
+            async for text in fragments:
+                await ws.send(json.dumps({"text": text + " ", "flush": True}))
+            await ws.send(json.dumps({"text": ""}))   # 空文本 = 输入结束
+
+        sender = asyncio.create_task(_send())
+        recv = None
+        try:
+            while True:
+                recv = recv or asyncio.ensure_future(ws.recv())
+                waits = {recv} if sender.done() else {recv, sender}
+                timeout = (deadline.timeout(settings.tts_read_timeout_seconds) if sender.done()
+                           else deadline.remaining())
+                done, _ = await asyncio.wait(waits, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    deadline.check("tts")
+                    raise httpx.ReadTimeout(f"tts: no audio within {timeout:.1f}s after input ended")
+                if sender in done and sender.exception() is not None:
+                    raise sender.exception()
+                if recv not in done:
+                    continue
+                msg = json.loads(recv.result())
+                recv = None
+                if msg.get("error"):
+                    raise RuntimeError(f"elevenlabs stream-input error: {msg.get('message') or msg['error']}")
+                if msg.get("audio"):
+                    yield base64.b64decode(msg["audio"])
+                if msg.get("isFinal"):
+                    break
+        finally:
+            sender.cancel()
+            if recv is not None:
+                recv.cancel()
+
+tts_first_byte = LatencyTracker("tts")
+
+async def _resilient_stream(
+    text: str, voice_id: str, output_format: str, deadline: Deadline
+) -> AsyncGenerator[bytes, None]:
+    """
+    首包之前：受 deadline 与 TTS_FIRST_BYTE_TIMEOUT_SECONDS 约束，可重试、可对冲；
+    首包之后：字节已经下发给客户端，不再重试/切换，只受分片间读超时约束。
+    """
+    async def _open():
+        gen = hedged_stream(
+            lambda: _stream_elevenlabs(text, voice_id, output_format),
+            stage="tts",
+            delay=tts_first_byte.hedge_delay() if settings.tts_hedge_enabled else None,
+            first_byte_timeout=deadline.timeout(settings.tts_first_byte_timeout_seconds),
+            tracker=tts_first_byte,
+        )
+        try:
+            return await gen.__anext__(), gen
+        except StopAsyncIteration:
+            return None, gen
+
+    first, gen = await retry_async(_open, stage="tts", deadline=deadline, attempts=settings.tts_retry_attempts)
     try:
-        # 2) 流式分片
-        got_any = False
-        async for chunk in _stream_elevenlabs(text, voice_id):
-            got_any = True
-            await channel.pub_tts_bytes(conv_id, chunk)
-        print(f"[tts] stream done, got_any={got_any}")
+        if first is None:
+            return
+        yield first
+        async for chunk in gen:
+            yield chunk
     finally:
-        # 3) 通知前端结束
-        await channel.pub_tts_json(conv_id, {"type": "stop"})
-        print(f"[tts→ws] stop  -> {conv_id}")
+        await gen.aclose()
+
+class ElevenLabsTTS(TtsProvider):
+    """ElevenLabs 流式 TTS：按口音选 voice，上游直接输出协商好的 output_format"""
+    name = "elevenlabs"
+
+    async def prewarm(self, accent: str):
+        """按口音解析 voice 并 GET 其 settings：既建好连接池里的连接，也提前发现配错的 voice id"""
+        if not ELEVEN_KEY:
+            return
+        voice_id = _pick_voice_id_by_accent(accent)
+        resp = await get_client("elevenlabs").get(
+            f"{ELEVEN_API}/voices/{voice_id}/settings",
+            headers={"xi-api-key": ELEVEN_KEY},
+            timeout=settings.prewarm_timeout_seconds,
+        )
+        if resp.status_code == 404:
+            log.warning("tts.prewarm_voice_missing", voice=voice_id, accent=accent)
 
-async def synth_and_stream_free(conv_id: str, text: str, accent: str):
-    await _synth_and_stream_common(conv_id, text, accent)
+    def stream(self, text: str, accent: str, output_format: str, deadline: Deadline) -> AsyncGenerator[bytes, None]:
+        return _resilient_stream(text, _pick_voice_id_by_accent(accent), output_format, deadline)
 
-async def synth_and_stream_paid(conv_id: str, text: str, accent: str):
-    await _synth_and_stream_common(conv_id, text, accent)
+    def stream_text(
+        self, fragments: AsyncIterator[str], accent: str, output_format: str, deadline: Deadline
+    ) -> AsyncGenerator[bytes, None]:
+        return _stream_input_elevenlabs(fragments, _pick_voice_id_by_accent(accent), output_format, deadline)
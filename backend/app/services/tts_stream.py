@@ -0,0 +1,281 @@
+"""
+TTS 下行分发：向提供方链（providers.tts_chain）请求音频，合并细碎分片后按订阅者协商的格式广播。
+具体由哪家合成（ElevenLabs / 本地替身 …）以及熔断、故障转移都在 providers 里处理。
+"""
+import shutil
+import asyncio
+import time
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable, Optional, Union
+from app.config import settings
+from app.core.log import get_logger
+from app.core.metrics import Counter
+from app.core.audio_formats import (
+    MIXED_SOURCE_FORMAT,
+    TTS_FORMATS,
+    TtsFormat,
+)
+from app.core.pubsub import channel
+from app.core.resilience import EOF, Deadline, pump_stream
+from app.services.audio_store import archive, link_tts, pcm_to_wav
+from app.services.providers import ProviderUnavailable, tts_chain
+from app.services.text_chunker import chunk_text_stream
+from app.services.tts_transcode import PcmStreamEncoder
+
+log = get_logger(__name__)
+
+tts_cancelled_total = Counter(
+    "tts_cancelled_total", "TTS syntheses skipped or stopped early because nobody was listening, by reason")
+
+async def _coalesce_chunks(
+    chunks: AsyncIterator[bytes], min_bytes: int, max_delay: float
+) -> AsyncGenerator[bytes, None]:
+    """
+    合并细碎分片以减少 WebSocket 帧数：
+      - 第一片立即发出，不影响首音延迟
+      - 之后攒到 >= min_bytes 就发；或缓冲中最早的数据已等待 max_delay 秒也发
+    """
+    if min_bytes <= 0:
+        async for chunk in chunks:
+            yield chunk
+        return
+
+    loop = asyncio.get_running_loop()
+    q: asyncio.Queue = asyncio.Queue(maxsize=64)
+    pump = asyncio.create_task(pump_stream(chunks, q))
+    buf: list[bytes] = []
+    size = 0
+    flush_at = 0.0
+    first = True
+    try:
+        while True:
+            timeout = max(0.0, flush_at - loop.time()) if buf else None
+            try:
+                item = await asyncio.wait_for(q.get(), timeout)
+            except asyncio.TimeoutError:
+                yield b"".join(buf)
+                buf.clear()
+                size = 0
+                continue
+            if item is EOF:
+                break
+            if isinstance(item, Exception):
+                raise item
+            if first:
+                first = False
+                yield item
+                continue
+            if not buf:
+                flush_at = loop.time() + max_delay
+            buf.append(item)
+            size += len(item)
+            if size >= min_bytes:
+                yield b"".join(buf)
+                buf.clear()
+                size = 0
+        if buf:
+            yield b"".join(buf)
+    finally:
+        pump.cancel()
+
+def _coalesced(chunks: AsyncIterator[bytes]) -> AsyncGenerator[bytes, None]:
+    return _coalesce_chunks(
+        chunks,
+        settings.tts_coalesce_min_bytes,
+        settings.tts_coalesce_max_delay_ms / 1000,
+    )
+
+def _tagged(payload: dict, utterance_id: Optional[str]) -> dict:
+    """控制消息带上所属语音段，前端据此把音频与文本对上"""
+    if utterance_id:
+        payload["utteranceId"] = utterance_id
+    return payload
+
+def _start_msg(fmt: TtsFormat, utterance_id: Optional[str]) -> dict:
+    return _tagged({"type": "start", "mime": fmt.mime, "format": fmt.name}, utterance_id)
+
+def _error_msg(e: Exception, utterance_id: Optional[str]) -> dict:
+    code = "TTS_UNAVAILABLE" if isinstance(e, ProviderUnavailable) else "TTS_FAILED"
+    return _tagged({"type": "error", "stage": "tts", "code": code, "message": str(e)}, utterance_id)
+
+class _ArchiveTap:
+    """合成分发的同时留一份某种格式的完整音频，整段成功后归档（见 app.services.audio_store）"""
+
+    def __init__(self, fmt: TtsFormat):
+        self.fmt = fmt
+        self._chunks: list[bytes] = []
+
+    def add(self, chunk: bytes):
+        self._chunks.append(chunk)
+
+    async def save(self) -> Optional[str]:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        if self.fmt.codec == "pcm":
+            return await archive("tts", pcm_to_wav(data, self.fmt.sample_rate), "wav")
+        return await archive("tts", data, "ogg" if self.fmt.codec == "opus" else "mp3")
+
+def _archive_format(formats: set[str]) -> str:
+    """多格式分发时归档哪一路：优先压缩格式（省磁盘），都是 PCM 就存上游那一份"""
+    compressed = sorted(f for f in formats if TTS_FORMATS[f].codec != "pcm")
+    return compressed[0] if compressed else MIXED_SOURCE_FORMAT
+
+# output_format -> 该格式的音频流；整段文本与增量文本两种来源都包装成这个形状
+Synth = Callable[[str], AsyncIterator[bytes]]
+
+def _synth_for(text: Union[str, AsyncIterator[str]], accent: str, deadline: Deadline) -> Synth:
+    if isinstance(text, str):
+        return lambda fmt: tts_chain().stream(text, accent, fmt, deadline)
+    # 增量文本：按标点 / 停顿切片后送进提供方的输入流（上游只合成一次，多格式由 _stream_mixed 转码）
+    return lambda fmt: tts_chain().stream_text(chunk_text_stream(text), accent, fmt, deadline)
+
+async def _stream_single(
+    conv_id: str, synth: Synth, fmt: TtsFormat, only_fmt: bool, utterance_id: Optional[str],
+    tap: Optional[_ArchiveTap] = None,
+) -> bool:
+    """所有订阅者同一种格式：直接向上游请求该格式并广播"""
+    target = fmt.name if only_fmt else None
+    await channel.pub_tts_json(conv_id, _start_msg(fmt, utterance_id), target)
+    got_any = False
+    async for chunk in _coalesced(synth(fmt.name)):
+        got_any = True
+        if tap is not None:
+            tap.add(chunk)
+        await channel.pub_tts_bytes(conv_id, chunk, target)
+    return got_any
+
+async def _pump_encoder(conv_id: str, enc: PcmStreamEncoder, tap: Optional[_ArchiveTap] = None):
+    async for out in enc.output():
+        if tap is not None:
+            tap.add(out)
+        await channel.pub_tts_bytes(conv_id, out, enc.fmt.name)
+
+async def _stream_mixed(
+    conv_id: str, synth: Synth, formats: set[str], utterance_id: Optional[str],
+    tap: Optional[_ArchiveTap] = None,
+) -> bool:
+    """
+    订阅者格式不一致：上游只合成一次 PCM（MIXED_SOURCE_FORMAT），
+    需要 PCM 原样的直接转发，其余格式各起一个 ffmpeg 编码器就地转码。
+    """
+    source = TTS_FORMATS[MIXED_SOURCE_FORMAT]
+    encoders = [PcmStreamEncoder(source.sample_rate, TTS_FORMATS[name])
+                for name in sorted(formats) if name != source.name]
+    readers: list[asyncio.Task] = []
+    got_any = False
+    try:
+        for enc in encoders:
+            await enc.start()
+            enc_tap = tap if tap is not None and tap.fmt is enc.fmt else None
+            readers.append(asyncio.create_task(_pump_encoder(conv_id, enc, enc_tap)))
+        for name in formats:
+            await channel.pub_tts_json(conv_id, _start_msg(TTS_FORMATS[name], utterance_id), name)
+
+        async for chunk in _coalesced(synth(source.name)):
+            got_any = True
+            if tap is not None and tap.fmt is source:
+                tap.add(chunk)
+            if source.name in formats:
+                await channel.pub_tts_bytes(conv_id, chunk, source.name)
+            for enc in encoders:
+                await enc.feed(chunk)
+        for enc in encoders:
+            await enc.finish()
+        await asyncio.gather(*readers)
+    finally:
+        for t in readers:
+            t.cancel()
+        for enc in encoders:
+            enc.kill()
+    return got_any
+
+async def _until_idle(conv_id: str, stream: Awaitable[bool]) -> bool:
+    """
+    跑合成分发，同时盯着订阅者：最后一个订阅者离开、且 TTS_RESUME_GRACE_SECONDS 内没有重连就取消
+    （上游 HTTP 流随之关闭）；宽限期内的分片照常写进重放缓冲，重连后补发
+    """
+    task = asyncio.ensure_future(stream)
+    idle = asyncio.create_task(channel.wait_tts_idle(conv_id, settings.tts_resume_grace_seconds))
+    try:
+        await asyncio.wait({task, idle}, return_when=asyncio.FIRST_COMPLETED)
+        if task.done():
+            return task.result()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        tts_cancelled_total.inc(reason="subscribers_left")
+        log.info("tts.cancelled", reason="subscribers_left")
+        return False
+    finally:
+        idle.cancel()
+        task.cancel()
+
+async def _synth_and_stream_common(
+    conv_id: str,
+    text: Union[str, AsyncIterator[str]],
+    accent: str,
+    deadline: Optional[Deadline],
+    utterance_id: Optional[str],
+):
+    deadline = deadline or Deadline(settings.utterance_deadline_seconds)
+    synth = _synth_for(text, accent, deadline)
+    formats = channel.tts_formats(conv_id)
+    if not formats:
+        # 没有人订阅 TTS：不调上游，付费额度不浪费
+        tts_cancelled_total.inc(reason="no_subscribers")
+        log.debug("tts.cancelled", reason="no_subscribers")
+        return
+    log.debug("tts.start", formats=sorted(formats))
+    t0 = time.monotonic()
+
+    archive_on = settings.audio_archive_enabled
+    audio_url: Optional[str] = None
+    try:
+        # 1) 通知前端开始 + 2) 流式分片：每个订阅者收到自己协商的格式，上游只合成一次
+        if len(formats) == 1:
+            fmt = TTS_FORMATS[formats.pop()]
+            tap = _ArchiveTap(fmt) if archive_on else None
+            stream = _stream_single(conv_id, synth, fmt, True, utterance_id, tap)
+        elif shutil.which("ffmpeg"):
+            tap = _ArchiveTap(TTS_FORMATS[_archive_format(formats)]) if archive_on else None
+            stream = _stream_mixed(conv_id, synth, formats, utterance_id, tap)
+        else:
+            # 没有 ffmpeg 时协商阶段只会给出默认格式（negotiate_tts_format），走到这里说明 ffmpeg 中途不见了：
+            # 不能把某一种格式的字节发给协商了别的格式的订阅者，本段按失败处理
+            log.warning("tts.ffmpeg_missing", formats=sorted(formats))
+            raise RuntimeError("ffmpeg is required to serve mixed TTS formats")
+        got_any = await _until_idle(conv_id, stream)
+        log.info("stage.done", stage="tts", ms=round((time.monotonic() - t0) * 1000), got_any=got_any)
+        # 整段合成完才归档（中途没人听而取消的不存）；回看历史时直接读这份，不再调提供方
+        if tap is not None and got_any:
+            audio_url = await tap.save()
+            await link_tts(conv_id, utterance_id, audio_url)
+    except Exception as e:
+        # 所有提供方都不可用 / 中途失败：告诉前端本段没有语音，而不是静默卡住
+        await channel.pub_tts_json(conv_id, _error_msg(e, utterance_id))
+        raise
+    finally:
+        # 3) 通知前端结束（已归档时带上回放地址）
+        stop = {"type": "stop", "audioUrl": audio_url} if audio_url else {"type": "stop"}
+        await channel.pub_tts_json(conv_id, _tagged(stop, utterance_id))
+
+async def synth_and_stream_free(
+    conv_id: str, text: str, accent: str, deadline: Optional[Deadline] = None, utterance_id: Optional[str] = None
+):
+    await _synth_and_stream_common(conv_id, text, accent, deadline, utterance_id)
+
+async def synth_and_stream_paid(
+    conv_id: str, text: str, accent: str, deadline: Optional[Deadline] = None, utterance_id: Optional[str] = None
+):
+    await _synth_and_stream_common(conv_id, text, accent, deadline, utterance_id)
+
+async def synth_and_stream_live(
+    conv_id: str,
+    fragments: AsyncIterator[str],
+    accent: str,
+    deadline: Optional[Deadline] = None,
+    utterance_id: Optional[str] = None,
+):
+    """增量合成（TTS_INPUT_STREAMING）：fragments 为 ASR 陆续给出的文本增量，识别未结束即开始出声"""
+    await _synth_and_stream_common(conv_id, fragments, accent, deadline, utterance_id)
@@ -0,0 +1,50 @@
+import asyncio
+from typing import AsyncGenerator, Optional
+
+from app.core.audio_formats import TtsFormat
+
+_READ_SIZE = 16 * 1024
+
+class PcmStreamEncoder:
+    """
+    常驻 ffmpeg 子进程：stdin 喂 s16le 单声道 PCM，stdout 流式吐出目标格式。
+    用于一次合成、多种格式分发：上游只请求一份 PCM，本地按订阅者格式各编一路。
+    """
+    def __init__(self, src_rate: int, fmt: TtsFormat):
+        self.src_rate = src_rate
+        self.fmt = fmt
+        self._proc: Optional[asyncio.subprocess.Process] = None
+
+    async def start(self):
+        self._proc = await asyncio.create_subprocess_exec(
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-f", "s16le", "-ar", str(self.src_rate), "-ac", "1", "-i", "pipe:0",
+            *self.fmt.ffmpeg_output_args(), "-flush_packets", "1", "pipe:1",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+
+    async def feed(self, pcm: bytes):
+        self._proc.stdin.write(pcm)
+        await self._proc.stdin.drain()
+
+    async def finish(self):
+        """输入结束：关闭 stdin，让 ffmpeg 冲刷尾部数据后退出"""
+        if self._proc and not self._proc.stdin.is_closing():
+            self._proc.stdin.close()
+
+    async def output(self) -> AsyncGenerator[bytes, None]:
+        while True:
+            data = await self._proc.stdout.read(_READ_SIZE)
+            if not data:
+                break
+            yield data
+        await self._proc.wait()
+
+    def kill(self):
+        if self._proc and self._proc.returncode is None:
+            try:
+                self._proc.kill()
+            except ProcessLookupError:
+                pass
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from app.services.asr_cache import AsrCache
+
+
+def test_follower_takes_over_when_leader_is_cancelled():
+    async def main():
+        cache = AsrCache(max_entries=10, ttl_seconds=60)
+        calls = 0
+        release = asyncio.Event()
+
+        async def transcribe():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return f"text-{calls}", True
+
+        leader = asyncio.create_task(cache.get_or_transcribe("k", transcribe))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.get_or_transcribe("k", transcribe))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert await follower == "text-2"
+        assert calls == 2
+        assert cache.get("k") == "text-2"
+
+    asyncio.run(main())
+
+
+def test_cancelled_follower_does_not_cancel_leader():
+    async def main():
+        cache = AsrCache(max_entries=10, ttl_seconds=60)
+        release = asyncio.Event()
+
+        async def transcribe():
+            await release.wait()
+            return "text", True
+
+        leader = asyncio.create_task(cache.get_or_transcribe("k", transcribe))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.get_or_transcribe("k", transcribe))
+        await asyncio.sleep(0)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        release.set()
+        assert await leader == "text"
+
+    asyncio.run(main())
@@ -0,0 +1,21 @@
+from app.core import audio_formats
+from app.core.audio_formats import DEFAULT_TTS_FORMAT, negotiate_tts_format, resolve_tts_format
+
+
+def test_aliases_and_unknown_formats():
+    assert resolve_tts_format("pcm16").name == "pcm_16000"
+    assert resolve_tts_format("opus").name == "opus_48000_32"
+    assert resolve_tts_format("wat").name == DEFAULT_TTS_FORMAT
+    assert resolve_tts_format(None).name == DEFAULT_TTS_FORMAT
+
+
+def test_negotiation_keeps_requested_format_with_ffmpeg(monkeypatch):
+    monkeypatch.setattr(audio_formats.shutil, "which", lambda name: "/usr/bin/ffmpeg")
+    assert negotiate_tts_format("pcm").name == "pcm_24000"
+
+
+def test_negotiation_downgrades_without_ffmpeg(monkeypatch):
+    monkeypatch.setattr(audio_formats.shutil, "which", lambda name: None)
+    assert negotiate_tts_format("pcm").name == DEFAULT_TTS_FORMAT
+    assert negotiate_tts_format("opus_48000_64").name == DEFAULT_TTS_FORMAT
+    assert negotiate_tts_format(None).name == DEFAULT_TTS_FORMAT
@@ -0,0 +1,36 @@
+import numpy as np
+
+from app.services.audio_vad import trim_silence
+
+SR = 16000
+
+
+def _pcm(x: np.ndarray) -> bytes:
+    return (np.clip(x, -1, 1) * 32767).astype(np.int16).tobytes()
+
+
+def _modulated_tone(seconds: float) -> np.ndarray:
+    t = np.arange(int(SR * seconds)) / SR
+    envelope = 0.75 + 0.25 * np.sin(2 * np.pi * 3 * t)   # 0.5 ~ 1.0
+    return envelope * np.sin(2 * np.pi * 220 * t)
+
+
+def test_continuous_speech_without_padding_is_kept():
+    res = trim_silence(_pcm(_modulated_tone(3.0)), SR)
+    assert not res.is_silent
+    assert res.kept_seconds > 2.9
+
+
+def test_leading_and_trailing_silence_is_trimmed():
+    pad = np.zeros(SR)
+    res = trim_silence(_pcm(np.concatenate([pad, _modulated_tone(1.0), pad])), SR)
+    assert not res.is_silent
+    # 语音 1s + 两侧各补 VAD_PAD_MS
+    assert 1.0 <= res.kept_seconds < 1.5
+
+
+def test_quiet_noise_floor_is_silent():
+    rng = np.random.default_rng(0)
+    res = trim_silence(_pcm(rng.normal(0, 1e-4, SR * 2)), SR)
+    assert res.is_silent
+    assert res.pcm == b""
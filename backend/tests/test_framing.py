@@ -0,0 +1,35 @@
+import pytest
+
+from app.core import framing
+
+
+@pytest.mark.parametrize("ch", framing.CHANNELS)
+@pytest.mark.parametrize("ftype", (framing.T_JSON, framing.T_AUDIO))
+def test_pack_unpack_round_trip(ch, ftype):
+    payload = b'{"type":"start"}' if ftype == framing.T_JSON else bytes(range(256))
+    data = framing.pack_frame(ch, ftype, 42, payload)
+    assert len(data) == framing.HEADER_SIZE + len(payload)
+    got_ch, got_type, got_seq, got_payload = framing.unpack_frame(data)
+    assert (got_ch, got_type, got_seq) == (ch, ftype, 42)
+    assert isinstance(got_payload, memoryview)
+    assert bytes(got_payload) == payload
+
+
+def test_seq_wraps_to_u32():
+    data = framing.pack_frame(framing.CH_TTS, framing.T_AUDIO, framing.SEQ_MASK + 2, b"")
+    assert framing.unpack_frame(data)[2] == 1
+
+
+def test_empty_payload():
+    assert bytes(framing.unpack_frame(framing.pack_frame(framing.CH_TEXT, framing.T_JSON, 1, b""))[3]) == b""
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"\x01\x01\x00",                                  # 头不完整
+    framing.HEADER.pack(9, framing.T_JSON, 1),        # 未知通道
+    framing.HEADER.pack(framing.CH_UPLOAD, 7, 1),     # 未知类型
+])
+def test_bad_frames_raise(data):
+    with pytest.raises(framing.FrameError):
+        framing.unpack_frame(data)
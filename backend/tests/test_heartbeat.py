@@ -0,0 +1,43 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1.routers import ws_text
+from app.config import settings
+from app.core.heartbeat import IDLE_CLOSE_CODE
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "ws_ping_interval_seconds", 0.05)
+    monkeypatch.setattr(settings, "ws_idle_timeout_seconds", 0.15)
+    app = FastAPI()
+    app.include_router(ws_text.router)
+    with TestClient(app) as c:
+        yield c
+
+
+def test_listen_only_client_is_not_closed(client):
+    """旧客户端只订阅、从不回 pong：过了空闲超时也照常收到 ping，连接不被关闭"""
+    with client.websocket_connect("/ws/asr-text") as ws:
+        ws.send_text(json.dumps({"type": "subscribe", "conversationId": "c1"}))
+        assert ws.receive_json()["type"] == "ready"
+        for _ in range(10):   # 约 0.5s，远超 0.15s 的空闲超时
+            msg = ws.receive()
+            assert msg["type"] == "websocket.send", msg
+            assert json.loads(msg["text"])["type"] == "ping"
+
+
+def test_client_that_stops_ponging_is_closed(client):
+    with client.websocket_connect("/ws/asr-text") as ws:
+        ws.send_text(json.dumps({"type": "subscribe", "conversationId": "c2"}))
+        assert ws.receive_json()["type"] == "ready"
+        ping = ws.receive_json()
+        ws.send_text(json.dumps({"type": "pong", "ts": ping["ts"]}))
+        while True:
+            msg = ws.receive()
+            if msg["type"] == "websocket.close":
+                assert msg["code"] == IDLE_CLOSE_CODE
+                break
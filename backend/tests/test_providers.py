@@ -0,0 +1,180 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.core.resilience import CircuitBreaker, Deadline
+from app.services import providers
+from app.services.providers import LocalASR, LocalTTS, ProviderUnavailable, use_providers
+
+PCM = "pcm_16000"
+
+
+@pytest.fixture(autouse=True)
+def _isolated_chains(monkeypatch):
+    monkeypatch.setattr(providers, "_asr_chain", None)
+    monkeypatch.setattr(providers, "_tts_chain", None)
+    monkeypatch.setattr(settings, "provider_breaker_failures", 2)
+    monkeypatch.setattr(settings, "provider_breaker_reset_seconds", 0.05)
+
+
+def _named(p, name):
+    p.name = name
+    return p
+
+
+class RecordingTTS(LocalTTS):
+    """记下收到的每个文本片段"""
+
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self.texts: list[str] = []
+
+    async def stream(self, text, accent, output_format, deadline):
+        self.texts.append(text)
+        async for chunk in super().stream(text, accent, output_format, deadline):
+            yield chunk
+
+
+class MidStreamFailTTS(LocalTTS):
+    """先出一个分片再失败"""
+
+    async def stream(self, text, accent, output_format, deadline):
+        yield b"\0\0"
+        raise RuntimeError("connection reset")
+
+
+async def _collect(agen) -> list[bytes]:
+    return [chunk async for chunk in agen]
+
+
+async def _fragments(*items):
+    for item in items:
+        yield item
+
+
+def test_asr_fails_over_before_first_delta():
+    use_providers(asr=[
+        _named(LocalASR(error=RuntimeError("down")), "primary"),
+        _named(LocalASR(text="hello there"), "backup"),
+    ])
+
+    async def main():
+        stream = providers.asr_chain().transcribe_stream(b"", "a.wav", "audio/wav", Deadline(5))
+        deltas = [d async for d in stream]
+        return deltas, stream
+
+    deltas, stream = asyncio.run(main())
+    assert "".join(deltas) == "hello there"
+    assert stream.provider == "backup"
+    assert stream.primary is False
+
+
+def test_tts_fails_over_before_first_byte():
+    backup = _named(RecordingTTS(), "backup")
+    use_providers(tts=[_named(LocalTTS(error=RuntimeError("down")), "primary"), backup])
+
+    chunks = asyncio.run(_collect(providers.tts_chain().stream("hi", "us", PCM, Deadline(5))))
+    assert chunks
+    assert backup.texts == ["hi"]
+
+
+def test_tts_does_not_fail_over_after_first_byte():
+    backup = _named(RecordingTTS(), "backup")
+    use_providers(tts=[_named(MidStreamFailTTS(), "primary"), backup])
+
+    async def main():
+        got = []
+        with pytest.raises(RuntimeError, match="connection reset"):
+            async for chunk in providers.tts_chain().stream("hi", "us", PCM, Deadline(5)):
+                got.append(chunk)
+        return got
+
+    assert asyncio.run(main()) == [b"\0\0"]
+    assert backup.texts == []
+    assert providers.tts_chain().members[0][1].failures == 1
+
+
+def test_breaker_open_half_open_closed():
+    primary = _named(LocalASR(text="primary", error=RuntimeError("down")), "primary")
+    use_providers(asr=[primary, _named(LocalASR(text="backup"), "backup")])
+    chain = providers.asr_chain()
+    breaker = chain.members[0][1]
+
+    async def call():
+        return await chain.transcribe(b"", "a.wav", "audio/wav", Deadline(5))
+
+    async def main():
+        for _ in range(2):
+            assert (await call()).provider == "backup"
+        assert breaker.state == CircuitBreaker.OPEN
+
+        # 冷却期内直接跳过主用
+        primary.error = None
+        assert (await call()).provider == "backup"
+        assert breaker.state == CircuitBreaker.OPEN
+
+        await asyncio.sleep(0.06)
+        assert breaker.allow()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert not breaker.allow()   # 半开只放行一个探测
+        breaker.release()
+
+        res = await call()
+        assert (res.provider, res.primary) == ("primary", True)
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(main())
+
+
+def test_half_open_probe_failure_reopens():
+    use_providers(asr=[_named(LocalASR(error=RuntimeError("down")), "primary")])
+    chain = providers.asr_chain()
+    breaker = chain.members[0][1]
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(ProviderUnavailable):
+                await chain.transcribe(b"", "a.wav", "audio/wav", Deadline(5))
+        await asyncio.sleep(0.06)
+        with pytest.raises(ProviderUnavailable):
+            await chain.transcribe(b"", "a.wav", "audio/wav", Deadline(5))
+
+    asyncio.run(main())
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_replayable_replays_fragments_to_backup():
+    class FailOnSecondFragment(RecordingTTS):
+        async def stream(self, text, accent, output_format, deadline):
+            self.texts.append(text)
+            if len(self.texts) >= 2:
+                raise RuntimeError("down")
+            return
+            yield
+
+    primary = _named(FailOnSecondFragment(), "primary")
+    backup = _named(RecordingTTS(), "backup")
+    use_providers(tts=[primary, backup])
+
+    chunks = asyncio.run(_collect(
+        providers.tts_chain().stream_text(_fragments("Hello, ", "world. ", "Bye."), "us", PCM, Deadline(5))))
+    assert chunks
+    assert primary.texts == ["Hello, ", "world. "]
+    assert backup.texts == ["Hello, ", "world. ", "Bye."]
+
+
+def test_text_source_error_is_not_blamed_on_tts():
+    async def broken_source():
+        yield "Hello, "
+        raise ValueError("asr failed")
+
+    use_providers(tts=[_named(RecordingTTS(), "primary"), _named(RecordingTTS(), "backup")])
+    chain = providers.tts_chain()
+
+    async def main():
+        with pytest.raises(ValueError, match="asr failed"):
+            await _collect(chain.stream_text(broken_source(), "us", PCM, Deadline(5)))
+
+    asyncio.run(main())
+    assert all(b.failures == 0 for _, b in chain.members)
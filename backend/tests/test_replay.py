@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+from app.config import settings
+from app.core.pubsub import Channel
+from app.core.replay import ReplayRing
+
+
+class FakeWs:
+    def __init__(self):
+        self.sent: list = []
+
+    async def send_text(self, msg: str):
+        self.sent.append(json.loads(msg))
+
+    async def send_bytes(self, chunk: bytes):
+        self.sent.append(chunk)
+
+
+def test_ring_evicts_oldest_frames_over_byte_limit():
+    ring = ReplayRing(max_bytes=10, max_age=60)
+    for data in (b"aaaa", b"bbbb", b"cccc"):
+        ring.append(ring.reserve(), data)
+    assert [f.seq for f in ring.frames] == [2, 3]
+    assert ring.bytes == 8
+    assert ring.first_seq == 2
+    assert [f.data for f in ring.since(3)] == [b"cccc"]
+    assert ring.since(4) == []
+
+
+def test_ring_evicts_frames_older_than_max_age():
+    ring = ReplayRing(max_bytes=1000, max_age=60)
+    ring.append(ring.reserve(), b"old")
+    ring.frames[0].at -= 120
+    ring.append(ring.reserve(), b"new")
+    assert [f.seq for f in ring.frames] == [2]
+
+
+def test_evicting_the_start_of_an_open_segment_clears_open_seq():
+    ring = ReplayRing(max_bytes=6, max_age=60)
+    ring.open_seq = ring.reserve()
+    ring.append(ring.open_seq, "start")
+    ring.append(ring.reserve(), b"xxxx")
+    assert ring.open_seq is None
+
+
+def test_resume_from_replays_missed_frames_then_goes_live():
+    async def main():
+        ch = Channel()
+        for i in range(1, 4):
+            await ch.pub_text("c", {"type": "final", "text": f"t{i}"})
+        ws = FakeWs()
+        await ch.sub_text("c", ws, resume_from=2)
+        await ch.pub_text("c", {"type": "final", "text": "t4"})
+        assert [m["seq"] for m in ws.sent] == [2, 3, 4]
+        assert [m["text"] for m in ws.sent] == ["t2", "t3", "t4"]
+
+    asyncio.run(main())
+
+
+def test_resume_older_than_window_sends_gap_first(monkeypatch):
+    monkeypatch.setattr(settings, "replay_max_bytes", 120)
+
+    async def main():
+        ch = Channel()
+        for i in range(1, 6):
+            await ch.pub_text("c", {"type": "final", "text": "x" * 30 + str(i)})
+        first = ch.replay.get(("text", "c")).first_seq
+        assert first > 1
+        ws = FakeWs()
+        await ch.sub_text("c", ws, resume_from=1)
+        assert ws.sent[0] == {"type": "gap", "from": 1, "to": first}
+        assert [m["seq"] for m in ws.sent[1:]] == list(range(first, 6))
+
+    asyncio.run(main())
+
+
+def test_tts_subscriber_joining_mid_segment_gets_it_from_start():
+    async def main():
+        ch = Channel()
+        early = FakeWs()
+        await ch.sub_tts("c", early, "pcm_16000")
+        await ch.pub_tts_json("c", {"type": "start"})
+        await ch.pub_tts_bytes("c", b"\x01\x02")
+        late = FakeWs()
+        await ch.sub_tts("c", late, "pcm_16000")
+        await ch.pub_tts_bytes("c", b"\x03\x04")
+        assert late.sent[0]["type"] == "start"
+        assert late.sent[1:] == [b"\x01\x02", b"\x03\x04"]
+        assert early.sent[1:] == late.sent[1:]
+
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from app.core.sequencer import UtteranceSequencer
+
+
+def test_output_follows_issue_order_when_stages_finish_out_of_order():
+    async def main():
+        seq = UtteranceSequencer()
+        order: list[int] = []
+        n1, n2, n3 = (seq.issue("c") for _ in range(3))
+
+        async def emit(n: int, delay: float):
+            await asyncio.sleep(delay)          # 识别耗时不同：3 最先好，1 最后
+            await seq.wait("c", "text", n)
+            order.append(n)
+            seq.finish("c", "text", n)
+            seq.release("c", n)
+
+        await asyncio.gather(emit(n1, 0.03), emit(n2, 0.02), emit(n3, 0.0))
+        assert order == [1, 2, 3]
+        assert seq._issued == {} and seq._waiters == {}
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_is_removed_and_does_not_block_later_turns():
+    async def main():
+        seq = UtteranceSequencer()
+        n1, n2, n3 = (seq.issue("c") for _ in range(3))
+
+        waiter = asyncio.create_task(seq.wait("c", "text", n2))
+        await asyncio.sleep(0)
+        assert ("c", "text", n2) in seq._waiters
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert seq._waiters == {}
+
+        # 被取消的那段照常 release，后一段不会一直等
+        third = asyncio.create_task(seq.wait("c", "text", n3))
+        seq.release("c", n2)
+        await asyncio.sleep(0)
+        assert not third.done()
+        seq.release("c", n1)
+        await asyncio.wait_for(third, 1)
+        seq.release("c", n3)
+        assert seq._issued == {} and seq._waiters == {}
+
+    asyncio.run(main())
+
+
+def test_conversations_are_independent():
+    async def main():
+        seq = UtteranceSequencer()
+        seq.issue("a")
+        b1 = seq.issue("b")
+        await asyncio.wait_for(seq.wait("b", "tts", b1), 1)
+
+    asyncio.run(main())
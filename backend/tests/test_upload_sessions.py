@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1.routers import ws_conversation, ws_upload
+from app.config import settings
+from app.core import framing
+from app.core.upload_buffer import UploadLimitError
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "prewarm_enabled", False)
+    monkeypatch.setattr(settings, "ws_ping_interval_seconds", 0)
+    app = FastAPI()
+    app.include_router(ws_conversation.router)
+    app.include_router(ws_upload.router)
+    with TestClient(app) as c:
+        yield c
+    for utt in list(ws_upload._sessions):
+        ws_upload.discard_upload_session(utt)
+
+
+def _json_frame(ch: int, obj: dict, seq: int = 1) -> bytes:
+    return framing.pack_frame(ch, framing.T_JSON, seq, json.dumps(obj).encode())
+
+
+def _recv(ws) -> tuple[int, dict]:
+    ch, _, _, payload = framing.unpack_frame(ws.receive_bytes())
+    return ch, json.loads(bytes(payload))
+
+
+def test_late_chunk_after_takeover_ends_only_that_upload(client):
+    start = {"type": "start", "conversationId": "c1", "format": "pcm16", "utteranceId": "U1", "resumable": True}
+    with client.websocket_connect("/ws/conversation") as old:
+        old.send_bytes(_json_frame(framing.CH_UPLOAD, start))
+        assert _recv(old)[1]["type"] == "ready"
+        old.send_bytes(framing.pack_frame(framing.CH_UPLOAD, framing.T_AUDIO, 1, b"\0\0" * 160))
+
+        # 另一条连接续传接管了这段上传
+        with client.websocket_connect("/ws/upload-audio") as new:
+            new.send_text(json.dumps({**start, "resume": True}))
+            ready = new.receive_json()
+            assert ready["resumed"] is True
+
+            # 旧连接上迟到的分片：只收到本段的错误帧，会话仍归新连接
+            old.send_bytes(framing.pack_frame(framing.CH_UPLOAD, framing.T_AUDIO, 2, b"\0\0" * 160))
+            ch, msg = _recv(old)
+            assert (ch, msg["type"], msg["code"]) == (framing.CH_UPLOAD, "error", "UPLOAD_SESSION_GONE")
+            assert ws_upload._sessions["U1"]["owner"] is not None
+
+            # 多路复用连接本身和其它通道不受影响
+            old.send_bytes(_json_frame(framing.CH_TEXT, {"type": "subscribe", "conversationId": "c1"}))
+            assert _recv(old) == (framing.CH_TEXT, {"type": "ready", "conversationId": "c1"})
+
+
+def test_write_after_session_ended_raises_session_gone(client):
+    async def main():
+        utt, _ = ws_upload.open_upload_session("c2", "us", "free", "pcm16", resumable=True, owner="conn")
+        ws_upload.discard_upload_session(utt)
+        with pytest.raises(UploadLimitError) as exc:
+            ws_upload.write_upload_chunk(utt, b"\0\0", 1, "conn")
+        assert exc.value.code == "UPLOAD_SESSION_GONE"
+
+    asyncio.run(main())
+
+
+def test_discard_ignores_sessions_owned_by_another_connection(client):
+    async def main():
+        utt, _ = ws_upload.open_upload_session("c3", "us", "free", "pcm16", resumable=True, owner="old")
+        ws_upload.resume_upload_session("c3", utt, "new")
+        ws_upload.discard_upload_session(utt, "old")
+        assert utt in ws_upload._sessions
+        ws_upload.discard_upload_session(utt)
+
+    asyncio.run(main())
@@ -1,6 +1,12 @@
 // src/api/conversations.js
 const BASE_URL = import.meta.env.VITE_API_BASE_URL + "/api/v1"; // 用环境变量，保证 Cookie 同站
 
+// 服务端归档音频返回的是站内相对路径（/api/v1/audio/...），补上 API 域名后 <audio> 才能直接播放
+export function mediaUrl(u) {
+  if (!u) return null;
+  return u.startsWith("/") ? import.meta.env.VITE_API_BASE_URL + u : u;
+}
+
 async function api(path, { method = "GET", body } = {}) {
   const res = await fetch(`${BASE_URL}${path}`, {
     method,
@@ -57,7 +63,7 @@ export async function getConversation(id) {
     start: t.startMs ?? Date.now(),
     end: t.endMs ?? Date.now(),
     transcript: t.text || "",
-    audioUrl: t.audioUrl || null,
+    audioUrl: mediaUrl(t.audioUrl),
   }));
   return {
     id: conv.id,
@@ -90,7 +96,7 @@ export async function deleteConversation(id) {
 
 /** 
  * appendSegment(id, seg)
- * seg: { start, end, transcript, audioUrl }
+ * seg: { start, end, transcript, audioUrl, utteranceId? }
  * 返回：{ id, start, end, transcript, audioUrl }
  */
 export async function appendSegment(id, seg) {
@@ -101,6 +107,7 @@ export async function appendSegment(id, seg) {
       endMs: seg.end ?? null,
       text: seg.transcript ?? "",
       audioUrl: seg.audioUrl ?? null,
+      utteranceId: seg.utteranceId ?? null,
     },
   });
   return {
@@ -108,6 +115,6 @@ export async function appendSegment(id, seg) {
     start: d.startMs ?? Date.now(),
     end: d.endMs ?? Date.now(),
     transcript: d.text || "",
-    audioUrl: d.audioUrl || null,
+    audioUrl: mediaUrl(d.audioUrl),
   }; // ← 兼容 mockDB
 }
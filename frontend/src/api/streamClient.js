@@ -38,11 +38,34 @@ export function createStreamClient({
 
   let currentVolume = Math.max(0, Math.min(1, outputVolume));
 
+  // ===== 断线续传 =====
+  // 服务端每帧都有序号：JSON 消息带 seq，二进制分片的序号 = 上一帧 + 1。
+  // 文本 / TTS 连接意外断开后自动重连，并带 resumeFrom 让服务端补发错过的帧
+  let textSeq = 0;
+  let ttsSeq = 0;
+  let closing = false;
+  const RECONNECT_MIN_MS = 500;
+  const RECONNECT_MAX_MS = 5000;
+
+  // 上传续传：每个分片带序号（4 字节大端头），服务端定期 ack；
+  // 未确认的分片留在本地，断线重连（resume）后从 ack + 1 补发，不用整段重录
+  const utteranceId =
+    globalThis.crypto?.randomUUID?.() || `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+  let uploadSeq = 0;
+  let uploadPending = [];     // [{ seq, buf }] 已发送未确认
+  let stopRequested = false;
+  let uploadReady = false;    // 收到 ready 且补发完之后，新分片才直接发送（保证序号按序到达）
+
   // ========== 工具 ==========
   function sendJSON(ws, obj) {
     if (ws && ws.readyState === WebSocket.OPEN) ws.send(JSON.stringify(obj));
   }
 
+  // 服务端心跳：收到 ping 立即回 pong，否则空闲超时后连接会被服务端关闭
+  function replyPong(ws, msg) {
+    sendJSON(ws, { type: "pong", ts: msg.ts });
+  }
+
   function ensureAudioElement() {
     if (audioEl) return audioEl;
     audioEl = document.createElement("audio");
@@ -199,27 +222,53 @@ export function createStreamClient({
     }
   }
 
-  // ========== 外部 API ==========
-  async function open() {
-    console.log("[client] createStreamClient.open() called");
+  // ========== 文本 / TTS 连接（可断线重连） ==========
+  function scheduleReconnect(name, connect, attempt = 0) {
+    if (closing) return;
+    const delay = Math.min(RECONNECT_MAX_MS, RECONNECT_MIN_MS * 2 ** attempt);
+    console.warn(`[client] ${name} closed, reconnect in ${delay}ms`);
+    setTimeout(() => {
+      if (closing) return;
+      connect().catch(() => scheduleReconnect(name, connect, attempt + 1));
+    }, delay);
+  }
 
-    // 1) 文本通道
-    await new Promise((resolve, reject) => {
-      textWS = new WebSocket(WS_TEXT_URL);
-      textWS.onopen = () => {
-        console.log("[client] textWS open, subscribe", conversationId);
-        sendJSON(textWS, { type: "subscribe", conversationId });
+  function connectText() {
+    return new Promise((resolve, reject) => {
+      const ws = new WebSocket(WS_TEXT_URL);
+      textWS = ws;
+      let opened = false;
+      ws.onopen = () => {
+        opened = true;
+        console.log("[client] textWS open, subscribe", conversationId, "resumeFrom", textSeq + 1);
+        sendJSON(ws, { type: "subscribe", conversationId, ...(textSeq ? { resumeFrom: textSeq + 1 } : {}) });
         resolve();
       };
-      textWS.onerror = (e) => { console.error("[client] textWS error", e); reject(e); };
-      textWS.onmessage = (ev) => {
+      ws.onerror = (e) => { console.error("[client] textWS error", e); reject(e); };
+      ws.onclose = () => { if (opened) scheduleReconnect("textWS", connectText); };
+      ws.onmessage = (ev) => {
         try {
           const msg = JSON.parse(ev.data);
+          if (typeof msg?.seq === "number") textSeq = msg.seq;
+          if (msg?.type === "ping") return replyPong(ws, msg);
           if (msg?.type === "ready" || msg?.type === "pong") return;
           if (msg.type === "interim") {
             onText?.({ interim: msg.text, ts: msg.ts, confidence: msg.confidence });
           } else if (msg.type === "final") {
-            onText?.({ final: msg.text, ts: msg.ts, confidence: msg.confidence });
+            // utteranceId 保存段落时带回服务端，用于回填归档的合成音频地址
+            // silent：整段静音被 VAD 跳过，text 为空，之后也不会有 TTS
+            onText?.({
+              final: msg.text, ts: msg.ts, confidence: msg.confidence,
+              utteranceId: msg.utteranceId, sourceAudioUrl: msg.sourceAudioUrl,
+              silent: !!msg.silent,
+            });
+          } else if (msg.type === "error") {
+            // 识别失败：服务端不会再推 final / TTS，交给上层结束本段
+            console.warn("[client] textWS error msg:", msg);
+            onText?.({ error: msg.message || msg.code || "error", code: msg.code, stage: msg.stage });
+          } else if (msg.type === "gap") {
+            // 断线太久，服务端已经丢了这段消息：只能从它还保留的地方接着收
+            console.warn("[client] textWS missed messages", msg.from, "→", msg.to);
           } else {
             console.warn("[client] textWS unknown msg:", msg);
           }
@@ -228,85 +277,105 @@ export function createStreamClient({
         }
       };
     });
+  }
 
-    // 2) TTS 通道
-    if (WS_TTS_URL) {
-      try {
-        await new Promise((resolve, reject) => {
-          ttsWS = new WebSocket(WS_TTS_URL);
-          ttsWS.binaryType = "arraybuffer";
-
-          ttsWS.onopen = () => {
-            console.log("[client] ttsWS open, subscribe", conversationId);
-            sendJSON(ttsWS, { type: "start", conversationId });
-            resolve();
-          };
-
-          ttsWS.onerror = (e) => { console.warn("[client] ttsWS error", e); reject(e); };
-
-          ttsWS.onmessage = (ev) => {
-            if (typeof ev.data === "string") {
-              // 控制消息
-              try {
-                const msg = JSON.parse(ev.data);
-                if (msg.type === "start") {
-                  console.log("[client] 🎵 TTS stream starting");
-                  ttsMime = msg.mime || "audio/mpeg";
-                  ttsChunks = [];
-
-                  // 优先使用 MSE，失败则退化到 WebAudio
-                  const ok = mseInit();
-                  if (!ok) {
-                    console.warn("[client] MSE not available, fallback to WebAudio buffering");
-                    // 清理 WebAudio 队列
-                    decodeQueue = [];
-                    decodePlaying = false;
-                  }
-                  onTtsStart?.();
-                } else if (msg.type === "stop") {
-                  console.log("[client] 🎵 TTS stream stopped");
-                  // 完成 MSE
-                  if (mediaSource) mseEnd();
-
-                  // 等待播放几百毫秒再出 blob（保险）
-                  setTimeout(() => {
-                    const blob = new Blob(ttsChunks, { type: ttsMime });
-                    onTtsBlob?.(blob);
-                    onTtsEnded?.();
-                  }, 300);
-                }
-              } catch {
-                // ignore 非 JSON 文本
-              }
-            } else if (ev.data instanceof ArrayBuffer) {
-              // 二进制分片
-              const ab = ev.data.slice(0);
-              const u8 = new Uint8Array(ab);
-              ttsChunks.push(u8);
-
-              // MSE 路径
-              if (mediaSource && sourceBuffer) {
-                mseAppend(u8);
-              } else {
-                // 退化路径：缓冲到一定大小再解码
-                decodeQueue.push(ab);
-                if (!decodePlaying) waPlayNext();
+  function connectTts() {
+    return new Promise((resolve, reject) => {
+      const ws = new WebSocket(WS_TTS_URL);
+      ttsWS = ws;
+      ws.binaryType = "arraybuffer";
+      let opened = false;
+
+      ws.onopen = () => {
+        opened = true;
+        console.log("[client] ttsWS open, subscribe", conversationId, "resumeFrom", ttsSeq + 1);
+        sendJSON(ws, { type: "start", conversationId, ...(ttsSeq ? { resumeFrom: ttsSeq + 1 } : {}) });
+        resolve();
+      };
+
+      ws.onerror = (e) => { console.warn("[client] ttsWS error", e); reject(e); };
+      ws.onclose = () => { if (opened) scheduleReconnect("ttsWS", connectTts); };
+
+      ws.onmessage = (ev) => {
+        if (typeof ev.data === "string") {
+          // 控制消息
+          try {
+            const msg = JSON.parse(ev.data);
+            if (typeof msg.seq === "number") ttsSeq = msg.seq;
+            if (msg.type === "ping") {
+              replyPong(ws, msg);
+            } else if (msg.type === "start") {
+              console.log("[client] 🎵 TTS stream starting");
+              ttsMime = msg.mime || "audio/mpeg";
+              ttsChunks = [];
+
+              // 优先使用 MSE，失败则退化到 WebAudio
+              const ok = mseInit();
+              if (!ok) {
+                console.warn("[client] MSE not available, fallback to WebAudio buffering");
+                // 清理 WebAudio 队列
+                decodeQueue = [];
+                decodePlaying = false;
               }
+              onTtsStart?.();
+            } else if (msg.type === "stop") {
+              console.log("[client] 🎵 TTS stream stopped");
+              // 完成 MSE
+              if (mediaSource) mseEnd();
+
+              // 等待播放几百毫秒再出 blob（保险）；audioUrl 为服务端归档地址（可长期回放）
+              setTimeout(() => {
+                const blob = new Blob(ttsChunks, { type: ttsMime });
+                onTtsBlob?.(blob, msg.audioUrl || null);
+                onTtsEnded?.();
+              }, 300);
+            } else if (msg.type === "gap") {
+              console.warn("[client] ttsWS missed frames", msg.from, "→", msg.to);
             }
-          };
-        });
-      } catch (e) {
-        console.error("[client] ttsWS connection failed:", e);
-        ttsWS = null;
-      }
-    }
+          } catch {
+            // ignore 非 JSON 文本
+          }
+        } else if (ev.data instanceof ArrayBuffer) {
+          // 二进制分片（不带 seq，按到达顺序递增）
+          ttsSeq += 1;
+          const ab = ev.data.slice(0);
+          const u8 = new Uint8Array(ab);
+          ttsChunks.push(u8);
 
-    // 3) 上传通道
-    await new Promise((resolve, reject) => {
-      uploadWS = new WebSocket(WS_UPLOAD_URL);
-      uploadWS.onopen = () => {
-        console.log("[client] uploadWS open");
-        sendJSON(uploadWS, {
+          // MSE 路径
+          if (mediaSource && sourceBuffer) {
+            mseAppend(u8);
+          } else {
+            // 退化路径：缓冲到一定大小再解码
+            decodeQueue.push(ab);
+            if (!decodePlaying) waPlayNext();
+          }
+        }
+      };
+    });
+  }
+
+  function sendChunk(seq, buf) {
+    const framed = new Uint8Array(4 + buf.byteLength);
+    new DataView(framed.buffer).setUint32(0, seq);
+    framed.set(new Uint8Array(buf), 4);
+    uploadWS.send(framed);
+  }
+
+  function dropAcked(ack) {
+    uploadPending = uploadPending.filter((c) => c.seq > ack);
+  }
+
+  function connectUpload(resume) {
+    return new Promise((resolve, reject) => {
+      const ws = new WebSocket(WS_UPLOAD_URL);
+      uploadWS = ws;
+      uploadReady = false;
+      let opened = false;
+      ws.onopen = () => {
+        opened = true;
+        console.log("[client] uploadWS open", resume ? "(resume)" : "");
+        sendJSON(ws, {
           type: "start",
           conversationId,
           model,
@@ -314,19 +383,69 @@ export function createStreamClient({
           sampleRate: 48000,
           format: "audio/webm;codecs=opus",
           asrProvider: "whisper",
+          utteranceId,
+          resumable: true,
+          resume,
         });
         resolve();
       };
-      uploadWS.onerror = (e) => { console.error("[client] uploadWS error", e); reject(e); };
+      ws.onerror = (e) => { console.error("[client] uploadWS error", e); reject(e); };
+      ws.onclose = () => {
+        uploadReady = false;
+        // stop 之后由服务端关闭属于正常结束；录音中途断开才续传
+        if (opened && !stopRequested) scheduleReconnect("uploadWS", () => connectUpload(true));
+      };
+      ws.onmessage = (ev) => {
+        let msg;
+        try { msg = JSON.parse(ev.data); } catch { return; }
+        if (msg.type === "ping") {
+          replyPong(ws, msg);
+        } else if (msg.type === "ready") {
+          if (resume && !msg.resumed) {
+            console.warn("[client] upload session expired on server, earlier audio is lost");
+          }
+          dropAcked(msg.ack || 0);
+          for (const c of uploadPending) sendChunk(c.seq, c.buf);
+          uploadReady = true;
+          if (stopRequested) sendJSON(ws, { type: "stop" });
+        } else if (msg.type === "ack") {
+          dropAcked(msg.seq);
+        } else if (msg.type === "error") {
+          console.warn("[client] uploadWS error msg:", msg);
+        }
+      };
     });
   }
 
+  // ========== 外部 API ==========
+  async function open() {
+    console.log("[client] createStreamClient.open() called");
+
+    // 1) 文本通道
+    await connectText();
+
+    // 2) TTS 通道
+    if (WS_TTS_URL) {
+      try {
+        await connectTts();
+      } catch (e) {
+        console.error("[client] ttsWS connection failed:", e);
+        ttsWS = null;
+      }
+    }
+
+    // 3) 上传通道
+    await connectUpload(false);
+  }
+
   async function startSegment() {
     // noop
   }
 
   async function stopSegment() {
-    if (uploadWS?.readyState === WebSocket.OPEN) {
+    // 断线中也记下来：续传连上、补发完分片后再发 stop
+    stopRequested = true;
+    if (uploadReady && uploadWS?.readyState === WebSocket.OPEN) {
       console.log("[client] send stop");
       sendJSON(uploadWS, { type: "stop" });
     }
@@ -352,8 +471,13 @@ export function createStreamClient({
     });
 
     mediaRecorder.ondataavailable = (e) => {
-      if (e.data && e.data.size > 0 && uploadWS?.readyState === WebSocket.OPEN) {
-        e.data.arrayBuffer().then((buf) => uploadWS.send(buf));
+      if (e.data && e.data.size > 0) {
+        e.data.arrayBuffer().then((buf) => {
+          const seq = ++uploadSeq;
+          uploadPending.push({ seq, buf });
+          // 断线期间只缓存，重连后随 ready 一起补发
+          if (uploadReady && uploadWS?.readyState === WebSocket.OPEN) sendChunk(seq, buf);
+        });
       }
     };
 
@@ -368,6 +492,7 @@ export function createStreamClient({
   }
 
   async function close() {
+    closing = true;
     try { textWS?.close(); } catch {}
     try { ttsWS?.close(); } catch {}
     try { uploadWS?.close(); } catch {}
@@ -10,6 +10,7 @@ import {
   renameConversation,
   appendSegment,
   deleteConversation,
+  mediaUrl,
 } from "../../api/conversations";
 import { createStreamClient } from "../../api/streamClient";
 import { changePassword } from "../../api/auth";
@@ -215,6 +216,12 @@ export default function Dashboard() {
   const streamRef = useRef(null);
   const finishOnceRef = useRef(false);     // 保证每段只 finish 一次
 
+  // 卸载时关闭流式客户端（含自动重连的文本 / TTS 订阅）
+  useEffect(() => () => {
+    streamRef.current?.close?.();
+    streamRef.current = null;
+  }, []);
+
   const startSegment = async () => {
     if (!activeConv) return null;
     const segId = "s_" + Date.now();
@@ -245,7 +252,7 @@ export default function Dashboard() {
   };
 
   // —— 关键修复：允许把“最终文本”直接传进来，避免状态时序导致空白
-  const finishSegment = async (finalText) => {
+  const finishSegment = async (finalText, utteranceId) => {
     if (finishOnceRef.current) return;
     finishOnceRef.current = true;
 
@@ -285,6 +292,7 @@ export default function Dashboard() {
         end: Date.now(),
         transcript: textToSave,
         audioUrl: segAudioUrlRef.current,
+        utteranceId, // 服务端据此回填这段合成音频的归档地址（blob: 地址不落库）
       });
     } catch {}
 
@@ -306,6 +314,14 @@ export default function Dashboard() {
     currentConvIdRef.current = convId; // 记录本段的会话 ID
     await startSegment();
 
+    // 先关掉上一次的客户端：它的文本 / TTS 连接会自动重连，留着的话服务端永远以为有人在听，
+    // “无人收听就不合成”的优化也就永远不生效
+    const prevClient = streamRef.current;
+    streamRef.current = null;
+    if (prevClient) {
+      try { await prevClient.close(); } catch {}
+    }
+
     streamRef.current = createStreamClient({
       conversationId: convId,
       model: selectedModel, // "free" | "paid"
@@ -316,13 +332,22 @@ export default function Dashboard() {
           setInterimText("");
           setLiveTranscript((prev) => (prev ? prev + payload : payload));
         } else {
-          const { interim, final } = payload;
+          const { interim, final, error, silent, utteranceId } = payload;
+          if (error) {
+            setInterimText("");
+            setTimeout(() => { finishSegment(); }, 0);
+          }
+          if (silent) {
+            // 整段静音：没有文本也不会有 TTS（onTtsEnded 不会触发），这里直接收尾
+            setInterimText("");
+            setTimeout(() => { finishSegment("", utteranceId); }, 0);
+          }
           if (interim != null) setInterimText(interim);
           if (final) {
             setInterimText("");
             setLiveTranscript((prev) => (prev ? prev + final : final));
             // —— 收到最终文本后，直接携带 final 收尾，避免时序问题
-            setTimeout(() => { finishSegment(final); }, 0);
+            setTimeout(() => { finishSegment(final, utteranceId); }, 0);
           }
         }
         if (transcriptBoxRef.current) {
@@ -332,9 +357,10 @@ export default function Dashboard() {
       onTtsStart: () => {
         segAudioUrlRef.current = null;
       },
-      onTtsBlob: (blob) => {
+      onTtsBlob: (blob, archivedUrl) => {
         if (!blob) return;
-        const url = URL.createObjectURL(blob);
+        // 有服务端归档地址就用它（刷新页面后仍可回放），否则退回本地 blob
+        const url = archivedUrl ? mediaUrl(archivedUrl) : URL.createObjectURL(blob);
         segAudioUrlRef.current = url;
       },
       onTtsEnded: () => {